@@ -0,0 +1,117 @@
+"""
+Benchmark batched multi-query search against one search call per query.
+
+Loads a synthetic corpus into a fresh store (in a temporary directory), then
+runs the same batches of distinct queries (half of them filtered to a few
+documents) through search_documents one by one and through
+search_documents_batch, with the query-embedding cache and batcher disabled
+so every query is embedded.
+
+Usage (from the backend directory):
+    python benchmarks/bench_batch_search.py [--chunks 20000] [--batch 32] [--rounds 10] [--mode vector]
+        [--backend chroma]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USER_ID = "bench"
+CHUNKS_PER_DOC = 50
+WORDS = (
+    "invoice total amount due payment terms refund policy warranty clause party agreement "
+    "shall termination notice period liability damages confidential information section "
+    "schedule appendix error code revision device firmware battery install reset replacement"
+).split()
+
+
+def make_texts(count: int, min_words: int, max_words: int, seed: int):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000, help="Corpus size")
+    parser.add_argument("--batch", type=int, default=32, help="Queries per batch")
+    parser.add_argument("--rounds", type=int, default=10, help="Batches to time")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    parser.add_argument("--mode", choices=["vector", "lexical", "hybrid"], default="vector", help="Retrieval mode")
+    parser.add_argument("--backend", choices=["chroma", "hnsw"], default="chroma", help="Vector store backend")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_batch_")
+    try:
+        run(args, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run(args, tmp_dir: str):
+    os.environ["VECTOR_STORE_BACKEND"] = args.backend
+    os.environ["HNSW_INDEX_DIR"] = os.path.join(tmp_dir, "hnsw")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(tmp_dir, "lexical_index.sqlite3")
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["QUERY_CACHE_ENABLED"] = "false"
+    os.environ["QUERY_BATCH_ENABLED"] = "false"
+
+    from rag.retrieve import search_documents, search_documents_batch
+    from rag.vectorstore import COPY_PAGE_SIZE, get_embedding_model, get_vector_store
+    from utils.schemas import SearchRequest
+
+    model = get_embedding_model()
+    print(f"Embedding {args.chunks} chunks...")
+    texts = make_texts(args.chunks, 40, 120, seed=1)
+    vectors = model.encode(texts, show_progress_bar=False)
+
+    # The ChromaDB backend persists under ./data
+    os.chdir(tmp_dir)
+    store = get_vector_store()
+    ids = [f"chunk_{i}" for i in range(len(texts))]
+    metadatas = [{"doc_id": f"doc_{i // CHUNKS_PER_DOC}", "chunk_index": i % CHUNKS_PER_DOC} for i in range(len(texts))]
+    for first in range(0, len(texts), COPY_PAGE_SIZE):
+        last = first + COPY_PAGE_SIZE
+        store.add_documents(USER_ID, "bench", texts[first:last], metadatas[first:last], ids[first:last], vectors[first:last])
+
+    rng = random.Random(2)
+    documents = (args.chunks + CHUNKS_PER_DOC - 1) // CHUNKS_PER_DOC
+    queries = make_texts(args.batch * args.rounds * 2, 3, 12, seed=3)
+    batches = []
+    for round_index in range(args.rounds * 2):
+        batch = queries[round_index * args.batch:(round_index + 1) * args.batch]
+        batches.append([
+            SearchRequest(
+                query=query,
+                top_k=args.k,
+                doc_ids=[f"doc_{rng.randrange(documents)}" for _ in range(3)] if i % 2 else None,
+                mode=args.mode
+            )
+            for i, query in enumerate(batch)
+        ])
+
+    # Distinct queries for each variant, so neither benefits from warmed caches
+    start = time.perf_counter()
+    for batch in batches[:args.rounds]:
+        for request in batch:
+            search_documents(request.query, USER_ID, request.top_k, request.doc_ids, request.mode)
+    sequential = (time.perf_counter() - start) / args.rounds
+
+    start = time.perf_counter()
+    for batch in batches[args.rounds:]:
+        search_documents_batch(batch, USER_ID)
+    batched = (time.perf_counter() - start) / args.rounds
+
+    print(f"{args.backend} backend, {args.mode} mode, {args.batch} queries per batch")
+    print(f"{'variant':<12} {'ms/batch':>10} {'queries/s':>10}")
+    print(f"{'sequential':<12} {sequential * 1000:10.1f} {args.batch / sequential:10.0f}")
+    print(f"{'batched':<12} {batched * 1000:10.1f} {args.batch / batched:10.0f}")
+    print(f"speedup: {sequential / batched:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Benchmark text chunking throughput (MB/sec).
+
+Compares LangChain's RecursiveCharacterTextSplitter (the previous chunk_text
+implementation) with the offset-based split_spans on large synthetic texts,
+and checks that both produce identical chunks.
+
+Also checks that streaming ingestion chunks page by page exactly as
+chunk_text chunks the joined document: iter_chunks is run on random
+multi-page documents (blank pages, pages starting or ending with newlines,
+paragraphs longer than a chunk) and its chunks and offsets are compared
+with chunk_spans on the text; the script exits with status 1 on a mismatch.
+
+Usage (from the backend directory):
+    python benchmarks/bench_chunking.py [--sizes 1 4 16] [--chunk-size 800] [--overlap 200]
+        [--streaming-docs 2000]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from rag.ingest import chunk_spans, iter_chunks
+from rag.text_splitter import split_spans, DEFAULT_SEPARATORS
+
+
+def make_synthetic_text(size_mb: float, shape: str = "paragraphs", seed: int = 0) -> str:
+    """
+    Build PDF-like synthetic text.
+
+    Shapes: "paragraphs" (wrapped lines grouped into paragraphs), "lines"
+    (wrapped lines with no blank lines, as PyMuPDF returns for dense pages)
+    and "prose" (long unwrapped paragraphs, split down to sentences and words).
+    """
+    rng = random.Random(seed)
+    words = (
+        "the quick brown fox jumps over lazy dog invoice total amount due "
+        "section clause party agreement shall refund policy QX-4411 rev B"
+    ).split()
+
+    def sentence() -> str:
+        return " ".join(rng.choice(words) for _ in range(rng.randint(6, 14)))
+
+    target = int(size_mb * 1024 * 1024)
+    pages = []
+    size = 0
+    while size < target:
+        if shape == "prose":
+            page = "\n\n".join(
+                ". ".join(sentence() for _ in range(rng.randint(20, 60))) + "."
+                for _ in range(rng.randint(1, 3))
+            )
+        else:
+            paragraphs = [
+                "\n".join(
+                    sentence() + ("." if rng.random() < 0.3 else "")
+                    for _ in range(rng.randint(3, 12))
+                )
+                for _ in range(rng.randint(2, 6))
+            ]
+            page = ("\n\n" if shape == "paragraphs" else "\n").join(paragraphs)
+        pages.append(page)
+        size += len(page) + 2
+    return "\n\n".join(pages)[:target]
+
+
+def time_it(label: str, fn, size_mb: float, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<32} {best * 1000:9.1f} ms  {size_mb / best:9.2f} MB/sec")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="Text sizes in MB")
+    parser.add_argument(
+        "--shapes",
+        nargs="+",
+        default=["paragraphs", "lines", "prose"],
+        choices=["paragraphs", "lines", "prose"],
+        help="Synthetic text shapes"
+    )
+    parser.add_argument("--chunk-size", type=int, default=800, help="Chunk size in characters")
+    parser.add_argument("--overlap", type=int, default=200, help="Chunk overlap in characters")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (best is reported)")
+    parser.add_argument("--streaming-docs", type=int, default=2000, help="Random documents for the streaming check")
+    args = parser.parse_args()
+
+    # LangChain logs a warning for every oversized chunk
+    logging.disable(logging.WARNING)
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.overlap,
+        length_function=len,
+        separators=DEFAULT_SEPARATORS
+    )
+
+    for shape in args.shapes:
+        for size_mb in args.sizes:
+            benchmark(splitter, make_synthetic_text(size_mb, shape), shape, size_mb, args)
+
+    if not check_streaming(args.streaming_docs):
+        sys.exit(1)
+
+
+def benchmark(splitter, text: str, shape: str, size_mb: float, args):
+    print(f"{size_mb:g} MB synthetic {shape} text ({len(text)} characters)")
+
+    expected = time_it("langchain split_text", lambda: splitter.split_text(text), size_mb, args.repeat)
+    spans = time_it(
+        "split_spans (offsets)",
+        lambda: split_spans(text, args.chunk_size, args.overlap),
+        size_mb,
+        args.repeat
+    )
+    time_it(
+        "split_spans + slicing",
+        lambda: [text[start:end] for start, end in split_spans(text, args.chunk_size, args.overlap)],
+        size_mb,
+        args.repeat
+    )
+
+    identical = expected == [text[start:end] for start, end in spans]
+    print(f"{len(spans)} chunks, identical output: {identical}\n")
+
+
+def make_random_pages(rng: random.Random) -> list:
+    """Random page texts mixing every separator, including pages that start or end with newlines and blank pages."""
+    separators = ["\n\n", "\n", ". ", " ", "\n\n\n"]
+    pages = []
+    for _ in range(rng.randint(1, 8)):
+        page = "".join(
+            " ".join("x" * rng.randint(1, 12) for _ in range(rng.randint(1, 40))) + rng.choice(separators)
+            for _ in range(rng.randint(0, 30))
+        )
+        if rng.random() < 0.2:
+            page = "\n" + page
+        if rng.random() < 0.2:
+            page += "\n"
+        pages.append("   " if rng.random() < 0.1 else page)
+    return pages
+
+
+def check_streaming(documents: int) -> bool:
+    """Compare iter_chunks on random pages with chunk_spans on the joined text; return True if all match."""
+    mismatches = 0
+    for seed in range(documents):
+        rng = random.Random(seed)
+        pages = make_random_pages(rng)
+        chunk_size = rng.choice([50, 100, 300, 800])
+        chunk_overlap = rng.randint(0, chunk_size // 2)
+        text = "\n\n".join(page for page in pages if page.strip())
+        expected = [(start, end) for start, end, _ in chunk_spans(text, chunk_size, chunk_overlap)]
+        streamed = [
+            (position["start_offset"], position["end_offset"])
+            for chunk, position in iter_chunks(pages, chunk_size, chunk_overlap)
+            if chunk == text[position["start_offset"]:position["end_offset"]]
+        ]
+        if streamed != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"streaming mismatch: seed {seed}, chunk size {chunk_size}, overlap {chunk_overlap}")
+    print(f"Streaming chunking: {documents - mismatches}/{documents} random documents match chunk_text")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark near-duplicate removal of search results.
+
+For each candidate count, builds synthetic search results (chunk-sized
+texts over a shared vocabulary from a few documents, a third of them edited
+copies of earlier results with word-overlap similarities around the 0.7 and
+0.9 thresholds) and compares:
+
+- the previous pairwise implementation, which splits both texts into word
+  sets for every pair of results
+- _deduplicate_search_results with MinHash signatures stored at ingest
+- _deduplicate_search_results without stored signatures (chunks ingested
+  before signatures were added), which computes them per search
+
+and checks that all three keep the same results.
+
+Usage (from the backend directory):
+    python benchmarks/bench_dedup.py [--candidates 50,100,200,500] [--repeats 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.minhash import content_signature
+from rag.retrieve import _deduplicate_search_results
+from utils.schemas import SearchResult
+
+WORDS_PER_CHUNK = 130
+VOCABULARY = [f"w{i}" for i in range(3000)]
+
+
+def legacy_similarity(content1: str, content2: str) -> float:
+    words1 = set(content1.lower().split())
+    words2 = set(content2.lower().split())
+    if not words1 or not words2:
+        return 0.0
+    return len(words1 & words2) / len(words1 | words2)
+
+
+def legacy_deduplicate(search_results, similarity_threshold: float = 0.7):
+    """The pairwise deduplication search used before MinHash signatures."""
+    sorted_results = sorted(search_results, key=lambda x: x.score, reverse=True)
+    deduplicated = []
+    seen_content_hashes = set()
+    for result in sorted_results:
+        content_hash = hash(result.content[:100].strip().lower())
+        if content_hash in seen_content_hashes:
+            continue
+        is_duplicate = False
+        for existing_result in deduplicated:
+            similarity = legacy_similarity(result.content, existing_result.content)
+            if result.doc_id == existing_result.doc_id and similarity > similarity_threshold:
+                is_duplicate = True
+                break
+            if similarity > 0.9:
+                is_duplicate = True
+                break
+        if not is_duplicate:
+            deduplicated.append(result)
+            seen_content_hashes.add(content_hash)
+    return deduplicated
+
+
+def make_results(count: int, seed: int):
+    rng = random.Random(seed)
+    results = []
+    for i in range(count):
+        doc_id = f"doc_{rng.randrange(5)}"
+        if results and rng.random() < 1 / 3:
+            # Edited copy of an earlier result: replace a share of its words (and its opening)
+            words = rng.choice(results).content.split()
+            for position in rng.sample(range(len(words)), rng.choice([2, 8, 15, 25, 40])):
+                words[position] = rng.choice(VOCABULARY)
+            words[0] = f"edit{i}"
+        else:
+            words = [rng.choice(VOCABULARY) for _ in range(WORDS_PER_CHUNK)]
+        results.append(SearchResult(
+            content=" ".join(words),
+            doc_id=doc_id,
+            chunk_id=f"{doc_id}_chunk_{i}",
+            score=rng.random(),
+            metadata={"doc_id": doc_id}
+        ))
+    return results
+
+
+def timed(call, repeats: int):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        kept = call()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return kept, latencies[len(latencies) // 2] * 1000, latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", default="50,100,200,500", help="Comma-separated result counts")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed runs per variant")
+    args = parser.parse_args()
+
+    print(f"{'candidates':>10} {'kept':>5} {'variant':<18} {'p50 ms':>8} {'p95 ms':>8} {'same':>5}")
+    for count in (int(count) for count in args.candidates.split(",")):
+        results = make_results(count, seed=count)
+        signatures = [content_signature(result.content) for result in results]
+
+        baseline, p50, p95 = timed(lambda: legacy_deduplicate(results), args.repeats)
+        expected = [result.chunk_id for result in baseline]
+        print(f"{count:>10} {len(baseline):>5} {'pairwise':<18} {p50:8.2f} {p95:8.2f} {'':>5}")
+
+        variants = [
+            ("minhash (stored)", lambda: _deduplicate_search_results(results, signatures=signatures)),
+            ("minhash (computed)", lambda: _deduplicate_search_results(results)),
+        ]
+        for name, call in variants:
+            kept, p50, p95 = timed(call, args.repeats)
+            same = [result.chunk_id for result in kept] == expected
+            print(f"{count:>10} {len(kept):>5} {name:<18} {p50:8.2f} {p95:8.2f} {str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark document-restricted searches and deletes with the doc_id index.
+
+For each corpus size, loads random vectors (of the embedding model's
+dimension) for one user into a fresh ChromaDB store (in a temporary
+directory), then compares:
+
+- search restricted to a few documents: a collection.query with a
+  doc_id "$in" filter against VectorStore.search, which scores the chunks
+  listed by the doc_id index directly
+- document delete: a collection.delete with a doc_id filter against
+  VectorStore.delete_document, which deletes the indexed chunk IDs
+
+Query embeddings are cached before timing, so the numbers cover the
+indexes, not the model. The keyword index is disabled.
+
+Usage (from the backend directory):
+    python benchmarks/bench_doc_index.py [--sizes 10000,100000,1000000] [--queries 50] [--deletes 20]
+        [--filter-docs 3]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHUNKS_PER_DOC = 50
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def timed(calls):
+    latencies = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated chunks per user")
+    parser.add_argument("--queries", type=int, default=50, help="Filtered searches to time per variant")
+    parser.add_argument("--deletes", type=int, default=20, help="Document deletes to time per variant")
+    parser.add_argument("--filter-docs", type=int, default=3, help="Documents each search is restricted to")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_doc_index_")
+    try:
+        run(args, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run(args, tmp_dir: str):
+    os.environ["VECTOR_STORE_BACKEND"] = "chroma"
+    os.environ["LEXICAL_INDEX_ENABLED"] = "false"
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    os.environ["DOC_INDEX_PATH"] = os.path.join(tmp_dir, "doc_index.sqlite3")
+
+    from rag.vectorstore import COPY_PAGE_SIZE, encode_query, get_vector_store
+
+    # The ChromaDB backend persists under ./data
+    os.chdir(tmp_dir)
+    store = get_vector_store()
+    rng = random.Random(1)
+    queries = [f"query {i}" for i in range(args.queries)]
+    for query in queries:
+        encode_query(query)
+    dimension = len(encode_query(queries[0]))
+
+    print(f"{'chunks':>9} {'operation':<16} {'baseline p50':>13} {'indexed p50':>12} {'baseline p95':>13} {'indexed p95':>12}")
+    for size in (int(size) for size in args.sizes.split(",")):
+        user_id = f"bench{size}"
+        documents = (size + CHUNKS_PER_DOC - 1) // CHUNKS_PER_DOC
+        vectors_rng = np.random.default_rng(size)
+
+        start = time.perf_counter()
+        for first in range(0, size, COPY_PAGE_SIZE):
+            last = min(first + COPY_PAGE_SIZE, size)
+            ids = [f"chunk_{i}" for i in range(first, last)]
+            metadatas = [
+                {"doc_id": f"doc_{i // CHUNKS_PER_DOC}", "chunk_id": ids[i - first], "chunk_index": i % CHUNKS_PER_DOC}
+                for i in range(first, last)
+            ]
+            vectors = vectors_rng.standard_normal((last - first, dimension), dtype=np.float32)
+            store.add_documents(user_id, "bench", [f"chunk text {i}" for i in range(first, last)], metadatas, ids, vectors)
+        print(f"Loaded {size} chunks in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+        collection = store.get_collection(user_id)
+        filters = [[f"doc_{rng.randrange(documents)}" for _ in range(args.filter_docs)] for _ in queries]
+        baseline = timed(
+            lambda query=query, doc_ids=doc_ids: collection.query(
+                query_embeddings=[encode_query(query).tolist()],
+                n_results=args.k,
+                where={"doc_id": {"$in": doc_ids}}
+            )
+            for query, doc_ids in zip(queries, filters)
+        )
+        indexed = timed(
+            lambda query=query, doc_ids=doc_ids: store.search(user_id, query, args.k, doc_ids)
+            for query, doc_ids in zip(queries, filters)
+        )
+        report(size, "filtered search", baseline, indexed)
+
+        doomed = rng.sample(range(documents), min(documents, args.deletes * 2))
+        baseline = timed(
+            lambda doc_id=f"doc_{i}": collection.delete(where={"doc_id": doc_id})
+            for i in doomed[:len(doomed) // 2]
+        )
+        indexed = timed(
+            lambda doc_id=f"doc_{i}": store.delete_document(user_id, doc_id)
+            for i in doomed[len(doomed) // 2:]
+        )
+        report(size, "document delete", baseline, indexed)
+        store.client.delete_collection(name=collection.name)
+
+
+def report(size: int, operation: str, baseline, indexed):
+    print(
+        f"{size:>9} {operation:<16} {percentile(baseline, 0.5):13.2f} {percentile(indexed, 0.5):12.2f} "
+        f"{percentile(baseline, 0.95):13.2f} {percentile(indexed, 0.95):12.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark embedding backends: PyTorch SentenceTransformer vs ONNX Runtime.
+
+For each backend (torch, onnx fp32, onnx int8-quantized) reports chunk
+embedding throughput at the ingestion batch size, single-query latency, and
+cosine agreement of its vectors with the PyTorch ones, to pick the fastest
+acceptable EMBEDDING_BACKEND per deployment. ONNX exports are created under
+--onnx-dir on first run (as get_embedding_model does).
+
+Usage (from the backend directory):
+    python benchmarks/bench_embedding_backends.py [--chunks 512] [--queries 200] [--batch-size 64]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentence_transformers import SentenceTransformer
+
+from rag.ingest import EMBED_BATCH_SIZE
+from rag.onnx_embeddings import EMBEDDING_ONNX_DIR, load_onnx_model
+from rag.vectorstore import EMBEDDING_MODEL_NAME
+
+
+def make_texts(count: int, min_words: int, max_words: int, seed: int):
+    rng = random.Random(seed)
+    words = (
+        "the quick brown fox jumps over lazy dog invoice total amount due "
+        "section clause party agreement shall refund policy QX-4411 rev B "
+        "termination notice period payment terms warranty liability"
+    ).split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def throughput(model, texts, batch_size: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def query_latency(model, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.encode([query], show_progress_bar=False)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=512, help="Chunk-sized texts embedded per throughput run")
+    parser.add_argument("--queries", type=int, default=200, help="Single queries timed for latency")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Encode batch size for chunks")
+    parser.add_argument("--repeat", type=int, default=3, help="Throughput runs per backend (best is reported)")
+    parser.add_argument("--onnx-dir", default=EMBEDDING_ONNX_DIR, help="Directory for ONNX exports")
+    args = parser.parse_args()
+
+    chunks = make_texts(args.chunks, 80, 160, seed=0)
+    queries = make_texts(args.queries, 4, 14, seed=1)
+
+    backends = [("torch", lambda: SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu"))]
+    backends.append(("onnx fp32", lambda: load_onnx_model(EMBEDDING_MODEL_NAME, False, args.onnx_dir)))
+    backends.append(("onnx int8", lambda: load_onnx_model(EMBEDDING_MODEL_NAME, True, args.onnx_dir)))
+
+    reference = None
+    print(f"{len(chunks)} chunks (batch size {args.batch_size}), {len(queries)} queries\n")
+    print(f"{'backend':<12} {'chunks/sec':>11} {'query p50':>10} {'query p95':>10} {'cos mean':>9} {'cos min':>8}")
+
+    for label, load in backends:
+        model = load()
+        model.encode(chunks[:args.batch_size], batch_size=args.batch_size, show_progress_bar=False)  # warm up
+
+        rate = throughput(model, chunks, args.batch_size, args.repeat)
+        p50, p95 = query_latency(model, queries)
+        vectors = model.encode(chunks + queries, batch_size=args.batch_size, show_progress_bar=False)
+        if reference is None:
+            reference = vectors
+        agreement = cosine(vectors, reference)
+
+        print(
+            f"{label:<12} {rate:11.1f} {p50:8.2f}ms {p95:8.2f}ms "
+            f"{agreement.mean():9.5f} {agreement.min():8.5f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark reduced-precision embedding storage: memory and recall@k versus float32.
+
+Embeds a synthetic chunk corpus and query set with the embedding model, then
+searches the compact index (float16 and int8, with and without full-precision
+rescoring) and compares its top-k against exact float32 search. Reports the
+in-memory size of the index, recall@k and mean search latency.
+
+Usage (from the backend directory):
+    python benchmarks/bench_embedding_storage.py [--chunks 20000] [--queries 200] [--k 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.compact_index import EMBEDDING_RESCORE_FACTOR, CompactVectorIndex
+from rag.vectorstore import get_embedding_model
+
+USER_ID = "bench"
+
+
+def make_texts(count: int, min_words: int, max_words: int, seed: int):
+    rng = random.Random(seed)
+    words = (
+        "invoice total amount due payment terms refund policy warranty clause party agreement "
+        "shall termination notice period liability damages confidential information section "
+        "schedule appendix error code QX-4411 revision device firmware battery install reset"
+    ).split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int):
+    distances = (vectors ** 2).sum(axis=1)[None, :] - 2 * queries @ vectors.T
+    return np.argsort(distances, axis=1, kind="stable")[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000, help="Corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to evaluate")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    parser.add_argument("--rescore-factor", type=int, default=EMBEDDING_RESCORE_FACTOR, help="Candidates rescored per result")
+    args = parser.parse_args()
+
+    model = get_embedding_model()
+    print(f"Embedding {args.chunks} chunks and {args.queries} queries...")
+    vectors = model.encode(make_texts(args.chunks, 40, 120, seed=1), show_progress_bar=False).astype(np.float32)
+    queries = model.encode(make_texts(args.queries, 3, 12, seed=2), show_progress_bar=False).astype(np.float32)
+    ids = [f"chunk_{i}" for i in range(args.chunks)]
+    doc_ids = [f"doc_{i // 50}" for i in range(args.chunks)]
+    truth = exact_top_k(vectors, queries, args.k)
+
+    print(f"{'storage':<10} {'rescore':<8} {'index MB':>9} {'float32 MB':>11} {'ratio':>6} {'recall@' + str(args.k):>9} {'search ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for storage in ("float16", "int8"):
+            for rescore in (False, True):
+                index = CompactVectorIndex(
+                    storage=storage,
+                    path=os.path.join(tmp_dir, f"{storage}.sqlite3"),
+                    rescore=rescore,
+                    rescore_factor=args.rescore_factor
+                )
+                if not rescore:
+                    index.add(USER_ID, ids, doc_ids, vectors)
+
+                hits = 0
+                elapsed = 0.0
+                for query, expected in zip(queries, truth):
+                    start = time.perf_counter()
+                    results = index.search(USER_ID, query, args.k)
+                    elapsed += time.perf_counter() - start
+                    hits += len({chunk_id for chunk_id, _ in results} & {ids[i] for i in expected})
+
+                stats = index.stats()
+                print(
+                    f"{storage:<10} {str(rescore):<8} {stats['bytes'] / 2**20:9.2f} {stats['float32_bytes'] / 2**20:11.2f} "
+                    f"{stats['ratio']:6.3f} {hits / (len(queries) * args.k):9.4f} {elapsed / len(queries) * 1000:10.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark vector, lexical (BM25) and hybrid (reciprocal rank fusion) retrieval.
+
+Loads a synthetic corpus (Zipf-distributed words, like natural text) in
+which every tenth chunk carries a unique part number into a fresh store (in
+a temporary directory), then times retrieve_chunks in each mode for topical
+queries and for part-number queries, and reports how often the chunk holding
+the requested part number is in the top k. Query embeddings are cached
+before timing, so the numbers cover the indexes and fusion, not the model.
+
+Usage (from the backend directory):
+    python benchmarks/bench_hybrid_retrieval.py [--chunks 100000] [--queries 200] [--k 5]
+        [--vocabulary 20000] [--backend chroma]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USER_ID = "bench"
+CHUNKS_PER_DOC = 50
+IDENTIFIER_EVERY = 10
+
+
+def make_vocabulary(size: int):
+    """Domain words followed by filler terms, with Zipf word frequencies (the k-th most common word ~ 1/k)."""
+    words = (
+        "invoice total amount due payment terms refund policy warranty clause party agreement "
+        "shall termination notice period liability damages confidential information section "
+        "schedule appendix error code revision device firmware battery install reset replacement"
+    ).split()
+    words += [f"term{i}" for i in range(size - len(words))]
+    return words, [1 / rank for rank in range(1, len(words) + 1)]
+
+
+def make_texts(count: int, min_words: int, max_words: int, seed: int, vocabulary):
+    rng = random.Random(seed)
+    words, weights = vocabulary
+    return [" ".join(rng.choices(words, weights, k=rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def part_number(i: int) -> str:
+    return f"PN-{i * 7919 % 1000003:07d}"
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def time_queries(retrieve_chunks, queries, k: int, mode: str):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(retrieve_chunks(query, USER_ID, top_k=k, mode=mode))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000, help="Corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to time per query set")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct words in the corpus")
+    parser.add_argument("--backend", choices=["chroma", "hnsw"], default="chroma", help="Vector store backend")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_hybrid_")
+    try:
+        run(args, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run(args, tmp_dir: str):
+    os.environ["VECTOR_STORE_BACKEND"] = args.backend
+    os.environ["HNSW_INDEX_DIR"] = os.path.join(tmp_dir, "hnsw")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(tmp_dir, "lexical_index.sqlite3")
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+
+    from rag.retrieve import retrieve_chunks
+    from rag.vectorstore import COPY_PAGE_SIZE, encode_query, get_embedding_model, get_vector_store
+
+    model = get_embedding_model()
+    print(f"Embedding {args.chunks} chunks...")
+    vocabulary = make_vocabulary(args.vocabulary)
+    texts = make_texts(args.chunks, 40, 120, seed=1, vocabulary=vocabulary)
+    for i in range(0, len(texts), IDENTIFIER_EVERY):
+        texts[i] += f" replacement part {part_number(i)}"
+    vectors = model.encode(texts, show_progress_bar=False)
+
+    # The ChromaDB backend persists under ./data
+    os.chdir(tmp_dir)
+    store = get_vector_store()
+    ids = [f"chunk_{i}" for i in range(len(texts))]
+    metadatas = [
+        {"doc_id": f"doc_{i // CHUNKS_PER_DOC}", "chunk_id": ids[i], "chunk_index": i % CHUNKS_PER_DOC}
+        for i in range(len(texts))
+    ]
+    start = time.perf_counter()
+    for first in range(0, len(texts), COPY_PAGE_SIZE):
+        last = first + COPY_PAGE_SIZE
+        store.add_documents(USER_ID, "bench", texts[first:last], metadatas[first:last], ids[first:last], vectors[first:last])
+    print(f"Indexed in {time.perf_counter() - start:.1f}s ({args.backend} backend, vectors and keyword index)")
+
+    rng = random.Random(2)
+    topical = make_texts(args.queries, 3, 12, seed=3, vocabulary=vocabulary)
+    targets = [rng.randrange(0, len(texts), IDENTIFIER_EVERY) for _ in range(args.queries)]
+    identifiers = [f"replacement part {part_number(i)}" for i in targets]
+    for query in topical + identifiers:
+        encode_query(query)
+
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'id p50':>8} {'id p95':>8} {'id hit@' + str(args.k):>9}")
+    for mode in ("vector", "lexical", "hybrid"):
+        latencies, _ = time_queries(retrieve_chunks, topical, args.k, mode)
+        id_latencies, id_results = time_queries(retrieve_chunks, identifiers, args.k, mode)
+        hits = sum(
+            any(chunk.chunk_id == ids[target] for chunk in chunks)
+            for target, chunks in zip(targets, id_results)
+        )
+        print(
+            f"{mode:<8} {percentile(latencies, 0.5):8.2f} {percentile(latencies, 0.95):8.2f} "
+            f"{percentile(id_latencies, 0.5):8.2f} {percentile(id_latencies, 0.95):8.2f} {hits / len(targets):9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark PDF text extraction throughput (pages/sec).
+
+Compares the previous two-pass extraction (extract_text_from_pdf walking pages
+serially, then get_pdf_metadata reopening the file) with the single-pass
+extract_pdf, serially and with page-range parallelism.
+
+Usage (from the backend directory):
+    python benchmarks/bench_pdf_extract.py [--pdf path/to/file.pdf] [--pages 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fitz  # PyMuPDF
+
+from utils.pdf_parser import extract_pdf, get_pdf_metadata, PDF_EXTRACT_WORKERS
+
+
+def legacy_extract(pdf_path: str):
+    """The pre-single-pass implementation: serial page walk plus a second open."""
+    doc = fitz.open(pdf_path)
+    text_parts = []
+    for page_num in range(len(doc)):
+        text = doc[page_num].get_text()
+        if text.strip():
+            text_parts.append(text)
+    doc.close()
+    text = "\n\n".join(text_parts)
+    return text, get_pdf_metadata(pdf_path)
+
+
+def make_synthetic_pdf(path: str, pages: int):
+    """Write a PDF with dense text on every page."""
+    doc = fitz.open()
+    line = "The quick brown fox jumps over the lazy dog. Part number QX-4411 rev B. "
+    body = "\n".join(f"{i:03d} {line}" for i in range(60))
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((36, 36), f"Page {page_num + 1}\n{body}", fontsize=7)
+    doc.save(path)
+    doc.close()
+
+
+def time_it(label: str, fn, page_count: int, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<32} {best * 1000:9.1f} ms  {page_count / best:9.1f} pages/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to benchmark (a synthetic one is generated if omitted)")
+    parser.add_argument("--pages", type=int, default=1000, help="Pages in the synthetic PDF")
+    parser.add_argument("--workers", type=int, default=PDF_EXTRACT_WORKERS, help="Parallel extraction workers")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per variant (best is reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = os.path.join(tmp, "synthetic.pdf")
+            make_synthetic_pdf(pdf_path, args.pages)
+
+        page_count = get_pdf_metadata(pdf_path)["page_count"]
+        print(f"{pdf_path}: {page_count} pages, {args.workers} workers")
+
+        time_it("legacy (two-pass, serial)", lambda: legacy_extract(pdf_path), page_count, args.repeat)
+        time_it("extract_pdf (serial)", lambda: extract_pdf(pdf_path, max_workers=1), page_count, args.repeat)
+        time_it(
+            "extract_pdf (parallel)",
+            lambda: extract_pdf(pdf_path, parallel_min_pages=0, max_workers=args.workers),
+            page_count,
+            args.repeat
+        )
+
+
+if __name__ == "__main__":
+    main()
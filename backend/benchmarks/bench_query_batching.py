@@ -0,0 +1,82 @@
+"""
+Benchmark query embedding throughput under concurrent load.
+
+Runs the same query stream from N concurrent client threads, once with every
+thread encoding its own query (batch size 1, the previous behavior) and once
+through the QueryEmbeddingBatcher, and reports queries/sec, per-query latency
+and the batcher's batch-size and queueing-delay metrics.
+
+Usage (from the backend directory):
+    python benchmarks/bench_query_batching.py [--queries 512] [--concurrency 1 8 32] [--max-wait-ms 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.query_batcher import QueryEmbeddingBatcher, QUERY_BATCH_MAX_SIZE
+from rag.vectorstore import get_embedding_model
+
+
+def make_queries(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = (
+        "what is the refund policy for invoice total amount due under section "
+        "clause agreement party shall terminate notice period payment terms"
+    ).split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(4, 12))) + "?" for _ in range(count)]
+
+
+def run(label: str, encode, queries, concurrency: int):
+    latencies = []
+
+    def timed(query):
+        start = time.perf_counter()
+        encode(query)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(timed, queries))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(f"{label:<28} {len(queries) / elapsed:9.1f} queries/sec  p50 {p50:7.1f} ms  p95 {p95:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=512, help="Queries per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrent client threads")
+    parser.add_argument("--max-batch-size", type=int, default=QUERY_BATCH_MAX_SIZE, help="Batcher max batch size")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Batcher max wait window")
+    args = parser.parse_args()
+
+    model = get_embedding_model()
+    queries = make_queries(args.queries)
+    model.encode(queries[:8], show_progress_bar=False)  # warm up
+
+    for concurrency in args.concurrency:
+        print(f"{args.queries} queries, {concurrency} concurrent clients")
+        run("encode per query", lambda q: model.encode([q], show_progress_bar=False), queries, concurrency)
+
+        batcher = QueryEmbeddingBatcher(model, args.max_batch_size, args.max_wait_ms)
+        batcher.start()
+        run("micro-batched", batcher.encode, queries, concurrency)
+        batcher.stop()
+
+        stats = batcher.stats()
+        print(
+            f"  mean batch {stats['mean_batch_size']}, mean queue delay {stats['mean_queue_delay_ms']} ms, "
+            f"p95 queue delay {stats.get('p95_queue_delay_ms', 0.0)} ms\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark query embedding latency while ingestion workers embed in bulk.
+
+Starts worker processes that embed chunk batches in a loop (as ingestion
+workers do) and measures single-query embedding latency in this process:
+with no ingest load, with workers at normal priority, and with the
+ingestion queue's query priority (lowered worker CPU priority plus workers
+holding bulk batches while queries are in flight).
+
+Usage (from the backend directory):
+    python benchmarks/bench_query_under_ingest.py [--workers 2] [--queries 100]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Every chunk and query must reach the model (also applies to the spawned workers)
+os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+os.environ["QUERY_CACHE_ENABLED"] = "false"
+
+from rag.ingest import EMBED_BATCH_SIZE
+from rag.jobs import INGEST_WORKER_NICE, _init_worker
+from rag.vectorstore import encode_query, encode_texts, get_embedding_model, track_query_activity
+
+
+def make_texts(count: int, min_words: int, max_words: int, seed: int):
+    rng = random.Random(seed)
+    words = (
+        "the quick brown fox jumps over lazy dog invoice total amount due "
+        "section clause party agreement shall refund policy QX-4411 rev B"
+    ).split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def ingest_worker(stop, ready, query_activity, nice: int, batch_size: int, seed: int):
+    """Embed chunk batches until stopped, like an ingestion worker."""
+    _init_worker(None, query_activity, nice)
+    get_embedding_model()
+    chunks = make_texts(batch_size, 80, 160, seed)
+    ready.release()
+    while not stop.is_set():
+        encode_texts(chunks)
+
+
+def measure(queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        encode_query(query)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.005)  # queries arrive spaced out, not back to back
+    latencies.sort()
+    return (
+        latencies[len(latencies) // 2] * 1000,
+        latencies[int(len(latencies) * 0.95)] * 1000,
+        latencies[-1] * 1000
+    )
+
+
+def run(label: str, queries, workers: int, priority: bool, batch_size: int):
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    ready = ctx.Semaphore(0)
+    query_activity = ctx.Value("i", 0) if priority else None
+    processes = [
+        ctx.Process(
+            target=ingest_worker,
+            args=(stop, ready, query_activity, INGEST_WORKER_NICE if priority else 0, batch_size, seed)
+        )
+        for seed in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+
+    track_query_activity(query_activity)
+    try:
+        p50, p95, worst = measure(queries)
+    finally:
+        track_query_activity(None)
+        stop.set()
+        for process in processes:
+            process.join()
+
+    print(f"{label:<28} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  max {worst:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="Bulk embedding worker processes")
+    parser.add_argument("--queries", type=int, default=100, help="Queries timed per run")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks per bulk batch")
+    args = parser.parse_args()
+
+    get_embedding_model()
+    queries = make_texts(args.queries, 4, 14, seed=99)
+    encode_query(queries[0])  # warm up
+
+    print(f"{args.queries} queries, {args.workers} ingest workers, batch size {args.batch_size}, {os.cpu_count()} CPUs")
+    run("no ingest load", queries, 0, False, args.batch_size)
+    run("ingest, no priority", queries, args.workers, False, args.batch_size)
+    run("ingest, query priority", queries, args.workers, True, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
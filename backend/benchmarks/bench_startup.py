@@ -0,0 +1,77 @@
+"""
+Benchmark API cold start: time until the server answers /health and /ready.
+
+Starts uvicorn in a subprocess and polls both endpoints. /health answers as
+soon as the server accepts connections; /ready once the embedding model is
+warmed up and the vector store is open. Builds without /ready (404) load the
+model before accepting connections, so they are counted as ready at /health.
+Needs MongoDB to be reachable (startup creates indexes).
+
+Usage (from the backend directory):
+    python benchmarks/bench_startup.py [--runs 3] [--app main:app] [--port 8765]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def status_of(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def cold_start(app: str, port: int, timeout: float):
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", BACKEND_DIR, "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    health = ready = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode}")
+            if health is None and status_of(f"{base}/health") == 200:
+                health = time.perf_counter() - start
+            if health is not None:
+                code = status_of(f"{base}/ready")
+                if code in (200, 404):
+                    ready = time.perf_counter() - start if code == 200 else health
+                    break
+            time.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait()
+    return health, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to measure")
+    parser.add_argument("--app", default="main:app", help="ASGI app to start")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for readiness")
+    args = parser.parse_args()
+
+    for run in range(1, args.runs + 1):
+        health, ready = cold_start(args.app, args.port, args.timeout)
+        health_text = f"{health:6.2f} s" if health is not None else "timeout"
+        ready_text = f"{ready:6.2f} s" if ready is not None else "timeout"
+        print(f"run {run}: accepting connections after {health_text}, ready after {ready_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare character-sized and token-sized chunking against the embedding model's limit.
+
+For a PDF (or a synthetic one), reports per chunking mode the number of chunks,
+their token counts, how many exceed the embedding model's max sequence length
+(and would be silently truncated) and how many tokens are lost that way. Also
+times batch tokenization against tokenizing chunks one at a time.
+
+Usage (from the backend directory):
+    python benchmarks/bench_token_chunking.py [--pdf path/to/file.pdf] [--pages 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_pdf_extract import make_synthetic_pdf
+from rag.ingest import chunking_params, iter_chunks
+from rag.vectorstore import count_tokens, get_embedding_model, get_max_tokens
+from utils.pdf_parser import extract_pdf
+
+
+def report_mode(mode: str, pages, max_tokens: int):
+    chunk_size, chunk_overlap, length_function = chunking_params(mode)
+
+    start = time.perf_counter()
+    chunks = [chunk for chunk, _ in iter_chunks(pages, chunk_size, chunk_overlap, length_function)]
+    elapsed = time.perf_counter() - start
+
+    counts = count_tokens(chunks)
+    truncated = [count for count in counts if count > max_tokens]
+    print(
+        f"{mode:<11} {len(chunks):7d} chunks  {sum(counts) / max(len(chunks), 1):7.1f} avg tokens  "
+        f"{max(counts, default=0):5d} max  {len(truncated):6d} truncated  "
+        f"{sum(count - max_tokens for count in truncated):8d} tokens lost  {elapsed * 1000:8.1f} ms"
+    )
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", help="PDF to analyze (a synthetic one is generated if omitted)")
+    parser.add_argument("--pages", type=int, default=200, help="Pages in the synthetic PDF")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = args.pdf
+        if not pdf_path:
+            pdf_path = os.path.join(tmp, "synthetic.pdf")
+            make_synthetic_pdf(pdf_path, args.pages)
+        pages = extract_pdf(pdf_path)["pages"]
+
+    get_embedding_model()
+    max_tokens = get_max_tokens()
+    print(f"{pdf_path}: {len(pages)} pages, model sees {max_tokens} tokens per chunk")
+
+    chunks = report_mode("characters", pages, max_tokens)
+    report_mode("tokens", pages, max_tokens)
+
+    start = time.perf_counter()
+    for chunk in chunks:
+        count_tokens([chunk])
+    one_by_one = time.perf_counter() - start
+    start = time.perf_counter()
+    count_tokens(chunks)
+    batched = time.perf_counter() - start
+    print(
+        f"tokenizing {len(chunks)} chunks: {one_by_one * 1000:.1f} ms one at a time, "
+        f"{batched * 1000:.1f} ms batched"
+    )
+
+
+if __name__ == "__main__":
+    main()
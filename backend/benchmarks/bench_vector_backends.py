@@ -0,0 +1,103 @@
+"""
+Benchmark the vector store backends: ChromaDB versus the in-process HNSW index.
+
+Loads the same embedded chunk corpus into each backend (in temporary
+directories) and reports insert throughput, search latency with and without a
+doc_id filter, and recall@k against exact float32 search. Query embeddings
+are cached before timing, so the numbers cover the index, not the model.
+
+Usage (from the backend directory):
+    python benchmarks/bench_vector_backends.py [--chunks 20000] [--queries 200] [--k 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.hnsw_store import HNSW_EF_SEARCH, HNSW_M, HnswVectorStore
+from rag.vectorstore import COPY_PAGE_SIZE, VectorStore, encode_query, get_embedding_model
+
+USER_ID = "bench"
+CHUNKS_PER_DOC = 50
+
+
+def make_texts(count: int, min_words: int, max_words: int, seed: int):
+    rng = random.Random(seed)
+    words = (
+        "invoice total amount due payment terms refund policy warranty clause party agreement "
+        "shall termination notice period liability damages confidential information section "
+        "schedule appendix error code QX-4411 revision device firmware battery install reset"
+    ).split()
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def run(label: str, store, texts, vectors, queries, truth, filters, k: int):
+    ids = [f"chunk_{i}" for i in range(len(texts))]
+    metadatas = [{"doc_id": f"doc_{i // CHUNKS_PER_DOC}", "chunk_index": i % CHUNKS_PER_DOC} for i in range(len(texts))]
+
+    start = time.perf_counter()
+    for first in range(0, len(texts), COPY_PAGE_SIZE):
+        last = first + COPY_PAGE_SIZE
+        store.add_documents(USER_ID, "bench", texts[first:last], metadatas[first:last], ids[first:last], vectors[first:last])
+    insert_rate = len(texts) / (time.perf_counter() - start)
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = store.search(USER_ID, query, k)
+        latencies.append(time.perf_counter() - start)
+        hits += len({result["id"] for result in results} & {ids[i] for i in expected})
+
+    filtered = []
+    for query, doc_ids in zip(queries, filters):
+        start = time.perf_counter()
+        store.search(USER_ID, query, k, doc_ids=doc_ids)
+        filtered.append(time.perf_counter() - start)
+
+    print(
+        f"{label:<8} {insert_rate:10.0f} {percentile(latencies, 0.5):8.2f} {percentile(latencies, 0.95):8.2f} "
+        f"{percentile(filtered, 0.5):10.2f} {hits / (len(queries) * k):9.4f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000, help="Corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Queries to time")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    args = parser.parse_args()
+
+    model = get_embedding_model()
+    print(f"Embedding {args.chunks} chunks and {args.queries} queries...")
+    texts = make_texts(args.chunks, 40, 120, seed=1)
+    vectors = model.encode(texts, show_progress_bar=False).astype(np.float32)
+    queries = make_texts(args.queries, 3, 12, seed=2)
+    query_vectors = np.vstack([encode_query(query) for query in queries]).astype(np.float32)
+
+    distances = (vectors ** 2).sum(axis=1)[None, :] - 2 * query_vectors @ vectors.T
+    truth = np.argsort(distances, axis=1, kind="stable")[:, :args.k]
+    rng = random.Random(3)
+    documents = (args.chunks + CHUNKS_PER_DOC - 1) // CHUNKS_PER_DOC
+    filters = [[f"doc_{rng.randrange(documents)}" for _ in range(3)] for _ in queries]
+
+    print(f"HNSW M={HNSW_M}, ef={HNSW_EF_SEARCH}")
+    print(f"{'backend':<8} {'chunks/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'filtered':>10} {'recall@' + str(args.k):>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run("chroma", VectorStore(os.path.join(tmp_dir, "chroma")), texts, vectors, queries, truth, filters, args.k)
+        run("hnsw", HnswVectorStore(os.path.join(tmp_dir, "hnsw")), texts, vectors, queries, truth, filters, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import logging
 import os
 from dotenv import load_dotenv
@@ -8,7 +11,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from models.database import init_db, close_db
-from routes import auth, ingestion, query, search, documents
+from routes import admin, auth, ingestion, query, search, documents
+from utils.uploads import MAX_BATCH_UPLOAD_BYTES, MAX_UPLOAD_BYTES, UploadSizeLimitMiddleware
 
 # Configure logging
 logging.basicConfig(
@@ -37,6 +41,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Upload size limits, enforced while the request body is received
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits=[
+        ("POST", r"/upload/?", MAX_UPLOAD_BYTES),
+        ("POST", r"/upload/batch/?", MAX_BATCH_UPLOAD_BYTES),
+        ("PUT", r"/documents/[^/]+/?", MAX_UPLOAD_BYTES),
+    ]
+)
+
+# Readiness of the components loaded in the background, reported by /ready
+_readiness = {"model": False, "vector_store": False, "error": None}
+
+
+def _warm_up():
+    """Load the embedding model (running a dummy encode) and open the vector store."""
+    from rag.vectorstore import get_embedding_model, get_vector_store
+    
+    logger.info("Warming up embedding model...")
+    get_embedding_model().encode(["DocuMind warm-up"], show_progress_bar=False)
+    _readiness["model"] = True
+    logger.info("Embedding model ready")
+    
+    get_vector_store()
+    _readiness["vector_store"] = True
+    logger.info("Vector store ready")
+
+
+async def _background_warm_up():
+    try:
+        await run_in_threadpool(_warm_up)
+    except Exception as e:
+        _readiness["error"] = str(e)
+        logger.error(f"Warm-up failed: {str(e)}")
+
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
@@ -44,15 +84,42 @@ async def startup_event():
     await init_db()
     logger.info("Database initialized")
     
-    # Pre-load embedding model
-    logger.info("Pre-loading embedding model...")
-    from rag.vectorstore import get_embedding_model
-    get_embedding_model()
-    logger.info("Embedding model loaded")
+    # Load the model and vector store in the background so the server accepts
+    # connections right away; /ready reports when they are usable
+    app.state.warm_up_task = asyncio.create_task(_background_warm_up())
+    
+    # Load the query embedding cache snapshot and start the query embedding batcher
+    from rag.query_cache import get_query_cache
+    get_query_cache()
+    from rag.query_batcher import get_query_batcher
+    batcher = get_query_batcher()
+    if batcher:
+        batcher.start()
+    
+    # Start background ingestion workers
+    from rag.jobs import get_ingestion_queue
+    await get_ingestion_queue().start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    logger.info("Stopping ingestion workers...")
+    from rag.jobs import get_ingestion_queue
+    await get_ingestion_queue().stop()
+    
+    from rag.query_batcher import get_query_batcher
+    batcher = get_query_batcher()
+    if batcher:
+        batcher.stop()
+    
+    from rag.async_vectorstore import get_async_vector_store
+    get_async_vector_store().shutdown()
+    
+    from rag.query_cache import get_query_cache
+    query_cache = get_query_cache()
+    if query_cache:
+        query_cache.save()
+    
     logger.info("Closing database connection...")
     await close_db()
 
@@ -63,12 +130,54 @@ async def health_check():
     return {"status": "healthy", "message": "DocuMind API is running"}
 
 
+# Readiness probe: 503 until the embedding model and vector store are usable
+@app.get("/ready")
+async def readiness_check():
+    ready = _readiness["model"] and _readiness["vector_store"]
+    if ready:
+        status = "ready"
+    elif _readiness["error"]:
+        status = "failed"
+    else:
+        status = "starting"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": status, **_readiness}
+    )
+
+
+# Monitoring counters
+@app.get("/metrics")
+async def metrics():
+    from rag.async_vectorstore import get_async_vector_store
+    from rag.compact_index import get_compact_index
+    from rag.embedding_cache import get_embedding_cache
+    from rag.query_batcher import get_query_batcher
+    from rag.query_cache import get_query_cache
+    from rag.residency import get_index_residency
+    from rag.vectorstore import VECTOR_STORE_SHARDS, get_vector_store
+    cache = get_embedding_cache()
+    batcher = get_query_batcher()
+    query_cache = get_query_cache()
+    compact_index = get_compact_index()
+    return {
+        "embedding_cache": cache.stats() if cache else None,
+        "query_batcher": batcher.stats() if batcher else None,
+        "query_cache": query_cache.stats() if query_cache else None,
+        "compact_index": compact_index.stats() if compact_index else None,
+        "index_residency": get_index_residency().stats(),
+        "vector_store_executor": get_async_vector_store().stats(),
+        "vector_store_shards": get_vector_store().stats() if VECTOR_STORE_SHARDS > 1 and _readiness["vector_store"] else None
+    }
+
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(ingestion.router)
 app.include_router(query.router)
 app.include_router(search.router)
 app.include_router(documents.router)
+app.include_router(admin.router)
 
 
 if __name__ == "__main__":
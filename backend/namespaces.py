@@ -0,0 +1,43 @@
+"""
+Export or import a user's vector namespace (chunks, metadata and vectors).
+
+An export is a directory holding embeddings.npy (a float32 matrix, one row
+per chunk, memory-mappable with np.load(mmap_mode="r")), chunks.jsonl.gz
+(chunk IDs, texts and metadata in the same order) and manifest.json. Both
+directions stream pages, so memory use stays flat for large namespaces;
+imports reuse the exported vectors instead of re-embedding. Uses the
+vector store configured by the environment (VECTOR_STORE_BACKEND, ...);
+stop the API server first when it shares the same data directory.
+
+Usage (from the backend directory):
+    python namespaces.py export <user_id> <directory>
+    python namespaces.py import <user_id> <directory>
+"""
+import argparse
+import json
+import logging
+
+from dotenv import load_dotenv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import"], help="Direction")
+    parser.add_argument("user_id", help="User whose namespace is exported, or the user to import into")
+    parser.add_argument("directory", help="Export directory (new or empty when exporting)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    from rag.namespace_export import export_namespace, import_namespace
+
+    if args.command == "export":
+        manifest = export_namespace(args.user_id, args.directory)
+    else:
+        manifest = import_namespace(args.user_id, args.directory)
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Threads running blocking vector store work (model encodes, index and database I/O)
+VECTOR_STORE_WORKERS = int(os.getenv("VECTOR_STORE_WORKERS", "16"))
+# Calls allowed to run at once; further callers wait (without blocking the event loop)
+VECTOR_STORE_MAX_CONCURRENCY = int(os.getenv("VECTOR_STORE_MAX_CONCURRENCY", str(VECTOR_STORE_WORKERS)))
+
+# Recent queue waits kept for percentile metrics
+_WAIT_SAMPLES = 1000
+
+
+class AsyncVectorStore:
+    """
+    Async facade over the vector store (get_vector_store()).
+
+    Every call runs in a dedicated thread pool, so model encodes and index
+    I/O never block the event loop, and searches are not queued behind
+    unrelated work in the default executor. A semaphore bounds how many calls
+    run at once; callers beyond it wait on the event loop, and the facade
+    reports that queue's depth and waiting times. The store is resolved
+    inside the worker thread, so the first call may also load it.
+    """
+
+    def __init__(self, workers: int = VECTOR_STORE_WORKERS, max_concurrency: int = VECTOR_STORE_MAX_CONCURRENCY):
+        self.workers = max(1, workers)
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="vector-store")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Metrics (updated on the event loop)
+        self._queued = 0
+        self._running = 0
+        self._max_queued = 0
+        self._calls = 0
+        self._errors = 0
+        self._waits = deque(maxlen=_WAIT_SAMPLES)
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # A semaphore belongs to one event loop; make a new one if the loop changed
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        Run a blocking function in the vector store executor.
+
+        Args:
+            fn: Function to call (e.g. a vector store method or retrieval function)
+            *args, **kwargs: Its arguments
+
+        Returns:
+            The function's return value (its exceptions are raised here)
+        """
+        semaphore = self._get_semaphore()
+        queued_at = time.perf_counter()
+        self._queued += 1
+        self._max_queued = max(self._max_queued, self._queued)
+        try:
+            await semaphore.acquire()
+        finally:
+            self._queued -= 1
+
+        started_at = time.perf_counter()
+        self._waits.append(started_at - queued_at)
+        self._total_wait += started_at - queued_at
+        self._running += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._finish(semaphore, started_at, None)
+            raise
+
+        # The slot is released when the work itself ends, not when the caller
+        # stops waiting: a cancelled request leaves its call running, and that
+        # call keeps counting against the concurrency limit until it finishes
+        def done(future):
+            try:
+                loop.call_soon_threadsafe(self._finish, semaphore, started_at, future)
+            except RuntimeError:
+                pass  # Event loop closed
+
+        future.add_done_callback(done)
+        return await asyncio.wrap_future(future)
+
+    def _finish(self, semaphore: asyncio.Semaphore, started_at: float, future):
+        """Record a finished call and free its slot (on the event loop)."""
+        self._running -= 1
+        self._calls += 1
+        self._total_run += time.perf_counter() - started_at
+        if future is None or (not future.cancelled() and future.exception() is not None):
+            self._errors += 1
+        semaphore.release()
+
+    async def _call(self, method: str, *args, **kwargs):
+        from rag.vectorstore import get_vector_store
+
+        def call():
+            return getattr(get_vector_store(), method)(*args, **kwargs)
+
+        return await self.run(call)
+
+    async def asearch(
+        self,
+        user_id: str,
+        query: str,
+        n_results: int = 5,
+        doc_ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None
+    ) -> List[Dict]:
+        """Async VectorStore.search."""
+        return await self._call("search", user_id, query, n_results=n_results, doc_ids=doc_ids, where=where)
+
+    async def asearch_many(
+        self,
+        user_id: str,
+        queries: List[str],
+        n_results: List[int],
+        doc_ids: List[Optional[List[str]]]
+    ) -> List[List[Dict]]:
+        """Async VectorStore.search_many."""
+        return await self._call("search_many", user_id, queries, n_results, doc_ids)
+
+    async def aadd_documents(
+        self,
+        user_id: str,
+        doc_id: str,
+        texts: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        embeddings=None
+    ):
+        """Async VectorStore.add_documents."""
+        await self._call("add_documents", user_id, doc_id, texts, metadatas, ids, embeddings)
+
+    async def adelete_document(self, user_id: str, doc_id: str, revision: Optional[int] = None):
+        """Async VectorStore.delete_document."""
+        await self._call("delete_document", user_id, doc_id, revision)
+
+    def shutdown(self):
+        """Stop the executor (running calls finish; no new calls are accepted)."""
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        """Return concurrency, queue-depth and waiting-time metrics."""
+        waits = sorted(self._waits)
+        calls = self._calls
+        stats = {
+            "workers": self.workers,
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queued": self._queued,
+            "max_queued": self._max_queued,
+            "calls": calls,
+            "errors": self._errors,
+            "mean_queue_wait_ms": round(self._total_wait / calls * 1000, 3) if calls else 0.0,
+            "mean_run_ms": round(self._total_run / calls * 1000, 3) if calls else 0.0,
+        }
+        if waits:
+            stats["p50_queue_wait_ms"] = round(waits[len(waits) // 2] * 1000, 3)
+            stats["p95_queue_wait_ms"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3)
+            stats["max_queue_wait_ms"] = round(waits[-1] * 1000, 3)
+        return stats
+
+
+# Global async facade instance
+_async_vector_store: Optional[AsyncVectorStore] = None
+
+
+def get_async_vector_store() -> AsyncVectorStore:
+    """Get or create the global async vector store facade."""
+    global _async_vector_store
+    if _async_vector_store is None:
+        _async_vector_store = AsyncVectorStore()
+    return _async_vector_store
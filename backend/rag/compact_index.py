@@ -0,0 +1,406 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from rag.residency import ID_OVERHEAD_BYTES, get_index_residency
+
+logger = logging.getLogger(__name__)
+
+# Embedding storage precision: "float32" keeps vectors in ChromaDB (default);
+# "float16" or "int8" keeps compact codes in memory here instead
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32").lower()
+COMPACT_INDEX_PATH = os.getenv("COMPACT_INDEX_PATH", "./data/compact_index.sqlite3")
+# Re-rank the best EMBEDDING_RESCORE_FACTOR * n approximate candidates with full-precision vectors
+EMBEDDING_RESCORE = os.getenv("EMBEDDING_RESCORE", "true").lower() == "true"
+EMBEDDING_RESCORE_FACTOR = int(os.getenv("EMBEDDING_RESCORE_FACTOR", "4"))
+
+COMPACT_STORAGES = ("float16", "int8")
+
+# Rows scored per block (bounds the temporary float32 copy of the codes)
+_SCORE_BLOCK = 16384
+# Rows read per SQLite fetch when loading a user's vectors
+_LOAD_PAGE = 5000
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def quantize(vectors: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Encode float32 vectors in a compact storage format.
+
+    float16 is a plain cast. int8 is symmetric scalar quantization with one
+    scale per vector: code = round(v / scale), scale = max(|v|) / 127.
+
+    Returns:
+        Tuple of (codes, per-vector scales or None for float16)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if storage == "float16":
+        return vectors.astype(np.float16), None
+    if storage == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    raise ValueError(f"Unknown compact storage: {storage!r} (expected one of {COMPACT_STORAGES})")
+
+
+def dequantize(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """Decode compact codes back to (approximate) float32 vectors."""
+    vectors = codes.astype(np.float32)
+    if scales is not None:
+        vectors *= scales[:, None]
+    return vectors
+
+
+class _UserVectors:
+    """
+    In-memory compact vectors of one user, stored as contiguous growable arrays.
+
+    Row i holds the codes of ids[i]; deleting a row moves the last row into
+    its slot so the arrays stay dense. Document IDs are interned to small
+    integers so doc_id filters are a vectorized isin over one array.
+    """
+
+    def __init__(self, storage: str):
+        self.storage = storage
+        self.size = 0
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.doc_codes = np.empty(0, dtype=np.int32)
+        self.doc_index: Dict[str, int] = {}
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        self.sq_norms = np.empty(0, dtype=np.float32)
+
+    def _reserve(self, count: int, dim: int, dtype):
+        """Grow the arrays (geometrically) to hold count more rows."""
+        needed = self.size + count
+        capacity = 0 if self.codes is None else len(self.codes)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+
+        codes = np.empty((capacity, dim), dtype=dtype)
+        doc_codes = np.empty(capacity, dtype=np.int32)
+        sq_norms = np.empty(capacity, dtype=np.float32)
+        if self.codes is not None:
+            codes[:self.size] = self.codes[:self.size]
+            doc_codes[:self.size] = self.doc_codes[:self.size]
+            sq_norms[:self.size] = self.sq_norms[:self.size]
+        self.codes, self.doc_codes, self.sq_norms = codes, doc_codes, sq_norms
+
+        if self.storage == "int8":
+            scales = np.empty(capacity, dtype=np.float32)
+            if self.scales is not None:
+                scales[:self.size] = self.scales[:self.size]
+            self.scales = scales
+
+    def add(self, ids: Sequence[str], doc_ids: Sequence[str], vectors: np.ndarray):
+        """Add (or replace) vectors."""
+        replaced = [chunk_id for chunk_id in ids if chunk_id in self.rows]
+        if replaced:
+            self.remove(replaced)
+
+        codes, scales = quantize(vectors, self.storage)
+        self._reserve(len(ids), codes.shape[1], codes.dtype)
+
+        start, end = self.size, self.size + len(ids)
+        self.codes[start:end] = codes
+        if scales is not None:
+            self.scales[start:end] = scales
+        decoded = dequantize(codes, scales)
+        self.sq_norms[start:end] = np.einsum("ij,ij->i", decoded, decoded)
+        self.doc_codes[start:end] = [self.doc_index.setdefault(doc_id, len(self.doc_index)) for doc_id in doc_ids]
+
+        for offset, chunk_id in enumerate(ids):
+            self.rows[chunk_id] = start + offset
+        self.ids.extend(ids)
+        self.size = end
+
+    def remove(self, ids: Iterable[str]):
+        """Remove vectors by ID (unknown IDs are ignored)."""
+        for chunk_id in ids:
+            row = self.rows.pop(chunk_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                moved = self.ids[last]
+                self.ids[row] = moved
+                self.rows[moved] = row
+                self.codes[row] = self.codes[last]
+                self.doc_codes[row] = self.doc_codes[last]
+                self.sq_norms[row] = self.sq_norms[last]
+                if self.scales is not None:
+                    self.scales[row] = self.scales[last]
+            self.ids.pop()
+            self.size = last
+
+    def ids_for_document(self, doc_id: str) -> List[str]:
+        code = self.doc_index.get(doc_id)
+        if code is None:
+            return []
+        return [self.ids[row] for row in np.flatnonzero(self.doc_codes[:self.size] == code)]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        doc_ids: Optional[Sequence[str]] = None,
+        allowed_ids: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Return the k nearest rows by (approximate) squared L2 distance.
+
+        Distances are |q|^2 + |v|^2 - 2 q.v over the decoded vectors, which
+        is what ChromaDB's default "l2" space reports for float32 vectors.
+        """
+        if self.size == 0 or k <= 0:
+            return []
+
+        distances = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, _SCORE_BLOCK):
+            end = min(start + _SCORE_BLOCK, self.size)
+            dots = self.codes[start:end].astype(np.float32) @ query
+            if self.scales is not None:
+                dots *= self.scales[start:end]
+            distances[start:end] = self.sq_norms[start:end] - 2 * dots
+        distances += float(query @ query)
+
+        if doc_ids is not None:
+            wanted = [self.doc_index[doc_id] for doc_id in doc_ids if doc_id in self.doc_index]
+            distances[~np.isin(self.doc_codes[:self.size], wanted)] = np.inf
+        if allowed_ids is not None:
+            mask = np.ones(self.size, dtype=bool)
+            mask[[self.rows[chunk_id] for chunk_id in allowed_ids if chunk_id in self.rows]] = False
+            distances[mask] = np.inf
+
+        k = min(k, self.size)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        return [(self.ids[row], float(distances[row])) for row in top if np.isfinite(distances[row])]
+
+    def footprint(self) -> int:
+        """Return the bytes held in memory (allocated arrays plus ID bookkeeping)."""
+        arrays = [self.codes, self.scales, self.doc_codes, self.sq_norms]
+        return sum(array.nbytes for array in arrays if array is not None) + self.size * ID_OVERHEAD_BYTES
+
+    def memory(self) -> Tuple[int, int]:
+        """Return (bytes used by the compact rows, bytes the same rows take as float32)."""
+        if self.codes is None:
+            return 0, 0
+        dim = self.codes.shape[1]
+        used = self.size * (dim * self.codes.itemsize + self.sq_norms.itemsize + self.doc_codes.itemsize)
+        if self.scales is not None:
+            used += self.size * self.scales.itemsize
+        return used, self.size * dim * 4
+
+
+class CompactVectorIndex:
+    """
+    Reduced-precision vector index used when EMBEDDING_STORAGE is float16 or int8.
+
+    Full-precision vectors are persisted in SQLite (on disk, never all in
+    memory); each user's vectors are loaded on first use and kept in memory
+    only as compact codes, which are scanned exactly (brute force) at search
+    time. The top candidates can then be re-ranked with their full-precision
+    vectors, recovering float32 ranking at a fraction of the memory.
+    """
+
+    def __init__(
+        self,
+        storage: str = EMBEDDING_STORAGE,
+        path: str = COMPACT_INDEX_PATH,
+        rescore: bool = EMBEDDING_RESCORE,
+        rescore_factor: int = EMBEDDING_RESCORE_FACTOR,
+        residency_kind: str = "compact"
+    ):
+        if storage not in COMPACT_STORAGES:
+            raise ValueError(f"Unknown compact storage: {storage!r} (expected one of {COMPACT_STORAGES})")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.storage = storage
+        self.path = path
+        self.rescore = rescore
+        self.rescore_factor = max(1, rescore_factor)
+        self._users: Dict[str, _UserVectors] = {}
+        self._lock = threading.RLock()
+        self._residency = get_index_residency()
+        self._residency_kind = residency_kind
+        self._residency.register(residency_kind, self._unload)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "user_id TEXT NOT NULL, id TEXT NOT NULL, doc_id TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (user_id, id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_doc ON vectors(user_id, doc_id)")
+        self._conn.commit()
+
+    def _user(self, user_id: str) -> _UserVectors:
+        """Return a user's in-memory vectors, loading (and quantizing) them on first use."""
+        vectors = self._users.get(user_id)
+        if vectors is not None:
+            self._residency.hit(self._residency_kind, user_id)
+            return vectors
+
+        vectors = _UserVectors(self.storage)
+        cursor = self._conn.execute("SELECT id, doc_id, vector FROM vectors WHERE user_id = ?", (user_id,))
+        while True:
+            rows = cursor.fetchmany(_LOAD_PAGE)
+            if not rows:
+                break
+            vectors.add(
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+                np.vstack([np.frombuffer(row[2], dtype="<f4") for row in rows])
+            )
+        self._users[user_id] = vectors
+        if vectors.size:
+            logger.info(f"Loaded {vectors.size} {self.storage} vectors for user {user_id}")
+        self._residency.admit(self._residency_kind, user_id, vectors.footprint())
+        return vectors
+
+    def _unload(self, user_id: str):
+        """Drop a user's compact vectors from memory (reloaded from SQLite on next use)."""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def add(self, user_id: str, ids: Sequence[str], doc_ids: Sequence[str], vectors):
+        """Store full-precision vectors and add their compact codes to the user's index."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?)",
+                [
+                    (user_id, chunk_id, doc_id, vector.astype("<f4").tobytes())
+                    for chunk_id, doc_id, vector in zip(ids, doc_ids, vectors)
+                ]
+            )
+            self._conn.commit()
+            user = self._user(user_id)
+            user.add(list(ids), list(doc_ids), vectors)
+            self._residency.resize(self._residency_kind, user_id, user.footprint())
+
+    def get_vectors(self, user_id: str, ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return the full-precision vectors of the given IDs (missing IDs are omitted)."""
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = list(ids[start:start + _SQL_BATCH])
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, vector FROM vectors WHERE user_id = ? AND id IN ({placeholders})",
+                    [user_id, *batch]
+                ).fetchall()
+                found.update((chunk_id, np.frombuffer(vector, dtype="<f4")) for chunk_id, vector in rows)
+        return found
+
+    def delete(self, user_id: str, ids: Sequence[str]):
+        """Delete vectors by ID."""
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = list(ids[start:start + _SQL_BATCH])
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(
+                    f"DELETE FROM vectors WHERE user_id = ? AND id IN ({placeholders})",
+                    [user_id, *batch]
+                )
+            self._conn.commit()
+            self._user(user_id).remove(ids)
+
+    def delete_document(self, user_id: str, doc_id: str):
+        """Delete every vector of a document."""
+        with self._lock:
+            self._conn.execute("DELETE FROM vectors WHERE user_id = ? AND doc_id = ?", (user_id, doc_id))
+            self._conn.commit()
+            vectors = self._user(user_id)
+            vectors.remove(vectors.ids_for_document(doc_id))
+
+    def delete_user(self, user_id: str):
+        """Delete every vector of a user."""
+        with self._lock:
+            self._conn.execute("DELETE FROM vectors WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+            self._users.pop(user_id, None)
+            self._residency.discard(self._residency_kind, user_id)
+
+    def search(
+        self,
+        user_id: str,
+        query,
+        n_results: int,
+        doc_ids: Optional[Sequence[str]] = None,
+        allowed_ids: Optional[Set[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Find the nearest vectors to a query.
+
+        Args:
+            user_id: User ID (namespace)
+            query: Query embedding
+            n_results: Number of results
+            doc_ids: Optional document IDs to restrict the search to
+            allowed_ids: Optional chunk IDs to restrict the search to
+
+        Returns:
+            (chunk ID, squared L2 distance) pairs, nearest first
+        """
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if not self.rescore:
+                return self._user(user_id).search(query, n_results, doc_ids, allowed_ids)
+            candidates = self._user(user_id).search(query, n_results * self.rescore_factor, doc_ids, allowed_ids)
+
+        # Re-rank the candidates by exact distance
+        full = self.get_vectors(user_id, [chunk_id for chunk_id, _ in candidates])
+        rescored = []
+        for chunk_id, distance in candidates:
+            vector = full.get(chunk_id)
+            if vector is not None:
+                difference = vector - query
+                distance = float(difference @ difference)
+            rescored.append((chunk_id, distance))
+        rescored.sort(key=lambda item: item[1])
+        return rescored[:n_results]
+
+    def stats(self) -> Dict:
+        """Return memory used by the loaded compact vectors versus float32."""
+        with self._lock:
+            vectors = sum(user.size for user in self._users.values())
+            used, baseline = map(sum, zip((0, 0), *(user.memory() for user in self._users.values())))
+        return {
+            "storage": self.storage,
+            "rescore": self.rescore,
+            "loaded_users": len(self._users),
+            "vectors": vectors,
+            "bytes": used,
+            "float32_bytes": baseline,
+            "saved_bytes": baseline - used,
+            "ratio": round(used / baseline, 4) if baseline else None,
+        }
+
+
+# Global compact index instance (None when vectors are stored as float32 in ChromaDB)
+_compact_index: Optional[CompactVectorIndex] = None
+_compact_index_lock = threading.Lock()
+
+
+def get_compact_index() -> Optional[CompactVectorIndex]:
+    """Get or create the global compact vector index (None for float32 storage)."""
+    global _compact_index
+    if _compact_index is None and EMBEDDING_STORAGE != "float32":
+        with _compact_index_lock:
+            if _compact_index is None:
+                _compact_index = CompactVectorIndex()
+    return _compact_index
@@ -0,0 +1,135 @@
+import logging
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# doc_id -> chunk ID index of the ChromaDB vector store
+DOC_INDEX_PATH = os.getenv("DOC_INDEX_PATH", "./data/doc_index.sqlite3")
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+# (chunk ID, doc ID, revision)
+ChunkRef = Tuple[str, str, Optional[int]]
+
+
+class DocumentChunkIndex:
+    """
+    Persistent mapping from each user's documents (and revisions) to their chunk IDs.
+
+    Lets the vector store delete a document's chunks by ID and restrict
+    searches to a document's chunks without scanning collection metadata.
+    Owners record chunks before writing them and forget them after deleting
+    them, so the index may list chunks that are gone, but never misses one.
+    Users whose chunks predate the index are indexed from load_chunks (pages
+    of chunk references) on first use.
+    """
+
+    def __init__(
+        self,
+        path: str = DOC_INDEX_PATH,
+        load_chunks: Optional[Callable[[str], Iterable[List[ChunkRef]]]] = None
+    ):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.load_chunks = load_chunks
+        self._indexed: Set[str] = set()
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS doc_index_users (user_id TEXT PRIMARY KEY)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS doc_chunks ("
+            "user_id TEXT NOT NULL, chunk_id TEXT NOT NULL, doc_id TEXT NOT NULL, revision INTEGER, "
+            "PRIMARY KEY (user_id, chunk_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS doc_chunks_doc ON doc_chunks(user_id, doc_id, revision)")
+        self._conn.commit()
+
+    def _ensure_user(self, user_id: str):
+        """Index a user's existing chunks the first time the user is seen."""
+        if user_id in self._indexed:
+            return
+        if self._conn.execute("SELECT 1 FROM doc_index_users WHERE user_id = ?", (user_id,)).fetchone() is None:
+            indexed = 0
+            if self.load_chunks is not None:
+                for page in self.load_chunks(user_id):
+                    self._upsert(user_id, page)
+                    indexed += len(page)
+            self._conn.execute("INSERT INTO doc_index_users VALUES (?)", (user_id,))
+            self._conn.commit()
+            if indexed:
+                logger.info(f"Indexed {indexed} existing chunks of user {user_id} by document")
+        self._indexed.add(user_id)
+
+    def _upsert(self, user_id: str, chunks: Sequence[ChunkRef]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO doc_chunks VALUES (?, ?, ?, ?)",
+            [(user_id, chunk_id, doc_id, revision) for chunk_id, doc_id, revision in chunks]
+        )
+        self._counts.pop(user_id, None)
+
+    def add(self, user_id: str, chunks: Sequence[ChunkRef]):
+        """Record chunks (or update the document and revision of existing ones)."""
+        with self._lock:
+            self._ensure_user(user_id)
+            self._upsert(user_id, chunks)
+            self._conn.commit()
+
+    def delete(self, user_id: str, ids: Sequence[str]):
+        """Forget chunks by ID."""
+        with self._lock:
+            self._ensure_user(user_id)
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = list(ids[start:start + _SQL_BATCH])
+                self._conn.execute(
+                    f"DELETE FROM doc_chunks WHERE user_id = ? AND chunk_id IN ({','.join('?' * len(batch))})",
+                    [user_id, *batch]
+                )
+            self._counts.pop(user_id, None)
+            self._conn.commit()
+
+    def chunk_ids(self, user_id: str, doc_ids: Sequence[str], revision: Optional[int] = None) -> List[str]:
+        """
+        Return the chunk IDs of documents.
+
+        Args:
+            user_id: User ID (namespace)
+            doc_ids: Document IDs
+            revision: If given, only chunks added by this revision
+
+        Returns:
+            Chunk IDs, grouped by document
+        """
+        condition, params = "", []
+        if revision is not None:
+            condition, params = " AND revision = ?", [revision]
+        with self._lock:
+            self._ensure_user(user_id)
+            ids = []
+            for doc_id in dict.fromkeys(doc_ids):
+                ids.extend(
+                    chunk_id for chunk_id, in self._conn.execute(
+                        f"SELECT chunk_id FROM doc_chunks WHERE user_id = ? AND doc_id = ?{condition}",
+                        [user_id, doc_id, *params]
+                    )
+                )
+            return ids
+
+    def count(self, user_id: str) -> int:
+        """Return how many chunks a user has."""
+        with self._lock:
+            self._ensure_user(user_id)
+            if user_id not in self._counts:
+                self._counts[user_id] = self._conn.execute(
+                    "SELECT COUNT(*) FROM doc_chunks WHERE user_id = ?", (user_id,)
+                ).fetchone()[0]
+            return self._counts[user_id]
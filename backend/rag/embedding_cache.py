@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Embedding cache configuration
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+# Lookups record recency and hit/miss counts in memory; they are written on the
+# next put, on stats(), or once this many keys or seconds have accumulated
+_FLUSH_KEYS = 1000
+_FLUSH_SECONDS = 30.0
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of chunk embeddings keyed by model name + text hash.
+
+    Vectors are stored as raw little-endian float32 bytes in SQLite (WAL mode,
+    so ingestion worker processes can share the file). Entries are evicted
+    least-recently-used first once the entry bound is exceeded; the entry
+    count is kept in the stats table, so inserts never count the table. Hit
+    and miss counters are persisted alongside the entries so they cover every
+    process. Lookups only read: their recency and counter updates are batched
+    in memory (see _FLUSH_KEYS), so eviction order may lag by one flush.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending_used: Dict[bytes, float] = {}
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0)")
+        # Counted once, when a cache file without a running count is first opened
+        self._conn.execute("INSERT OR IGNORE INTO stats SELECT 'entries', COUNT(*) FROM embeddings")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> bytes:
+        """Cache key: SHA-256 over the model name and the chunk text."""
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, model_name: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up embeddings for a list of texts.
+
+        Returns:
+            One float32 vector per text, or None where the text is not cached
+        """
+        keys = [self.make_key(model_name, text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype="<f4")
+
+            hits = sum(1 for key in keys if key in found)
+            now = time.time()
+            self._pending_used.update((key, now) for key in found)
+            self._pending_hits += hits
+            self._pending_misses += len(keys) - hits
+            if len(self._pending_used) >= _FLUSH_KEYS or time.monotonic() - self._last_flush >= _FLUSH_SECONDS:
+                self._flush()
+                self._conn.commit()
+
+        return [found.get(key) for key in keys]
+
+    def _flush(self):
+        """Write pending recency and hit/miss updates (caller holds the lock and commits)."""
+        if self._pending_used:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._pending_used.items()]
+            )
+        if self._pending_hits or self._pending_misses:
+            self._conn.execute("UPDATE stats SET value = value + ? WHERE name = 'hits'", (self._pending_hits,))
+            self._conn.execute("UPDATE stats SET value = value + ? WHERE name = 'misses'", (self._pending_misses,))
+        self._pending_used = {}
+        self._pending_hits = self._pending_misses = 0
+        self._last_flush = time.monotonic()
+
+    def put_many(self, model_name: str, texts: Sequence[str], vectors: np.ndarray):
+        """Store embeddings for a list of texts and evict LRU entries over the bound."""
+        now = time.time()
+        rows = [
+            (self.make_key(model_name, text), np.asarray(vector, dtype="<f4").tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            self._flush()
+            # An existing key already holds the same model's vector for the same text
+            inserted = self._conn.executemany("INSERT OR IGNORE INTO embeddings VALUES (?, ?, ?)", rows).rowcount
+            self._conn.execute("UPDATE stats SET value = value + ? WHERE name = 'entries'", (inserted,))
+            count = self._conn.execute("SELECT value FROM stats WHERE name = 'entries'").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                evicted = self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+                self._conn.execute("UPDATE stats SET value = value - ? WHERE name = 'entries'", (evicted,))
+                self._conn.execute("UPDATE stats SET value = value + ? WHERE name = 'evictions'", (evicted,))
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """Return hit/miss/eviction counters and the current entry count."""
+        with self._lock:
+            self._flush()
+            self._conn.commit()
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "evictions": counters["evictions"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "entries": counters["entries"],
+            "max_entries": self.max_entries,
+        }
+
+
+# Global embedding cache instance (one per process)
+_embedding_cache = None
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Get or create the embedding cache, or None if caching is disabled."""
+    global _embedding_cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+        logger.info(f"Embedding cache opened at {EMBEDDING_CACHE_PATH}")
+    return _embedding_cache
@@ -1,8 +1,6 @@
 from typing import AsyncGenerator
 import os
 import logging
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage, SystemMessage
 
 from utils.schemas import QueryChunk
 
@@ -27,6 +25,9 @@ def get_llm():
             "Get your API key from https://makersuite.google.com/app/apikey"
         )
     
+    # Imported on first use: LangChain adds seconds to application startup
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    
     return ChatGoogleGenerativeAI(
         model=GEMINI_MODEL,
         temperature=0.7,
@@ -89,6 +90,7 @@ Answer:"""
         llm = get_llm()
         
         # Generate with streaming
+        from langchain_core.messages import HumanMessage, SystemMessage
         messages = [
             SystemMessage(content=system_prompt),
             HumanMessage(content=user_prompt)
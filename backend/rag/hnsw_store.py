@@ -0,0 +1,597 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from rag.compact_index import EMBEDDING_STORAGE
+from rag.lexical_index import LEXICAL_INDEX_ENABLED, LEXICAL_INDEX_PATH, ChunkRow, LexicalIndex
+from rag.residency import get_index_residency, hnsw_index_bytes
+from rag.vectorstore import (
+    COPY_PAGE_SIZE, ChunkPage, copy_chunk_metadata, encode_queries, encode_query, encode_texts, get_embedding_model
+)
+
+logger = logging.getLogger(__name__)
+
+# In-process HNSW backend configuration (VECTOR_STORE_BACKEND=hnsw)
+HNSW_INDEX_DIR = os.getenv("HNSW_INDEX_DIR", "./data/hnsw")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+HNSW_NUM_THREADS = int(os.getenv("HNSW_NUM_THREADS", "1"))
+
+# Initial element capacity of a namespace's index (grown by doubling)
+_INITIAL_CAPACITY = 1000
+# Filtered searches over at most this many chunks are answered exactly
+_BRUTE_FORCE_LIMIT = 1000
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def _where_sql(where: Dict) -> Tuple[str, list]:
+    """
+    Translate a ChromaDB-style metadata filter into SQL over the metadata JSON.
+
+    Supports equality ({"key": value}, {"key": {"$eq": value}}), {"key": {"$in": [...]}}
+    and {"$and": [...]}.
+    """
+    clauses = []
+    params = []
+    for key, value in where.items():
+        if key == "$and":
+            for condition in value:
+                sql, condition_params = _where_sql(condition)
+                clauses.append(f"({sql})")
+                params.extend(condition_params)
+            continue
+
+        operator, operand = next(iter(value.items())) if isinstance(value, dict) else ("$eq", value)
+        if operator == "$eq":
+            clauses.append("json_extract(metadata, ?) = ?")
+            params.extend([f"$.{key}", operand])
+        elif operator == "$in":
+            clauses.append(f"json_extract(metadata, ?) IN ({','.join('?' * len(operand))})")
+            params.extend([f"$.{key}", *operand])
+        else:
+            raise ValueError(f"Unsupported filter operator for the HNSW backend: {operator}")
+    return " AND ".join(clauses) or "1", params
+
+
+class _Namespace:
+    """A user's loaded HNSW index."""
+
+    def __init__(self, index, next_label: int, count: int):
+        self.index = index
+        self.next_label = next_label
+        self.count = count
+
+
+class HnswVectorStore:
+    """
+    In-process vector store: one hnswlib HNSW index per user namespace.
+
+    Drop-in alternative to VectorStore (same add/search/copy/delete API and
+    result format) without ChromaDB. Each namespace's graph is persisted
+    incrementally to its own directory under index_dir (hnswlib's
+    persistent-index format, the one ChromaDB uses internally) and loaded on
+    first use; chunk text and metadata live in SQLite, keyed by the integer
+    label of each vector. Distances are squared L2, as with ChromaDB's
+    default space, so scores are interchangeable between backends. Chunk
+    text is also kept in the keyword index, as with VectorStore.
+    """
+
+    def __init__(
+        self,
+        index_dir: str = HNSW_INDEX_DIR,
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = HNSW_EF_SEARCH,
+        lexical_index_path: str = LEXICAL_INDEX_PATH,
+        shard: Optional[int] = None
+    ):
+        """Open (or create) the chunk database and index directory (shard: shard number when sharded)."""
+        os.makedirs(index_dir, exist_ok=True)
+
+        self.index_dir = index_dir
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+        self._residency = get_index_residency()
+        self._residency_kind = "hnsw" if shard is None else f"hnsw:{shard}"
+        self._residency.register(self._residency_kind, self._unload)
+
+        self._conn = sqlite3.connect(os.path.join(index_dir, "chunks.sqlite3"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS namespaces ("
+            "user_id TEXT PRIMARY KEY, dim INTEGER NOT NULL, next_label INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "user_id TEXT NOT NULL, id TEXT NOT NULL, label INTEGER NOT NULL, doc_id TEXT NOT NULL, "
+            "document TEXT NOT NULL, metadata TEXT NOT NULL, PRIMARY KEY (user_id, id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc ON chunks(user_id, doc_id)")
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS chunks_label ON chunks(user_id, label)")
+        self._conn.commit()
+
+        if EMBEDDING_STORAGE != "float32":
+            logger.warning(f"EMBEDDING_STORAGE={EMBEDDING_STORAGE} is ignored by the HNSW backend (vectors are float32)")
+
+        # Updated outside self._lock: its first use per user pages through iter_chunks
+        self.lexical_index = LexicalIndex(lexical_index_path, self.iter_chunks) if LEXICAL_INDEX_ENABLED else None
+
+        self.embedding_model = get_embedding_model()
+        logger.info(f"HnswVectorStore initialized with index directory: {index_dir} (M={m}, ef={ef_search})")
+
+    def _namespace_dir(self, user_id: str) -> str:
+        return os.path.join(self.index_dir, f"user_{user_id}")
+
+    def _namespace(self, user_id: str, dim: Optional[int] = None) -> Optional[_Namespace]:
+        """
+        Return a user's index, loading it from disk on first use.
+
+        Creates it when dim is given and the user has none yet; otherwise
+        returns None for users without vectors.
+        """
+        namespace = self._namespaces.get(user_id)
+        if namespace is not None:
+            self._residency.hit(self._residency_kind, user_id)
+            return namespace
+
+        import hnswlib
+
+        row = self._conn.execute(
+            "SELECT dim, next_label FROM namespaces WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None and dim is None:
+            return None
+
+        path = self._namespace_dir(user_id)
+        if row is None:
+            os.makedirs(path, exist_ok=True)
+            index = hnswlib.Index(space="l2", dim=dim)
+            index.init_index(
+                max_elements=_INITIAL_CAPACITY,
+                M=self.m,
+                ef_construction=self.ef_construction,
+                is_persistent_index=True,
+                persistence_location=path
+            )
+            index.persist_dirty()
+            self._conn.execute("INSERT INTO namespaces VALUES (?, ?, 0)", (user_id, dim))
+            self._conn.commit()
+            namespace = _Namespace(index, 0, 0)
+        else:
+            dim, next_label = row
+            count = self._conn.execute("SELECT COUNT(*) FROM chunks WHERE user_id = ?", (user_id,)).fetchone()[0]
+            index = hnswlib.Index(space="l2", dim=dim)
+            index.load_index(path, is_persistent_index=True, max_elements=max(next_label * 2, _INITIAL_CAPACITY))
+            namespace = _Namespace(index, next_label, count)
+
+        index.set_ef(self.ef_search)
+        index.set_num_threads(HNSW_NUM_THREADS)
+        self._namespaces[user_id] = namespace
+        self._residency.admit(self._residency_kind, user_id, hnsw_index_bytes(index))
+        return namespace
+
+    def _unload(self, user_id: str):
+        """Drop a user's index from memory (everything is already persisted; reloaded on next use)."""
+        with self._lock:
+            namespace = self._namespaces.pop(user_id, None)
+            if namespace is not None:
+                namespace.index.close_file_handles()
+
+    def _select(self, user_id: str, columns: str, condition: str = "1", params: Sequence = ()) -> List[tuple]:
+        return self._conn.execute(
+            f"SELECT {columns} FROM chunks WHERE user_id = ? AND ({condition})", [user_id, *params]
+        ).fetchall()
+
+    def _select_ids(self, user_id: str, columns: str, ids: Sequence, key: str = "id") -> List[tuple]:
+        """Select rows by chunk ID or label, in batches (row order is not preserved)."""
+        rows = []
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = list(ids[start:start + _SQL_BATCH])
+            rows.extend(self._select(user_id, columns, f"{key} IN ({','.join('?' * len(batch))})", batch))
+        return rows
+
+    def _remove(self, user_id: str, labels: Sequence[int]):
+        """Mark vectors deleted in the index and delete their chunk rows."""
+        namespace = self._namespace(user_id)
+        if namespace is None or not labels:
+            return
+        for label in labels:
+            namespace.index.mark_deleted(label)
+        namespace.index.persist_dirty()
+        for start in range(0, len(labels), _SQL_BATCH):
+            batch = list(labels[start:start + _SQL_BATCH])
+            self._conn.execute(
+                f"DELETE FROM chunks WHERE user_id = ? AND label IN ({','.join('?' * len(batch))})",
+                [user_id, *batch]
+            )
+        self._conn.commit()
+        namespace.count -= len(labels)
+
+    def add_documents(
+        self,
+        user_id: str,
+        doc_id: str,
+        texts: List[str],
+        metadatas: List[Dict],
+        ids: List[str],
+        embeddings: Optional[Sequence] = None
+    ):
+        """
+        Add documents to the vector store for a specific user.
+
+        Args:
+            user_id: User ID (determines namespace)
+            doc_id: Document ID
+            texts: List of text chunks
+            metadatas: List of metadata dicts for each chunk
+            ids: List of unique IDs for each chunk
+            embeddings: Optional precomputed embeddings (e.g. from an ingestion worker)
+        """
+        if embeddings is None:
+            embeddings = encode_texts(texts)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        with self._lock:
+            namespace = self._namespace(user_id, embeddings.shape[1])
+
+            # Re-added IDs replace their previous vectors
+            self._remove(user_id, [label for label, in self._select_ids(user_id, "label", ids)])
+
+            index = namespace.index
+            needed = index.element_count + len(ids)
+            if needed > index.get_max_elements():
+                index.resize_index(max(needed, index.get_max_elements() * 2))
+
+            # Vectors are persisted before their rows, so every stored chunk is searchable
+            labels = list(range(namespace.next_label, namespace.next_label + len(ids)))
+            index.add_items(embeddings, labels, num_threads=HNSW_NUM_THREADS)
+            index.persist_dirty()
+            self._residency.resize(self._residency_kind, user_id, hnsw_index_bytes(index))
+
+            self._conn.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (user_id, chunk_id, label, metadata.get("doc_id", doc_id), text, json.dumps(metadata))
+                    for chunk_id, label, text, metadata in zip(ids, labels, texts, metadatas)
+                ]
+            )
+            namespace.next_label += len(ids)
+            self._conn.execute(
+                "UPDATE namespaces SET next_label = ? WHERE user_id = ?", (namespace.next_label, user_id)
+            )
+            self._conn.commit()
+            namespace.count += len(ids)
+
+        if self.lexical_index is not None:
+            self.lexical_index.add(user_id, ids, [metadata.get("doc_id", doc_id) for metadata in metadatas], texts)
+
+        logger.info(f"Added {len(texts)} chunks to vector store for user {user_id}, doc {doc_id}")
+
+    def _exact_search(self, namespace: _Namespace, query: np.ndarray, labels: Sequence[int], k: int):
+        """Exact nearest neighbours among the given labels."""
+        labels = np.fromiter(labels, dtype=np.int64)
+        vectors = np.asarray(namespace.index.get_items(labels.tolist()), dtype=np.float32)
+        distances = ((vectors - query) ** 2).sum(axis=1)
+        top = np.argsort(distances, kind="stable")[:k]
+        return labels[top], distances[top]
+
+    def search(
+        self,
+        user_id: str,
+        query: str,
+        n_results: int = 5,
+        doc_ids: Optional[List[str]] = None,
+        where: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Search for similar documents in the vector store.
+
+        Args:
+            user_id: User ID (determines namespace)
+            query: Search query text
+            n_results: Number of results to return
+            doc_ids: Optional list of document IDs to filter by
+            where: Optional additional filter conditions
+
+        Returns:
+            List of search results with content, metadata, and distance
+        """
+        return self._search_embedding(user_id, encode_query(query).astype(np.float32), n_results, doc_ids, where)
+
+    def _search_embedding(
+        self,
+        user_id: str,
+        query_embedding: np.ndarray,
+        n_results: int,
+        doc_ids: Optional[List[str]],
+        where: Optional[Dict]
+    ) -> List[Dict]:
+        """Search with an embedded query."""
+        with self._lock:
+            namespace = self._namespace(user_id)
+            if namespace is None or namespace.count == 0:
+                return []
+
+            allowed: Optional[Set[int]] = None
+            if doc_ids or where:
+                condition, params = _where_sql(where or {})
+                if doc_ids:
+                    condition += f" AND doc_id IN ({','.join('?' * len(doc_ids))})"
+                    params += list(doc_ids)
+                allowed = {label for label, in self._select(user_id, "label", condition, params)}
+                if not allowed:
+                    return []
+
+            k = min(n_results, namespace.count if allowed is None else len(allowed))
+            if allowed is not None and len(allowed) <= _BRUTE_FORCE_LIMIT:
+                labels, distances = self._exact_search(namespace, query_embedding, allowed, k)
+            else:
+                try:
+                    labels, distances = namespace.index.knn_query(
+                        query_embedding,
+                        k=k,
+                        filter=allowed.__contains__ if allowed is not None else None
+                    )
+                    labels, distances = labels[0], distances[0]
+                except RuntimeError:
+                    # The graph walk found fewer than k live neighbours (sparse filter or many deletions)
+                    if allowed is None:
+                        allowed = {label for label, in self._select(user_id, "label")}
+                    labels, distances = self._exact_search(namespace, query_embedding, allowed, k)
+
+            rows = self._rows_by_label(user_id, labels)
+
+        return self._format_results(rows, labels, distances)
+
+    def _rows_by_label(self, user_id: str, labels) -> Dict[int, tuple]:
+        return {
+            label: (chunk_id, document, metadata)
+            for label, chunk_id, document, metadata in self._select_ids(
+                user_id, "label, id, document, metadata", [int(label) for label in labels], key="label"
+            )
+        }
+
+    @staticmethod
+    def _format_results(rows: Dict[int, tuple], labels, distances) -> List[Dict]:
+        formatted_results = []
+        for label, distance in zip(labels, distances):
+            row = rows.get(int(label))
+            if row is not None:
+                formatted_results.append({
+                    "content": row[1],
+                    "metadata": json.loads(row[2]),
+                    "id": row[0],
+                    "distance": float(distance)
+                })
+        return formatted_results
+
+    def search_many(
+        self,
+        user_id: str,
+        queries: List[str],
+        n_results: List[int],
+        doc_ids: List[Optional[List[str]]]
+    ) -> List[List[Dict]]:
+        """
+        Run several searches in one user's namespace.
+
+        The queries are embedded in one model call, and unfiltered queries
+        share one batched knn_query; filtered ones are searched one by one.
+
+        Args:
+            user_id: User ID (determines namespace)
+            queries: Search query texts
+            n_results: Number of results for each query
+            doc_ids: Document ID filter for each query (None for all documents)
+
+        Returns:
+            Search results of each query, in order (same format as search)
+        """
+        if not queries:
+            return []
+        query_embeddings = encode_queries(queries).astype(np.float32)
+        formatted_results: List[Optional[List[Dict]]] = [None] * len(queries)
+
+        unfiltered = [i for i, filter_ids in enumerate(doc_ids) if not filter_ids]
+        if len(unfiltered) > 1:
+            with self._lock:
+                namespace = self._namespace(user_id)
+                if namespace is None or namespace.count == 0:
+                    return [[] for _ in queries]
+                k = min(max(n_results[i] for i in unfiltered), namespace.count)
+                try:
+                    labels, distances = namespace.index.knn_query(query_embeddings[unfiltered], k=k)
+                except RuntimeError:
+                    # Too few live neighbours for some query; searched one by one below
+                    labels = None
+                if labels is not None:
+                    rows = self._rows_by_label(user_id, np.unique(labels))
+            if labels is not None:
+                for row, i in enumerate(unfiltered):
+                    n = n_results[i]
+                    formatted_results[i] = self._format_results(rows, labels[row][:n], distances[row][:n])
+
+        for i, query_embedding in enumerate(query_embeddings):
+            if formatted_results[i] is None:
+                formatted_results[i] = self._search_embedding(user_id, query_embedding, n_results[i], doc_ids[i], None)
+        return formatted_results
+
+    def copy_document(
+        self,
+        source_user_id: str,
+        source_doc_id: str,
+        user_id: str,
+        doc_id: str,
+        metadata: Optional[Dict] = None,
+        target_store=None
+    ) -> int:
+        """
+        Copy the chunks and embeddings of an existing document to another document.
+
+        Args:
+            source_user_id: Owner of the source document
+            source_doc_id: Source document ID
+            user_id: Owner of the new document
+            doc_id: New document ID
+            metadata: Metadata overrides for the copied chunks (e.g. filename)
+            target_store: Store holding the new document's namespace (default: this one)
+
+        Returns:
+            Number of chunks copied (0 if the source has no chunks)
+        """
+        copied = 0
+        last_label = -1
+        while True:
+            # Each page's rows and vectors are read under one lock hold, so a
+            # concurrent delete of the source removes whole rows, never just vectors
+            with self._lock:
+                page = self._conn.execute(
+                    "SELECT label, document, metadata FROM chunks WHERE user_id = ? AND doc_id = ? AND label > ? "
+                    "ORDER BY label LIMIT ?",
+                    (source_user_id, source_doc_id, last_label, COPY_PAGE_SIZE)
+                ).fetchall()
+                if not page:
+                    break
+                embeddings = self._namespace(source_user_id).index.get_items([label for label, _, _ in page])
+            metadatas = [
+                copy_chunk_metadata(json.loads(source_metadata), user_id, doc_id, metadata)
+                for _, _, source_metadata in page
+            ]
+            (target_store or self).add_documents(
+                user_id=user_id,
+                doc_id=doc_id,
+                texts=[document for _, document, _ in page],
+                metadatas=metadatas,
+                ids=[chunk_metadata["chunk_id"] for chunk_metadata in metadatas],
+                embeddings=embeddings
+            )
+            copied += len(page)
+            last_label = page[-1][0]
+
+        return copied
+
+    def get_chunks(self, user_id: str, ids: List[str]) -> List[Dict]:
+        """Fetch chunks by ID in the order given (unknown IDs are skipped), with distance None."""
+        with self._lock:
+            rows = {
+                chunk_id: (document, metadata)
+                for chunk_id, document, metadata in self._select_ids(user_id, "id, document, metadata", ids)
+            }
+        return [
+            {"content": rows[chunk_id][0], "metadata": json.loads(rows[chunk_id][1]), "id": chunk_id, "distance": None}
+            for chunk_id in ids
+            if chunk_id in rows
+        ]
+
+    def iter_chunks(self, user_id: str) -> Iterator[List[ChunkRow]]:
+        """Yield every chunk of a user as pages of (chunk ID, doc ID, text); used to build the keyword index."""
+        last_label = -1
+        while True:
+            with self._lock:
+                page = self._conn.execute(
+                    "SELECT label, id, doc_id, document FROM chunks WHERE user_id = ? AND label > ? "
+                    "ORDER BY label LIMIT ?",
+                    (user_id, last_label, COPY_PAGE_SIZE)
+                ).fetchall()
+            if not page:
+                break
+            yield [(chunk_id, doc_id, document) for _, chunk_id, doc_id, document in page]
+            last_label = page[-1][0]
+
+    def iter_vectors(self, user_id: str) -> Iterator[ChunkPage]:
+        """Yield every chunk of a user as pages of (IDs, texts, metadatas, float32 vector matrix); used by exports."""
+        last_label = -1
+        while True:
+            with self._lock:
+                page = self._conn.execute(
+                    "SELECT label, id, document, metadata FROM chunks WHERE user_id = ? AND label > ? "
+                    "ORDER BY label LIMIT ?",
+                    (user_id, last_label, COPY_PAGE_SIZE)
+                ).fetchall()
+                if not page:
+                    break
+                embeddings = np.asarray(
+                    self._namespace(user_id).index.get_items([label for label, _, _, _ in page]), dtype=np.float32
+                )
+            yield (
+                [chunk_id for _, chunk_id, _, _ in page],
+                [document for _, _, document, _ in page],
+                [json.loads(metadata) for _, _, _, metadata in page],
+                embeddings
+            )
+            last_label = page[-1][0]
+
+    def user_ids(self) -> List[str]:
+        """Return the IDs of the users that have a namespace."""
+        with self._lock:
+            return [user_id for user_id, in self._conn.execute("SELECT user_id FROM namespaces ORDER BY user_id")]
+
+    def has_chunks(self, user_id: str) -> bool:
+        """Return whether a user has any chunks."""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM chunks WHERE user_id = ? LIMIT 1", (user_id,)).fetchone() is not None
+
+    def get_document_chunks(self, user_id: str, doc_id: str) -> Dict[str, str]:
+        """Return the text of every stored chunk of a document, keyed by chunk ID."""
+        with self._lock:
+            return dict(self._select(user_id, "id, document", "doc_id = ?", [doc_id]))
+
+    def update_chunk_metadatas(self, user_id: str, ids: List[str], metadatas: List[Dict]):
+        """Replace the metadata of existing chunks, leaving their text and vectors untouched."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ?, doc_id = ? WHERE user_id = ? AND id = ?",
+                [
+                    (json.dumps(metadata), metadata["doc_id"], user_id, chunk_id)
+                    for chunk_id, metadata in zip(ids, metadatas)
+                ]
+            )
+            self._conn.commit()
+
+    def delete_chunks(self, user_id: str, ids: List[str]):
+        """Delete specific chunks by ID."""
+        with self._lock:
+            self._remove(user_id, [label for label, in self._select_ids(user_id, "label", ids)])
+        if self.lexical_index is not None:
+            self.lexical_index.delete(user_id, ids)
+
+    def delete_document(self, user_id: str, doc_id: str, revision: Optional[int] = None):
+        """
+        Delete all chunks for a specific document.
+
+        Args:
+            user_id: User ID (determines namespace)
+            doc_id: Document ID
+            revision: If given, only delete chunks added by this revision
+        """
+        condition, params = "doc_id = ?", [doc_id]
+        if revision is not None:
+            revision_condition, revision_params = _where_sql({"revision": revision})
+            condition += f" AND {revision_condition}"
+            params += revision_params
+
+        with self._lock:
+            rows = self._select(user_id, "label, id", condition, params)
+            self._remove(user_id, [label for label, _ in rows])
+
+        if self.lexical_index is not None:
+            if revision is None:
+                self.lexical_index.delete_document(user_id, doc_id)
+            else:
+                self.lexical_index.delete(user_id, [chunk_id for _, chunk_id in rows])
+
+        if revision is None:
+            logger.info(f"Deleted document {doc_id} from vector store for user {user_id}")
+        else:
+            logger.info(f"Deleted revision {revision} of document {doc_id} from vector store for user {user_id}")
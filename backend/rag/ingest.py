@@ -1,13 +1,56 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List, Dict
-import uuid
+from typing import List, Dict, Optional, Callable, Iterable, Iterator, Tuple
+from bisect import bisect_left, bisect_right
+import numpy as np
+import hashlib
 import logging
+import os
 
-from rag.vectorstore import get_vector_store
-from utils.pdf_parser import extract_text_from_pdf
+from rag.minhash import MINHASH_METADATA_KEY, content_signature
+from rag.text_splitter import split_prefix_spans, split_spans
+from rag.vectorstore import get_vector_store, encode_texts, count_tokens, get_max_tokens, token_starts
+from utils.pdf_parser import stream_pdf
 
 logger = logging.getLogger(__name__)
 
+# Number of chunks encoded per model call during ingestion
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Chunk sizing: "characters" (800 characters, 200 overlap) or "tokens" (packed
+# up to the embedding model's max sequence length, measured with its tokenizer)
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "characters").lower()
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+
+# Pages tokenized per tokenizer call in token mode
+TOKENIZE_PAGE_BATCH = 16
+
+# Batch tokenizer: returns the token start offsets of each text
+Tokenizer = Callable[[List[str]], List[List[int]]]
+
+
+def chunk_spans(
+    text: str,
+    chunk_size: int = 800,
+    chunk_overlap: int = 200,
+    page_starts: Optional[List[int]] = None
+) -> List[Tuple[int, int, int]]:
+    """
+    Split text into chunks with overlap, returned as offsets into the text.
+    
+    Args:
+        text: Text to chunk
+        chunk_size: Target size of each chunk (in characters, ~500-800 tokens)
+        chunk_overlap: Overlap between chunks (in characters)
+        page_starts: Sorted offsets at which each page (1-based) starts in text
+        
+    Returns:
+        List of (start, end, page) spans; page is the page the chunk starts on
+        (1 if page_starts is not given)
+    """
+    spans = split_spans(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    if not page_starts:
+        return [(start, end, 1) for start, end in spans]
+    return [(start, end, max(bisect_right(page_starts, start), 1)) for start, end in spans]
+
 
 def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 200) -> List[str]:
     """
@@ -21,89 +64,524 @@ def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 200) -> Li
     Returns:
         List of text chunks
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
+    return [text[start:end] for start, end, _ in chunk_spans(text, chunk_size, chunk_overlap)]
+
+
+def chunking_params(mode: str = CHUNKING_MODE) -> Tuple[int, int, Optional[Tokenizer]]:
+    """
+    Return (chunk_size, chunk_overlap, tokenizer) for a chunking mode.
     
-    chunks = text_splitter.split_text(text)
-    return chunks
+    In "tokens" mode chunks are measured with the embedding model's tokenizer
+    and sized to exactly what the model sees, so no chunk text is truncated.
+    """
+    if mode == "tokens":
+        max_tokens = get_max_tokens()
+        return max_tokens, min(CHUNK_OVERLAP_TOKENS, max_tokens // 2), token_starts
+    if mode != "characters":
+        raise ValueError(f"Unknown chunking mode: {mode}")
+    return 800, 200, None
 
 
-def ingest_pdf(
+def iter_chunks(
+    pages: Iterable[str],
+    chunk_size: int = 800,
+    chunk_overlap: int = 200,
+    tokenizer: Optional[Tokenizer] = None
+) -> Iterator[Tuple[str, Dict[str, int]]]:
+    """
+    Chunk a stream of page texts without materializing the whole document.
+    
+    Pages are appended to a buffer; after each page the chunks that no later
+    page can change are emitted (see split_prefix_spans) and the buffer
+    restarts where the next chunk's merge window starts. The buffer is
+    therefore bounded by roughly one chunk plus one page, and the chunks are
+    exactly those of chunk_spans on the whole document text (or, in token
+    mode, split_spans with the pages' token offsets).
+    
+    Offsets refer to the document text, i.e. the non-blank pages joined by blank
+    lines (as returned by extract_text_from_pdf).
+    
+    Args:
+        pages: Iterable of page texts (blank pages are skipped)
+        chunk_size: Target size of each chunk (in characters)
+        chunk_overlap: Overlap between chunks (in characters)
+        tokenizer: Optional batch tokenizer (e.g. token_starts); chunk_size and
+            chunk_overlap are then in tokens. Each page is tokenized once, in
+            batches of TOKENIZE_PAGE_BATCH pages.
+        
+    Yields:
+        Tuples of (chunk text, position) in document order; position holds the
+        1-based page and page_end and the start_offset and end_offset
+    """
+    buffer = ""
+    base = 0  # Document offset of buffer[0]
+    page_offsets: List[int] = []  # Document offsets of the buffered pages
+    page_numbers: List[int] = []
+    # Buffer offsets of the buffered tokens (token mode only)
+    buffer_tokens: Optional[List[int]] = [] if tokenizer else None
+    
+    def position(start: int, end: int) -> Dict[str, int]:
+        return {
+            "page": page_numbers[bisect_right(page_offsets, start) - 1],
+            "page_end": page_numbers[bisect_right(page_offsets, end - 1) - 1],
+            "start_offset": start,
+            "end_offset": end,
+        }
+    
+    for page_number, (page, page_tokens) in enumerate(_tokenized_pages(pages, tokenizer), 1):
+        if not page.strip():
+            continue
+        if buffer:
+            buffer = f"{buffer}\n\n{page}"
+        else:
+            buffer = page
+        page_start = len(buffer) - len(page)
+        page_offsets.append(base + page_start)
+        page_numbers.append(page_number)
+        if tokenizer:
+            buffer_tokens.extend(page_start + offset for offset in page_tokens)
+        
+        spans, restart = split_prefix_spans(buffer, chunk_size, chunk_overlap, token_starts=buffer_tokens)
+        for start, end in spans:
+            yield buffer[start:end], position(base + start, base + end)
+        if not restart:
+            continue
+        
+        buffer = buffer[restart:]
+        base += restart
+        if tokenizer:
+            buffer_tokens = [offset - restart for offset in buffer_tokens[bisect_left(buffer_tokens, restart):]]
+        # Forget pages that end before the new buffer start
+        first = bisect_right(page_offsets, base) - 1
+        del page_offsets[:first]
+        del page_numbers[:first]
+    
+    if buffer.strip():
+        for start, end in split_spans(buffer, chunk_size, chunk_overlap, token_starts=buffer_tokens):
+            yield buffer[start:end], position(base + start, base + end)
+
+
+def _tokenized_pages(
+    pages: Iterable[str],
+    tokenizer: Optional[Tokenizer]
+) -> Iterator[Tuple[str, Optional[List[int]]]]:
+    """Pair each page with its token start offsets (None without a tokenizer)."""
+    if tokenizer is None:
+        for page in pages:
+            yield page, None
+        return
+    for batch in _batched(pages, TOKENIZE_PAGE_BATCH):
+        yield from zip(batch, tokenizer(batch))
+
+
+def chunk_hash(text: str) -> str:
+    """Return the hex SHA-256 digest identifying a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _batched(items: Iterable, batch_size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_chunk_records(
     pdf_path: str,
     doc_id: str,
     user_id: str,
     filename: str,
-    metadata: Dict = None
-) -> int:
+    metadata: Dict = None,
+    state: Optional[Dict] = None
+) -> Iterator[Tuple[str, Dict, str]]:
     """
-    Ingest a PDF file: extract text, chunk it, embed it, and store in vector DB.
+    Lazily yield (text, metadata, chunk_id) for every chunk of a PDF.
     
     Args:
         pdf_path: Path to the PDF file
         doc_id: Unique document ID
         user_id: User ID (for namespace)
         filename: Original filename
-        metadata: Additional metadata to store
+        metadata: Additional metadata to store on every chunk
+        state: Optional dict updated with pdf_metadata, page_count and
+            pages_read as extraction proceeds
         
-    Returns:
-        Number of chunks created
+    Yields:
+        Tuples of (chunk text, chunk metadata, chunk ID) in document order
     """
-    try:
-        # Extract text from PDF
-        logger.info(f"Extracting text from PDF: {pdf_path}")
-        text = extract_text_from_pdf(pdf_path)
+    state = state if state is not None else {}
+    logger.info(f"Extracting text from PDF: {pdf_path}")
+    pdf_metadata, pages = stream_pdf(pdf_path)
+    state.update(pdf_metadata=pdf_metadata, page_count=max(pdf_metadata["page_count"], 1), pages_read=0)
+    
+    def counted(pages: Iterator[str]) -> Iterator[str]:
+        for page in pages:
+            state["pages_read"] += 1
+            yield page
+    
+    chunk_size, chunk_overlap, tokenizer = chunking_params()
+    chunks = iter_chunks(counted(pages), chunk_size, chunk_overlap, tokenizer)
+    for i, (chunk, position) in enumerate(chunks):
+        chunk_id = f"{doc_id}_chunk_{i}"
+        chunk_metadata = {
+            "doc_id": doc_id,
+            "chunk_id": chunk_id,
+            "chunk_index": i,
+            "user_id": user_id,
+            "filename": filename,
+            "source": "pdf",
+            MINHASH_METADATA_KEY: content_signature(chunk)
+        }
+        chunk_metadata.update(position)
+        chunk_metadata.update(pdf_metadata)
         
-        if not text.strip():
-            raise ValueError("PDF contains no extractable text")
+        # Add any additional metadata
+        if metadata:
+            chunk_metadata.update(metadata)
         
-        # Chunk the text
-        logger.info(f"Chunking text for document {doc_id}")
-        chunks = chunk_text(text, chunk_size=800, chunk_overlap=200)
+        yield chunk, chunk_metadata, chunk_id
+
+
+def embed_and_store(
+    records: Iterable[Tuple[str, Dict, str]],
+    store_batch: Callable[[str, List[str], List[Dict], List[str], np.ndarray], None],
+    batch_size: int = EMBED_BATCH_SIZE,
+    on_batch: Optional[Callable[[], None]] = None
+) -> int:
+    """
+    Embed chunk records in fixed-size batches and hand them to ``store_batch``.
+    
+    Batches are filled across document boundaries so every model call runs at
+    full batch size; each batch is then stored per document. Each chunk's
+    token_count (embedding-model tokens) is added to its metadata.
+    
+    Args:
+        records: Iterable of (text, metadata, chunk_id)
+        store_batch: Callable receiving (doc_id, texts, metadatas, ids, embeddings)
+        batch_size: Chunks embedded per model call
+        on_batch: Optional callable invoked after each stored batch
         
-        if not chunks:
-            raise ValueError("No chunks created from PDF")
+    Returns:
+        Number of chunks stored
+    """
+    count = 0
+    for batch in _batched(records, batch_size):
+        texts = [text for text, _, _ in batch]
+        # Cached chunks are reused by encode_texts
+        embeddings = encode_texts(texts)
+        for (_, chunk_metadata, _), tokens in zip(batch, count_tokens(texts)):
+            chunk_metadata["token_count"] = tokens
         
-        # Prepare metadata and IDs for each chunk
-        metadatas = []
-        ids = []
+        start = 0
+        while start < len(batch):
+            doc_id = batch[start][1]["doc_id"]
+            end = start
+            while end < len(batch) and batch[end][1]["doc_id"] == doc_id:
+                end += 1
+            store_batch(
+                doc_id,
+                texts[start:end],
+                [chunk_metadata for _, chunk_metadata, _ in batch[start:end]],
+                [chunk_id for _, _, chunk_id in batch[start:end]],
+                embeddings[start:end]
+            )
+            start = end
         
-        for i, chunk in enumerate(chunks):
-            chunk_id = f"{doc_id}_chunk_{i}"
-            chunk_metadata = {
-                "doc_id": doc_id,
-                "chunk_id": chunk_id,
-                "chunk_index": i,
-                "user_id": user_id,
-                "filename": filename,
-                "source": "pdf"
-            }
-            
-            # Add any additional metadata
-            if metadata:
-                chunk_metadata.update(metadata)
+        count += len(batch)
+        if on_batch:
+            on_batch()
+    return count
+
+
+def new_chunk_stats() -> Dict:
+    """Return empty per-document chunk statistics."""
+    return {"total_tokens": 0, "max_chunk_tokens": 0, "truncated_chunks": 0}
+
+
+def tally_chunk_stats(stats: Dict, metadatas: Iterable[Dict], max_tokens: int):
+    """
+    Add chunks to per-document statistics.
+    
+    A chunk is counted as truncated when it has more tokens than the embedding
+    model sees (the tail beyond max_tokens does not influence its vector).
+    """
+    for chunk_metadata in metadatas:
+        tokens = chunk_metadata["token_count"]
+        stats["total_tokens"] += tokens
+        stats["max_chunk_tokens"] = max(stats["max_chunk_tokens"], tokens)
+        if tokens > max_tokens:
+            stats["truncated_chunks"] += 1
+
+
+def stream_ingest_pdfs(
+    documents: List[Dict],
+    user_id: str,
+    store_batch: Callable[[str, List[str], List[Dict], List[str], np.ndarray], None],
+    progress_callback: Optional[Callable[[str, float], None]] = None,
+    batch_size: int = EMBED_BATCH_SIZE
+) -> List[Dict]:
+    """
+    Run the streaming ingest pipeline over one or more PDFs.
+    
+    Pages are read lazily, chunked incrementally, embedded in fixed-size batches
+    (shared across documents) and handed to ``store_batch`` one batch at a time,
+    so peak memory is proportional to the batch size rather than the document
+    size. A document that fails to extract is reported and skipped; some of its
+    chunks may already be stored, so callers roll back failed documents by doc_id.
+    
+    Args:
+        documents: Dicts with pdf_path, doc_id, filename and optional metadata
+        user_id: User ID (for namespace)
+        store_batch: Callable receiving (doc_id, texts, metadatas, ids, embeddings)
+        progress_callback: Optional callable receiving (stage, progress 0-1)
+        batch_size: Chunks embedded per model call
+        
+    Returns:
+        One dict per document with doc_id, chunk_count, pdf_metadata,
+        chunk_stats (see tally_chunk_stats) and error
+    """
+    results = [
+        {
+            "doc_id": document["doc_id"],
+            "chunk_count": 0,
+            "pdf_metadata": {},
+            "chunk_stats": new_chunk_stats(),
+            "error": None
+        }
+        for document in documents
+    ]
+    results_by_doc = {result["doc_id"]: result for result in results}
+    max_tokens = get_max_tokens()
+    position = 0
+    state: Dict = {}
+    
+    def store_and_tally(doc_id, texts, metadatas, ids, embeddings):
+        tally_chunk_stats(results_by_doc[doc_id]["chunk_stats"], metadatas, max_tokens)
+        store_batch(doc_id, texts, metadatas, ids, embeddings)
+    
+    def report(stage: str):
+        if progress_callback:
+            page_fraction = state.get("pages_read", 0) / state.get("page_count", 1)
+            progress_callback(stage, 0.05 + 0.9 * (position + page_fraction) / len(documents))
+    
+    def records() -> Iterator[Tuple[str, Dict, str]]:
+        nonlocal position, state
+        for position, document in enumerate(documents):
+            result = results[position]
+            state = {}
+            try:
+                for record in iter_chunk_records(
+                    document["pdf_path"],
+                    document["doc_id"],
+                    user_id,
+                    document["filename"],
+                    metadata=document.get("metadata"),
+                    state=state
+                ):
+                    result["chunk_count"] += 1
+                    yield record
+                result["pdf_metadata"] = state["pdf_metadata"]
+                if result["chunk_count"] == 0:
+                    raise ValueError("PDF contains no extractable text")
+            except Exception as e:
+                logger.error(f"Error ingesting PDF {document['pdf_path']}: {str(e)}")
+                result["error"] = str(e)
+    
+    report("extracting")
+    embed_and_store(records(), store_and_tally, batch_size, on_batch=lambda: report("embedding"))
+    
+    for result in results:
+        stats = result["chunk_stats"]
+        if stats["truncated_chunks"]:
+            logger.warning(
+                f"{stats['truncated_chunks']} of {result['chunk_count']} chunks of document "
+                f"{result['doc_id']} exceed the embedding model's {max_tokens} token limit "
+                f"and were truncated (CHUNKING_MODE=tokens avoids this)"
+            )
+    return results
+
+
+def stream_ingest_pdf(
+    pdf_path: str,
+    doc_id: str,
+    user_id: str,
+    filename: str,
+    store_batch: Callable[[str, List[str], List[Dict], List[str], np.ndarray], None],
+    metadata: Dict = None,
+    progress_callback: Optional[Callable[[str, float], None]] = None,
+    batch_size: int = EMBED_BATCH_SIZE
+) -> Tuple[int, Dict]:
+    """
+    Run the streaming ingest pipeline for a single PDF.
+    
+    See stream_ingest_pdfs; on failure some batches may already be stored and
+    callers roll back by doc_id.
+    
+    Returns:
+        Tuple of (number of chunks created, PDF metadata)
+    """
+    document = {"pdf_path": pdf_path, "doc_id": doc_id, "filename": filename, "metadata": metadata}
+    result = stream_ingest_pdfs([document], user_id, store_batch, progress_callback, batch_size)[0]
+    if result["error"]:
+        raise ValueError(result["error"])
+    return result["chunk_count"], result["pdf_metadata"]
+
+
+def stream_update_pdf(
+    pdf_path: str,
+    doc_id: str,
+    user_id: str,
+    filename: str,
+    existing_hashes: Dict[str, str],
+    store_batch: Callable[[str, List[str], List[Dict], List[str], np.ndarray], None],
+    revision: int,
+    metadata: Dict = None,
+    progress_callback: Optional[Callable[[str, float], None]] = None,
+    batch_size: int = EMBED_BATCH_SIZE
+) -> Dict:
+    """
+    Re-chunk a new version of a document and embed only the chunks that changed.
+    
+    Each new chunk is matched by text hash against the chunks already stored for
+    the document. Matches keep their existing chunk ID (and vector); only
+    unmatched chunks are embedded and handed to ``store_batch``, tagged with
+    ``revision`` so a failed update can be rolled back by revision. Applying the
+    result (updating kept chunks, deleting removed ones) is left to the caller.
+    
+    Args:
+        pdf_path: Path to the new version of the PDF
+        doc_id: Document ID being updated
+        user_id: User ID (for namespace)
+        filename: Filename of the new version
+        existing_hashes: Stored chunk IDs of the document mapped to their chunk_hash
+        store_batch: Callable receiving (doc_id, texts, metadatas, ids, embeddings)
+        revision: Revision number of the new version
+        metadata: Additional metadata to store on every chunk
+        progress_callback: Optional callable receiving (stage, progress 0-1)
+        batch_size: Chunks embedded per model call
+        
+    Returns:
+        Dict with chunk_count, pdf_metadata, chunk_stats, kept (list of
+        (chunk_id, metadata)), added (number of embedded chunks) and removed
+        (chunk IDs no longer present)
+    """
+    # Identical chunks may occur more than once, so match them in order
+    available: Dict[str, List[str]] = {}
+    for chunk_id, text_hash in sorted(existing_hashes.items()):
+        available.setdefault(text_hash, []).append(chunk_id)
+    
+    kept: List[Tuple[str, Dict]] = []
+    kept_texts: List[str] = []
+    state: Dict = {}
+    chunk_count = 0
+    max_tokens = get_max_tokens()
+    chunk_stats = new_chunk_stats()
+    chunk_metadata_extra = dict(metadata or {}, revision=revision)
+    
+    def report(stage: str):
+        if progress_callback:
+            page_fraction = state.get("pages_read", 0) / state.get("page_count", 1)
+            progress_callback(stage, 0.05 + 0.9 * page_fraction)
+    
+    def changed_records() -> Iterator[Tuple[str, Dict, str]]:
+        nonlocal chunk_count
+        records = iter_chunk_records(
+            pdf_path, doc_id, user_id, filename, metadata=chunk_metadata_extra, state=state
+        )
+        for text, chunk_metadata, chunk_id in records:
+            chunk_count += 1
+            matches = available.get(chunk_hash(text))
+            if matches:
+                chunk_id = matches.pop(0)
+                chunk_metadata["chunk_id"] = chunk_id
+                kept.append((chunk_id, chunk_metadata))
+                kept_texts.append(text)
+                continue
             
-            metadatas.append(chunk_metadata)
-            ids.append(chunk_id)
+            # Positional IDs may still belong to chunks of the previous version
+            if chunk_id in existing_hashes:
+                chunk_id = f"{chunk_id}_r{revision}"
+                chunk_metadata["chunk_id"] = chunk_id
+            yield text, chunk_metadata, chunk_id
+    
+    def store_and_tally(doc_id, texts, metadatas, ids, embeddings):
+        tally_chunk_stats(chunk_stats, metadatas, max_tokens)
+        store_batch(doc_id, texts, metadatas, ids, embeddings)
+    
+    report("extracting")
+    added = embed_and_store(changed_records(), store_and_tally, batch_size, on_batch=lambda: report("embedding"))
+    if chunk_count == 0:
+        raise ValueError("PDF contains no extractable text")
+    
+    # Kept chunks get fresh metadata, including their token counts
+    for start in range(0, len(kept), batch_size):
+        batch = kept[start:start + batch_size]
+        token_counts = count_tokens(kept_texts[start:start + batch_size])
+        for (_, chunk_metadata), tokens in zip(batch, token_counts):
+            chunk_metadata["token_count"] = tokens
+        tally_chunk_stats(chunk_stats, (chunk_metadata for _, chunk_metadata in batch), max_tokens)
+    
+    kept_ids = {chunk_id for chunk_id, _ in kept}
+    removed = [chunk_id for chunk_id in existing_hashes if chunk_id not in kept_ids]
+    logger.info(
+        f"Re-ingested {filename}: {len(kept)} chunks kept, {added} added, {len(removed)} removed"
+    )
+    return {
+        "chunk_count": chunk_count,
+        "pdf_metadata": state["pdf_metadata"],
+        "chunk_stats": chunk_stats,
+        "kept": kept,
+        "added": added,
+        "removed": removed,
+    }
+
+
+def ingest_pdf(
+    pdf_path: str,
+    doc_id: str,
+    user_id: str,
+    filename: str,
+    metadata: Dict = None
+) -> int:
+    """
+    Ingest a PDF file: extract text, chunk it, embed it, and store in vector DB.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        doc_id: Unique document ID
+        user_id: User ID (for namespace)
+        filename: Original filename
+        metadata: Additional metadata to store
         
-        # Store in vector database
-        logger.info(f"Storing {len(chunks)} chunks in vector store")
-        vector_store = get_vector_store()
+    Returns:
+        Number of chunks created
+    """
+    vector_store = get_vector_store()
+    
+    def store_batch(doc_id, texts, metadatas, ids, embeddings):
         vector_store.add_documents(
             user_id=user_id,
             doc_id=doc_id,
-            texts=chunks,
+            texts=texts,
             metadatas=metadatas,
-            ids=ids
+            ids=ids,
+            embeddings=embeddings
         )
-        
-        logger.info(f"Successfully ingested PDF {filename} with {len(chunks)} chunks")
-        return len(chunks)
+    
+    try:
+        chunk_count, _ = stream_ingest_pdf(
+            pdf_path, doc_id, user_id, filename, store_batch, metadata=metadata
+        )
+        logger.info(f"Successfully ingested PDF {filename} with {chunk_count} chunks")
+        return chunk_count
     
     except Exception as e:
         logger.error(f"Error ingesting PDF {pdf_path}: {str(e)}")
+        # Roll back any batches that were already stored
+        vector_store.delete_document(user_id=user_id, doc_id=doc_id)
         raise
-
@@ -0,0 +1,888 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from models.database import get_db
+from rag.async_vectorstore import get_async_vector_store
+from rag.ingest import chunk_hash, stream_ingest_pdfs, stream_update_pdf
+from rag.vectorstore import get_vector_store, set_bulk_encode_gate, track_query_activity
+from utils.uploads import store_blob
+
+logger = logging.getLogger(__name__)
+
+# Ingestion worker pool configuration
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "32"))
+INGEST_JOB_TTL_SECONDS = int(os.getenv("INGEST_JOB_TTL_SECONDS", "3600"))
+# Max events (progress updates and chunk batches) buffered between workers and the API process
+INGEST_EVENT_QUEUE_SIZE = int(os.getenv("INGEST_EVENT_QUEUE_SIZE", "64"))
+# Interactive queries take priority over bulk embedding: workers run at a lower
+# CPU priority and wait up to INGEST_QUERY_YIELD_MS before each embedding batch
+# while the API process is embedding queries
+INGEST_WORKER_NICE = int(os.getenv("INGEST_WORKER_NICE", "10"))
+INGEST_QUERY_YIELD_MS = float(os.getenv("INGEST_QUERY_YIELD_MS", "200"))
+
+# Job stages reported by GET /upload/jobs/{job_id}
+STAGE_QUEUED = "queued"
+STAGE_EXTRACTING = "extracting"
+STAGE_EMBEDDING = "embedding"
+STAGE_STORING = "storing"
+STAGE_COMPLETED = "completed"
+STAGE_FAILED = "failed"
+
+TERMINAL_STAGES = {STAGE_COMPLETED, STAGE_FAILED}
+
+# Per-file statuses within a job
+FILE_QUEUED = "queued"
+FILE_COMPLETED = "completed"
+FILE_FAILED = "failed"
+
+# Fields of job and file records that are exposed through the status API
+PUBLIC_JOB_FIELDS = (
+    "job_id", "doc_id", "filename", "stage", "progress",
+    "chunk_count", "error", "created_at", "updated_at", "diff"
+)
+
+# Job kinds: ingest new uploads, or re-ingest a new version of a document
+JOB_INGEST = "ingest"
+JOB_UPDATE = "update"
+PUBLIC_FILE_FIELDS = ("filename", "doc_id", "status", "chunk_count", "truncated_chunks", "error")
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue cannot accept more jobs."""
+
+
+class DocumentBusyError(Exception):
+    """Raised when a document already has an unfinished ingestion job."""
+
+
+# Event queue and query activity counter shared with worker processes (set by the pool initializer)
+_event_queue = None
+_query_activity = None
+
+
+def _init_worker(event_queue, query_activity=None, nice: int = INGEST_WORKER_NICE):
+    """Initializer for ingestion worker processes."""
+    global _event_queue, _query_activity
+    _event_queue = event_queue
+    _query_activity = query_activity
+
+    # Lower CPU priority so query handling in the API process wins contention
+    if nice > 0 and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError as e:
+            logger.warning(f"Could not lower ingestion worker priority: {str(e)}")
+
+    if query_activity is not None:
+        set_bulk_encode_gate(_yield_to_queries)
+
+
+def _yield_to_queries():
+    """Hold a bulk embedding batch while queries are being embedded (bounded wait)."""
+    deadline = time.monotonic() + INGEST_QUERY_YIELD_MS / 1000
+    while _query_activity.value > 0 and time.monotonic() < deadline:
+        time.sleep(0.002)
+
+
+def _run_ingest_job(job_id: str, user_id: str, documents: List[Dict]) -> Dict:
+    """
+    Worker-process entry point: run the streaming ingest pipeline for PDFs.
+
+    Progress updates and embedded chunk batches are sent to the API process
+    through the shared event queue, which is bounded so a worker cannot run
+    ahead of the store by more than a few batches. Errors are returned rather
+    than raised so the API process always learns how many batches to expect.
+    """
+    batches = 0
+
+    def report(stage: str, progress: float):
+        _event_queue.put(("progress", job_id, (stage, progress)))
+
+    def store_batch(doc_id, texts, metadatas, ids, embeddings):
+        nonlocal batches
+        _event_queue.put(("batch", job_id, (doc_id, texts, metadatas, ids, embeddings)))
+        batches += 1
+
+    try:
+        results = stream_ingest_pdfs(documents, user_id, store_batch, progress_callback=report)
+        return {"batches": batches, "results": results, "error": None}
+    except Exception as e:
+        return {"batches": batches, "results": [], "error": str(e)}
+
+
+def _run_update_job(
+    job_id: str,
+    user_id: str,
+    document: Dict,
+    existing_hashes: Dict[str, str],
+    revision: int
+) -> Dict:
+    """
+    Worker-process entry point: re-ingest a new version of a document.
+
+    Only chunks whose text is not already stored are embedded and sent to the
+    API process; see _run_ingest_job for the event protocol.
+    """
+    batches = 0
+
+    def report(stage: str, progress: float):
+        _event_queue.put(("progress", job_id, (stage, progress)))
+
+    def store_batch(doc_id, texts, metadatas, ids, embeddings):
+        nonlocal batches
+        _event_queue.put(("batch", job_id, (doc_id, texts, metadatas, ids, embeddings)))
+        batches += 1
+
+    try:
+        result = stream_update_pdf(
+            document["pdf_path"],
+            document["doc_id"],
+            user_id,
+            document["filename"],
+            existing_hashes,
+            store_batch,
+            revision,
+            metadata=document.get("metadata"),
+            progress_callback=report
+        )
+        return {"batches": batches, "result": result, "error": None}
+    except Exception as e:
+        return {"batches": batches, "result": None, "error": str(e)}
+
+
+class IngestionJobQueue:
+    """
+    Bounded queue of ingestion jobs executed by a pool of worker processes.
+
+    A job covers one or more uploaded files. Extraction, chunking and embedding
+    run in the worker processes so they never block the event loop; chunk
+    batches are filled across the files of a job and stream back as they are
+    embedded. Uploads whose file hash matches an already ingested document
+    reuse its chunks and embeddings instead. Vectors are written to the store
+    from the API process (the vector store is not multi-process safe) and the
+    Mongo document record is written as each file completes. Workers run at a
+    lower CPU priority and hold back embedding batches while the API process
+    embeds queries, so search latency stays flat during bulk ingestion.
+    If a worker dies (e.g. a crash on a malformed PDF), the jobs running in
+    the pool fail and the pool is replaced for the jobs that follow.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, max_queued: int = INGEST_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        # Hashes of uploads moved into the blob store but not yet queued (or released), with counts
+        self._staged_hashes: Dict[str, int] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._mp_context = None
+        self._query_activity = None
+        self._event_queue = None
+        self._listener: Optional[threading.Thread] = None
+        self._dispatchers = []
+
+    async def start(self):
+        """Start the worker pool, event listener and dispatcher tasks."""
+        # Spawn (not fork) so workers don't inherit torch/chroma thread state
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._event_queue = self._mp_context.Queue(maxsize=INGEST_EVENT_QUEUE_SIZE)
+        self._query_activity = self._mp_context.Value("i", 0)
+        track_query_activity(self._query_activity)
+        self._executor = self._new_executor()
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._listener = threading.Thread(
+            target=self._listen_events,
+            name="ingest-events",
+            daemon=True
+        )
+        self._listener.start()
+        self._dispatchers = [
+            asyncio.create_task(self._dispatch()) for _ in range(self.workers)
+        ]
+        logger.info(f"Ingestion queue started with {self.workers} workers (max {self.max_queued} queued)")
+
+    async def stop(self):
+        """Stop dispatching and shut down the worker pool."""
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        track_query_activity(None)
+
+        if self._event_queue is not None:
+            self._event_queue.put(None)
+            self._listener.join(timeout=5)
+            self._event_queue = None
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._mp_context,
+            initializer=_init_worker,
+            initargs=(self._event_queue, self._query_activity)
+        )
+
+    def _replace_executor(self, broken: ProcessPoolExecutor):
+        """Swap a broken worker pool for a new one (once, however many jobs saw it break)."""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.warning("An ingestion worker died; restarted the worker pool")
+
+    async def _run_in_worker(self, fn, *args) -> Dict:
+        """
+        Run a job function in the worker pool.
+
+        Raises:
+            BrokenProcessPool: If a worker died while the job was running (the
+                pool is replaced; a pool that was already broken when the job
+                was submitted is replaced and the job retried)
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._executor
+            try:
+                future = loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                # Broken by another job before this one started
+                self._replace_executor(executor)
+                if attempt:
+                    raise
+                continue
+            try:
+                return await future
+            except BrokenProcessPool:
+                self._replace_executor(executor)
+                raise
+
+    def stage_upload(self, staged_path: str, file_hash: str) -> str:
+        """
+        Move a staged upload into the blob store and hold it for a job.
+
+        The hash is registered in the same critical section as the move, so
+        release_upload cannot delete the blob between the move and submit.
+        The hold ends when a job with the file is queued, or when the caller
+        gives the upload up with release_upload(..., staged=True).
+
+        Returns:
+            Path of the stored file
+        """
+        with self._lock:
+            path = store_blob(staged_path, file_hash)
+            self._staged_hashes[file_hash] = self._staged_hashes.get(file_hash, 0) + 1
+        return path
+
+    def _unstage(self, file_hashes: List[str]):
+        """Drop one hold per hash (caller holds the lock)."""
+        for file_hash in file_hashes:
+            count = self._staged_hashes.get(file_hash, 0) - 1
+            if count > 0:
+                self._staged_hashes[file_hash] = count
+            else:
+                self._staged_hashes.pop(file_hash, None)
+
+    def submit(
+        self,
+        user_id: str,
+        doc_id: str,
+        filename: str,
+        file_path: str,
+        file_size: int,
+        file_hash: str
+    ) -> Dict:
+        """
+        Enqueue a single PDF for ingestion.
+
+        Args:
+            user_id: Owner of the document
+            doc_id: Document ID to ingest as
+            filename: Original filename
+            file_path: Path of the stored upload
+            file_size: Size of the upload in bytes
+            file_hash: Hex SHA-256 digest of the upload
+
+        Returns:
+            Public view of the new job record
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        return self.submit_batch(user_id, [{
+            "doc_id": doc_id,
+            "filename": filename,
+            "file_path": file_path,
+            "file_size": file_size,
+            "file_hash": file_hash,
+        }])
+
+    def submit_batch(self, user_id: str, files: List[Dict]) -> Dict:
+        """
+        Enqueue several PDFs as one ingestion job.
+
+        Args:
+            user_id: Owner of the documents
+            files: Dicts with doc_id, filename, file_path, file_size and file_hash
+
+        Returns:
+            Public view of the new job record
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+        """
+        return self._enqueue(user_id, files, kind=JOB_INGEST)
+
+    def submit_update(self, user_id: str, document: Dict, file: Dict) -> Dict:
+        """
+        Enqueue a new version of an existing document for incremental re-ingestion.
+
+        Args:
+            user_id: Owner of the document
+            document: Current Mongo record of the document
+            file: Dict with filename, file_path, file_size and file_hash of the new version
+
+        Returns:
+            Public view of the new job record
+
+        Raises:
+            DocumentBusyError: If the document already has an unfinished job
+            QueueFullError: If the queue is at capacity
+        """
+        return self._enqueue(
+            user_id,
+            [dict(file, doc_id=document["doc_id"])],
+            kind=JOB_UPDATE,
+            previous=document
+        )
+
+    def is_document_busy(self, doc_id: str) -> bool:
+        """Return True if an unfinished job is ingesting the given document."""
+        with self._lock:
+            return self._is_busy(doc_id)
+
+    def _is_busy(self, doc_id: str) -> bool:
+        return any(
+            job["stage"] not in TERMINAL_STAGES and file["doc_id"] == doc_id
+            for job in self._jobs.values()
+            for file in job["files"]
+        )
+
+    def _enqueue(self, user_id: str, files: List[Dict], kind: str, previous: Optional[Dict] = None) -> Dict:
+        if self._queue is None:
+            raise RuntimeError("Ingestion queue has not been started")
+
+        self._prune_finished_jobs()
+
+        now = datetime.now(timezone.utc)
+        job_id = str(uuid.uuid4())
+        single = files[0] if len(files) == 1 else None
+        job = {
+            "job_id": job_id,
+            "user_id": user_id,
+            "doc_id": single["doc_id"] if single else None,
+            "filename": single["filename"] if single else None,
+            "files": [
+                dict(file, status=FILE_QUEUED, chunk_count=0, truncated_chunks=0, error=None)
+                for file in files
+            ],
+            "stage": STAGE_QUEUED,
+            "progress": 0.0,
+            "chunk_count": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "diff": None,
+            "kind": kind,
+            "previous": previous,
+            "worker_done": False,
+            "batches_stored": 0,
+            "store_errors": {},
+        }
+
+        with self._lock:
+            if kind == JOB_UPDATE and self._is_busy(files[0]["doc_id"]):
+                raise DocumentBusyError("Document is still being processed, try again later")
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            with self._lock:
+                del self._jobs[job_id]
+            raise QueueFullError("Ingestion queue is full, try again later")
+
+        # The files are now held by the queued job
+        with self._lock:
+            self._unstage([file["file_hash"] for file in files if file.get("file_hash")])
+        return self._public(job)
+
+    def get_job(self, job_id: str, user_id: str) -> Optional[Dict]:
+        """Return the public view of a job if it exists and belongs to the user."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["user_id"] != user_id:
+                return None
+            return self._public(job)
+
+    @staticmethod
+    def _public(job: Dict) -> Dict:
+        public = {field: job[field] for field in PUBLIC_JOB_FIELDS}
+        public["files"] = [
+            {field: file[field] for field in PUBLIC_FILE_FIELDS}
+            for file in job["files"]
+        ]
+        return public
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                job["updated_at"] = datetime.now(timezone.utc)
+
+    def _update_file(self, job_id: str, doc_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for file in job["files"]:
+                if file["doc_id"] == doc_id:
+                    file.update(fields)
+            job["updated_at"] = datetime.now(timezone.utc)
+
+    def _file_status(self, job_id: str, doc_id: str) -> Optional[str]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            for file in job["files"] if job else []:
+                if file["doc_id"] == doc_id:
+                    return file["status"]
+        return None
+
+    def _prune_finished_jobs(self):
+        """Forget finished jobs older than the configured TTL."""
+        cutoff = time.time() - INGEST_JOB_TTL_SECONDS
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["stage"] in TERMINAL_STAGES and job["updated_at"].timestamp() < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def _listen_events(self):
+        """Apply progress updates and store chunk batches sent by worker processes."""
+        while True:
+            event = self._event_queue.get()
+            if event is None:
+                return
+            kind, job_id, payload = event
+            if kind == "progress":
+                self._apply_progress(job_id, *payload)
+            elif kind == "batch":
+                self._store_batch(job_id, *payload)
+
+    def _apply_progress(self, job_id: str, stage: str, progress: float):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # Late events must not overwrite stages set after the worker returned
+            if job is None or job["worker_done"]:
+                return
+            job["stage"] = stage
+            job["progress"] = round(progress, 3)
+            job["updated_at"] = datetime.now(timezone.utc)
+
+    def _store_batch(self, job_id: str, doc_id: str, texts, metadatas, ids, embeddings):
+        """
+        Store a chunk batch, unless its job or file already failed.
+
+        A file can fail (and be rolled back) while its batches are still on
+        the event queue, e.g. when its worker died; those batches are dropped.
+        A batch stored while the file failed is deleted again, as the
+        rollback may have run before it was written.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            skip = job is None or doc_id in job["store_errors"] or self._file_failed(job, doc_id)
+        try:
+            if not skip:
+                vector_store = get_vector_store()
+                vector_store.add_documents(
+                    user_id=job["user_id"],
+                    doc_id=doc_id,
+                    texts=texts,
+                    metadatas=metadatas,
+                    ids=ids,
+                    embeddings=embeddings
+                )
+                with self._lock:
+                    rolled_back = self._file_failed(job, doc_id)
+                if rolled_back:
+                    vector_store.delete_chunks(job["user_id"], ids)
+        except Exception as e:
+            logger.error(f"Failed to store batch of {doc_id} for ingestion job {job_id}: {str(e)}")
+            with self._lock:
+                job["store_errors"][doc_id] = str(e)
+        finally:
+            with self._lock:
+                if job is not None:
+                    job["batches_stored"] += 1
+
+    @staticmethod
+    def _file_failed(job: Dict, doc_id: str) -> bool:
+        """True if the job or the given file failed (caller holds the lock)."""
+        return job["stage"] == STAGE_FAILED or any(
+            file["doc_id"] == doc_id and file["status"] == FILE_FAILED for file in job["files"]
+        )
+
+    async def _dispatch(self):
+        """Pull jobs off the queue and run them one at a time."""
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                logger.error(f"Unexpected error in ingestion job {job_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job_id: str):
+        with self._lock:
+            job = self._jobs[job_id]
+            user_id = job["user_id"]
+            files = [dict(file) for file in job["files"]]
+
+        if job["kind"] == JOB_UPDATE:
+            await self._process_update(job_id, user_id, files[0], job["previous"])
+            return
+
+        # Identical files are ingested once: later copies (in this job or
+        # uploaded before) reuse the vectors of the first one
+        first, duplicates, seen_hashes = [], [], set()
+        for file in files:
+            (duplicates if file["file_hash"] in seen_hashes else first).append(file)
+            seen_hashes.add(file["file_hash"])
+
+        for round_files in (first, duplicates):
+            if not round_files:
+                continue
+            try:
+                await self._process_files(job_id, user_id, round_files)
+            except Exception as e:
+                logger.error(f"Ingestion job {job_id} failed: {str(e)}")
+                for file in round_files:
+                    if self._file_status(job_id, file["doc_id"]) == FILE_QUEUED:
+                        await self._fail_file(job_id, user_id, file, str(e))
+
+        with self._lock:
+            job_files = [dict(file) for file in job["files"]]
+        completed = [file for file in job_files if file["status"] == FILE_COMPLETED]
+        chunk_count = sum(file["chunk_count"] for file in completed)
+        if completed:
+            self._update(job_id, worker_done=True, stage=STAGE_COMPLETED, progress=1.0, chunk_count=chunk_count)
+            logger.info(
+                f"Ingestion job {job_id} completed with {chunk_count} chunks "
+                f"({len(completed)}/{len(job_files)} files)"
+            )
+        else:
+            errors = [file["error"] for file in job_files if file["error"]]
+            self._update(job_id, worker_done=True, stage=STAGE_FAILED, error=errors[0] if errors else "Ingestion failed")
+
+    async def _process_files(self, job_id: str, user_id: str, files: List[Dict]):
+        """Reuse vectors where possible, ingest the rest in a worker, record the results."""
+        pending = []
+        for file in files:
+            reused = await self._reuse_existing(job_id, user_id, file)
+            if reused is not None:
+                await self._complete_file(job_id, user_id, file, *reused)
+            else:
+                pending.append(file)
+
+        if not pending:
+            return
+
+        results = await self._ingest(job_id, user_id, pending)
+        for file, result in zip(pending, results):
+            if result["error"]:
+                await self._fail_file(job_id, user_id, file, result["error"])
+            else:
+                await self._complete_file(
+                    job_id, user_id, file, result["chunk_count"], result["pdf_metadata"], result["chunk_stats"]
+                )
+
+    async def _reuse_existing(self, job_id: str, user_id: str, file: Dict) -> Optional[Tuple[int, Dict, Optional[Dict]]]:
+        """
+        Copy chunks and embeddings from a document with the same file hash.
+
+        Returns:
+            (chunk_count, pdf_metadata, chunk_stats), or None if no reusable document exists
+        """
+        source = await get_db().documents.find_one({
+            "file_hash": file["file_hash"],
+            "chunk_count": {"$gt": 0}
+        })
+        if source is None:
+            return None
+
+        self._update(job_id, stage=STAGE_STORING)
+        chunk_count = await get_async_vector_store().run(
+            get_vector_store().copy_document,
+            source_user_id=str(source["user_id"]),
+            source_doc_id=source["doc_id"],
+            user_id=user_id,
+            doc_id=file["doc_id"],
+            metadata={"filename": file["filename"]}
+        )
+        if not chunk_count:
+            return None
+
+        logger.info(f"Reused {chunk_count} chunks from document {source['doc_id']} for job {job_id}")
+        return chunk_count, source.get("metadata", {}), source.get("chunk_stats")
+
+    async def _ingest(self, job_id: str, user_id: str, files: List[Dict]) -> List[Dict]:
+        """
+        Run the streaming pipeline in a worker process and wait for its batches to be stored.
+
+        Returns:
+            One result per file with chunk_count, pdf_metadata and error
+        """
+        documents = [
+            {
+                "pdf_path": file["file_path"],
+                "doc_id": file["doc_id"],
+                "filename": file["filename"],
+                "metadata": {"file_hash": file["file_hash"]},
+            }
+            for file in files
+        ]
+        self._update(job_id, worker_done=False)
+
+        outcome = await self._run_in_worker(_run_ingest_job, job_id, user_id, documents)
+        store_errors = await self._wait_for_batches(job_id, outcome["batches"])
+
+        if outcome["error"]:
+            raise Exception(outcome["error"])
+
+        results = outcome["results"]
+        for result in results:
+            if not result["error"] and result["doc_id"] in store_errors:
+                result["error"] = store_errors[result["doc_id"]]
+        return results
+
+    async def _wait_for_batches(self, job_id: str, batches: int) -> Dict[str, str]:
+        """
+        Wait until every batch sent by a finished worker has been stored.
+
+        Returns:
+            Store errors by doc_id
+        """
+        self._update(job_id, worker_done=True, stage=STAGE_STORING)
+
+        # Batches travel on the event queue and may still be in flight
+        while True:
+            with self._lock:
+                job = self._jobs[job_id]
+                stored = job["batches_stored"]
+                store_errors = dict(job["store_errors"])
+            if stored >= batches:
+                break
+            await asyncio.sleep(0.05)
+        self._update(job_id, batches_stored=0)
+        return store_errors
+
+    async def _process_update(self, job_id: str, user_id: str, file: Dict, previous: Dict):
+        """
+        Re-ingest a new version of a document, embedding only changed chunks.
+
+        New chunks are added under a new revision while the previous version
+        stays searchable. The document record is switched to the new revision
+        next; until then the previous version's chunks are untouched, so a
+        failed update only rolls back the chunks added under its revision.
+        Only then are kept chunks relabelled and removed chunks deleted; if
+        that fails the update stands and the cleanup is logged.
+        """
+        doc_id = file["doc_id"]
+        revision = previous.get("revision", 0) + 1
+        vector_store = get_vector_store()
+        async_store = get_async_vector_store()
+
+        try:
+            stored_chunks = await async_store.run(vector_store.get_document_chunks, user_id, doc_id)
+            existing_hashes = {chunk_id: chunk_hash(text) for chunk_id, text in stored_chunks.items()}
+            del stored_chunks
+
+            document = {
+                "pdf_path": file["file_path"],
+                "doc_id": doc_id,
+                "filename": file["filename"],
+                "metadata": {"file_hash": file["file_hash"]},
+            }
+            self._update(job_id, worker_done=False)
+            outcome = await self._run_in_worker(
+                _run_update_job, job_id, user_id, document, existing_hashes, revision
+            )
+            store_errors = await self._wait_for_batches(job_id, outcome["batches"])
+            if outcome["error"]:
+                raise Exception(outcome["error"])
+            if doc_id in store_errors:
+                raise Exception(store_errors[doc_id])
+
+            result = outcome["result"]
+            await get_db().documents.update_one(
+                {"doc_id": doc_id, "user_id": ObjectId(user_id)},
+                {"$set": {
+                    "filename": file["filename"],
+                    "file_path": file["file_path"],
+                    "file_size": file["file_size"],
+                    "file_hash": file["file_hash"],
+                    "chunk_count": result["chunk_count"],
+                    "chunk_stats": result["chunk_stats"],
+                    "revision": revision,
+                    "updated_at": datetime.now(timezone.utc),
+                    "metadata": result["pdf_metadata"],
+                }}
+            )
+
+        except Exception as e:
+            logger.error(f"Update of document {doc_id} in job {job_id} failed: {str(e)}")
+            self._update_file(job_id, doc_id, status=FILE_FAILED, error=str(e))
+            self._update(job_id, worker_done=True, stage=STAGE_FAILED, error=str(e))
+            try:
+                await async_store.adelete_document(user_id, doc_id, revision)
+            except Exception as cleanup_error:
+                logger.warning(f"Failed to roll back revision {revision} of {doc_id}: {str(cleanup_error)}")
+            await self.release_upload(file["file_path"], file["file_hash"])
+            return
+
+        # The document now records the new revision, so these steps are not rolled back
+        kept_ids = [chunk_id for chunk_id, _ in result["kept"]]
+        kept_metadatas = [chunk_metadata for _, chunk_metadata in result["kept"]]
+        try:
+            await async_store.run(vector_store.update_chunk_metadatas, user_id, kept_ids, kept_metadatas)
+            await async_store.run(vector_store.delete_chunks, user_id, result["removed"])
+        except Exception as e:
+            logger.warning(f"Failed to relabel kept or delete removed chunks of {doc_id} (revision {revision}): {str(e)}")
+
+        # The previous version's upload is no longer referenced by this document
+        if previous.get("file_hash") != file["file_hash"]:
+            await self.release_upload(previous.get("file_path"), previous.get("file_hash"))
+
+        diff = {"kept": len(kept_ids), "added": result["added"], "removed": len(result["removed"])}
+        self._update_file(
+            job_id,
+            doc_id,
+            status=FILE_COMPLETED,
+            chunk_count=result["chunk_count"],
+            truncated_chunks=result["chunk_stats"]["truncated_chunks"]
+        )
+        self._update(
+            job_id, stage=STAGE_COMPLETED, progress=1.0, chunk_count=result["chunk_count"], diff=diff
+        )
+        logger.info(f"Update job {job_id} completed for document {doc_id}: {diff}")
+
+    async def _complete_file(
+        self,
+        job_id: str,
+        user_id: str,
+        file: Dict,
+        chunk_count: int,
+        pdf_metadata: Dict,
+        chunk_stats: Optional[Dict] = None
+    ):
+        """Write the document record for a successfully ingested file."""
+        await get_db().documents.insert_one({
+            "doc_id": file["doc_id"],
+            "filename": file["filename"],
+            "file_path": file["file_path"],
+            "file_size": file["file_size"],
+            "file_hash": file["file_hash"],
+            "chunk_count": chunk_count,
+            "chunk_stats": chunk_stats,
+            "user_id": ObjectId(user_id),
+            "uploaded_at": datetime.now(timezone.utc),
+            "metadata": pdf_metadata
+        })
+        self._update_file(
+            job_id,
+            file["doc_id"],
+            status=FILE_COMPLETED,
+            chunk_count=chunk_count,
+            truncated_chunks=(chunk_stats or {}).get("truncated_chunks", 0)
+        )
+
+    async def _fail_file(self, job_id: str, user_id: str, file: Dict, error: str):
+        """Mark a file as failed and roll back its vectors and upload."""
+        logger.error(f"Ingestion of {file['filename']} in job {job_id} failed: {error}")
+        self._update_file(job_id, file["doc_id"], status=FILE_FAILED, error=error)
+
+        try:
+            await get_async_vector_store().adelete_document(user_id, file["doc_id"])
+        except Exception as cleanup_error:
+            logger.warning(f"Failed to roll back vectors of {file['doc_id']}: {str(cleanup_error)}")
+        await self.release_upload(file["file_path"], file["file_hash"])
+
+    async def release_upload(self, file_path: Optional[str], file_hash: Optional[str] = None, staged: bool = False):
+        """
+        Delete a stored upload unless another document or pending file still uses it.
+
+        Uploads are content-addressed, so one file on disk can back several
+        documents (across users) that share the same hash. Uploads held by
+        stage_upload or by a queued file count as in use; the in-use check is
+        repeated under the lock right before deleting, so an upload staged
+        meanwhile is kept.
+
+        Args:
+            file_path: Path of the stored upload
+            file_hash: Hex SHA-256 digest of the upload
+            staged: The caller's stage_upload hold on the upload is given up first
+        """
+        if file_hash:
+            with self._lock:
+                if staged:
+                    self._unstage([file_hash])
+                if self._is_upload_held(file_hash):
+                    return
+            if await get_db().documents.count_documents({"file_hash": file_hash}, limit=1):
+                return
+
+        with self._lock:
+            if file_hash and self._is_upload_held(file_hash):
+                return
+            if file_path and os.path.exists(file_path):
+                os.remove(file_path)
+
+    def _is_upload_held(self, file_hash: str) -> bool:
+        """True if an upload is staged or a queued file uses it (caller holds the lock)."""
+        return file_hash in self._staged_hashes or any(
+            file["file_hash"] == file_hash and file["status"] == FILE_QUEUED
+            for job in self._jobs.values()
+            for file in job["files"]
+        )
+
+
+# Global ingestion queue instance
+_ingestion_queue = None
+
+
+def get_ingestion_queue() -> IngestionJobQueue:
+    """Get or create the global ingestion queue."""
+    global _ingestion_queue
+    if _ingestion_queue is None:
+        _ingestion_queue = IngestionJobQueue()
+    return _ingestion_queue
@@ -0,0 +1,253 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Keyword (BM25) index used by lexical and hybrid retrieval
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() == "true"
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./data/lexical_index.sqlite3")
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+# Cached token document counts per user before the cache is reset
+_TERM_STATS_MAX_TOKENS = 10000
+
+# Token characters as FTS5's unicode61 tokenizer sees them (letters and digits; "_" separates)
+_TOKEN = re.compile(r"[^\W_]+")
+
+# (chunk ID, doc ID, text)
+ChunkRow = Tuple[str, str, str]
+
+
+def query_terms(query: str) -> List[Tuple[str, ...]]:
+    """
+    Split free text into search terms, each a tuple of index tokens.
+
+    Words joined by punctuation (QX-4411, v2.3.1, foo_bar) become one
+    multi-token term, matched as a phrase, so identifiers match as a unit
+    rather than as unrelated fragments. Tokens are case- and accent-folded
+    like the index's tokenizer.
+    """
+    terms = []
+    for word in query.split():
+        folded = unicodedata.normalize("NFKD", word.lower())
+        tokens = tuple(_TOKEN.findall("".join(c for c in folded if not unicodedata.combining(c))))
+        if tokens:
+            terms.append(tokens)
+    return list(dict.fromkeys(terms))
+
+
+def build_match_query(terms: Sequence[Tuple[str, ...]]) -> str:
+    """Build an FTS5 query matching chunks that contain any of the terms (BM25 ranks chunks with more, rarer terms first)."""
+    return " OR ".join('"' + " ".join(tokens) + '"' for tokens in terms)
+
+
+class LexicalIndex:
+    """
+    Per-user inverted index over chunk text with BM25 ranking (SQLite FTS5).
+
+    Each user gets an FTS5 table, so term statistics (IDF, average chunk
+    length) are per tenant; a side table maps chunk IDs to FTS rows for
+    deletes and doc_id filters. The owning vector store updates it as chunks
+    are added and deleted. Users whose chunks predate the index are indexed
+    from load_chunks (pages of chunk rows) on first use.
+
+    Query terms found in more than half of a user's chunks are dropped before
+    matching (all but the rarest, if no term is more selective): their BM25
+    IDF is zero, so they barely move the ranking but make nearly every chunk
+    a candidate to score.
+    """
+
+    def __init__(
+        self,
+        path: str = LEXICAL_INDEX_PATH,
+        load_chunks: Optional[Callable[[str], Iterable[List[ChunkRow]]]] = None
+    ):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.load_chunks = load_chunks
+        self._indexed: Set[str] = set()
+        # Per user: chunk count and document counts of queried tokens (dropped on writes)
+        self._term_stats: Dict[str, Tuple[int, Dict[str, int]]] = {}
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS lexical_users (user_id TEXT PRIMARY KEY)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lexical_chunks ("
+            "user_id TEXT NOT NULL, chunk_id TEXT NOT NULL, doc_id TEXT NOT NULL, row INTEGER NOT NULL, "
+            "PRIMARY KEY (user_id, chunk_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS lexical_chunks_doc ON lexical_chunks(user_id, doc_id)")
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS lexical_chunks_row ON lexical_chunks(user_id, row)")
+        self._conn.commit()
+
+    @staticmethod
+    def _table(user_id: str, suffix: str = "") -> str:
+        return '"lex_' + user_id.replace('"', '""') + suffix + '"'
+
+    def _ensure_user(self, user_id: str):
+        """Create the user's table, indexing their existing chunks the first time."""
+        if user_id in self._indexed:
+            return
+        self._conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self._table(user_id)} "
+            "USING fts5(content, tokenize='unicode61 remove_diacritics 2')"
+        )
+        # Per-term document counts
+        self._conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self._table(user_id, '_vocab')} "
+            f"USING fts5vocab({self._table(user_id)}, 'row')"
+        )
+        if self._conn.execute("SELECT 1 FROM lexical_users WHERE user_id = ?", (user_id,)).fetchone() is None:
+            indexed = 0
+            if self.load_chunks is not None:
+                for page in self.load_chunks(user_id):
+                    self._add(user_id, page)
+                    indexed += len(page)
+            self._conn.execute("INSERT INTO lexical_users VALUES (?)", (user_id,))
+            self._conn.commit()
+            if indexed:
+                logger.info(f"Indexed {indexed} existing chunks of user {user_id} for keyword search")
+        self._indexed.add(user_id)
+
+    def _rows(self, user_id: str, condition: str, params: Sequence) -> List[int]:
+        return [
+            row for row, in self._conn.execute(
+                f"SELECT row FROM lexical_chunks WHERE user_id = ? AND ({condition})", [user_id, *params]
+            )
+        ]
+
+    def _delete_rows(self, user_id: str, rows: List[int]):
+        self._term_stats.pop(user_id, None)
+        table = self._table(user_id)
+        for start in range(0, len(rows), _SQL_BATCH):
+            batch = rows[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM {table} WHERE rowid IN ({placeholders})", batch)
+            self._conn.execute(
+                f"DELETE FROM lexical_chunks WHERE user_id = ? AND row IN ({placeholders})", [user_id, *batch]
+            )
+
+    def _add(self, user_id: str, chunks: List[ChunkRow]):
+        """Index chunks (replacing any with the same IDs) without committing."""
+        self._delete_ids(user_id, [chunk_id for chunk_id, _, _ in chunks])
+        self._term_stats.pop(user_id, None)
+        first = self._conn.execute(
+            "SELECT COALESCE(MAX(row), 0) + 1 FROM lexical_chunks WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+        rows = range(first, first + len(chunks))
+        self._conn.executemany(
+            f"INSERT INTO {self._table(user_id)}(rowid, content) VALUES (?, ?)",
+            [(row, text) for row, (_, _, text) in zip(rows, chunks)]
+        )
+        self._conn.executemany(
+            "INSERT INTO lexical_chunks VALUES (?, ?, ?, ?)",
+            [(user_id, chunk_id, doc_id, row) for row, (chunk_id, doc_id, _) in zip(rows, chunks)]
+        )
+
+    def _delete_ids(self, user_id: str, ids: Sequence[str]):
+        rows = []
+        for start in range(0, len(ids), _SQL_BATCH):
+            batch = list(ids[start:start + _SQL_BATCH])
+            rows.extend(self._rows(user_id, f"chunk_id IN ({','.join('?' * len(batch))})", batch))
+        self._delete_rows(user_id, rows)
+
+    def add(self, user_id: str, ids: Sequence[str], doc_ids: Sequence[str], texts: Sequence[str]):
+        """Index chunk texts (re-indexing chunks whose IDs already exist)."""
+        with self._lock:
+            self._ensure_user(user_id)
+            self._add(user_id, list(zip(ids, doc_ids, texts)))
+            self._conn.commit()
+
+    def delete(self, user_id: str, ids: Sequence[str]):
+        """Remove chunks by ID."""
+        with self._lock:
+            self._ensure_user(user_id)
+            self._delete_ids(user_id, ids)
+            self._conn.commit()
+
+    def delete_document(self, user_id: str, doc_id: str):
+        """Remove every chunk of a document."""
+        with self._lock:
+            self._ensure_user(user_id)
+            self._delete_rows(user_id, self._rows(user_id, "doc_id = ?", [doc_id]))
+            self._conn.commit()
+
+    def _selective_terms(self, user_id: str, terms: List[Tuple[str, ...]]) -> List[Tuple[str, ...]]:
+        """Drop terms found in more than half of the user's chunks (keeping the rarest if all are)."""
+        if len(terms) < 2:
+            return terms
+        stats = self._term_stats.get(user_id)
+        if stats is None or len(stats[1]) > _TERM_STATS_MAX_TOKENS:
+            total = self._conn.execute(
+                "SELECT COUNT(*) FROM lexical_chunks WHERE user_id = ?", (user_id,)
+            ).fetchone()[0]
+            stats = self._term_stats[user_id] = (total, {})
+        total, token_counts = stats
+
+        vocab = self._table(user_id, "_vocab")
+        for token in {token for term in terms for token in term} - token_counts.keys():
+            row = self._conn.execute(f"SELECT doc FROM {vocab} WHERE term = ?", (token,)).fetchone()
+            token_counts[token] = row[0] if row else 0
+
+        # A phrase occurs in at most as many chunks as its rarest token
+        frequencies = {term: min(token_counts[token] for token in term) for term in terms}
+        selective = [term for term in terms if frequencies[term] * 2 <= total]
+        return selective or [min(terms, key=frequencies.get)]
+
+    def search(
+        self,
+        user_id: str,
+        query: str,
+        n_results: int,
+        doc_ids: Optional[List[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        Rank a user's chunks against a query with BM25.
+
+        Args:
+            user_id: User ID (namespace)
+            query: Query text
+            n_results: Number of results
+            doc_ids: Optional document IDs to restrict the search to
+
+        Returns:
+            (chunk ID, BM25 score) pairs, best first (higher is better)
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            self._ensure_user(user_id)
+
+            table = self._table(user_id)
+            sql = f"SELECT rowid, -bm25({table}) FROM {table} WHERE {table} MATCH ?"
+            params = [build_match_query(self._selective_terms(user_id, terms))]
+            if doc_ids:
+                sql += (
+                    " AND rowid IN (SELECT row FROM lexical_chunks WHERE user_id = ? "
+                    f"AND doc_id IN ({','.join('?' * len(doc_ids))}))"
+                )
+                params.extend([user_id, *doc_ids])
+            sql += f" ORDER BY bm25({table}) LIMIT ?"
+            params.append(n_results)
+            hits = self._conn.execute(sql, params).fetchall()
+
+            # Chunk IDs are looked up for the top rows only
+            chunk_ids = dict(self._conn.execute(
+                f"SELECT row, chunk_id FROM lexical_chunks WHERE user_id = ? AND row IN ({','.join('?' * len(hits))})",
+                [user_id, *(row for row, _ in hits)]
+            ).fetchall()) if hits else {}
+        return [(chunk_ids[row], score) for row, score in hits if row in chunk_ids]
@@ -0,0 +1,109 @@
+import base64
+import zlib
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+# MinHash signatures of chunk word sets, stored in chunk metadata at ingest so
+# search can estimate the word-overlap (Jaccard) similarity of two results
+# without re-splitting their texts
+MINHASH_PERMUTATIONS = 64
+MINHASH_METADATA_KEY = "minhash"
+
+# Version prefix of stored signatures; signatures with another prefix are ignored and recomputed
+_SIGNATURE_PREFIX = "m1:"
+
+# Fixed seeds, so signatures stored by different processes are comparable
+_rng = np.random.default_rng(0x6D696E68)
+_MULTIPLIERS = _rng.integers(1, 2**63, size=MINHASH_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_OFFSETS = _rng.integers(0, 2**63, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+
+
+def word_set(text: str) -> Set[str]:
+    """Lowercased, whitespace-split words of a text (the sets search deduplication compares)."""
+    return set(text.lower().split())
+
+
+def minhash(words: Set[str]) -> Optional[np.ndarray]:
+    """
+    Compute the MinHash signature of a word set.
+
+    Each word is hashed with crc32 and permuted with MINHASH_PERMUTATIONS
+    multiply-shift hashes; the signature is the minimum of each. The fraction
+    of positions where two signatures agree estimates the Jaccard similarity
+    of their sets (standard error at most 0.5 / sqrt(MINHASH_PERMUTATIONS)).
+
+    Args:
+        words: Word set (see word_set)
+
+    Returns:
+        uint32 array of MINHASH_PERMUTATIONS values, or None for an empty set
+    """
+    if not words:
+        return None
+    hashes = np.fromiter((zlib.crc32(word.encode("utf-8")) for word in words), dtype=np.uint64, count=len(words))
+    # uint64 arithmetic wraps around; the high 32 bits are the permuted hash
+    permuted = (hashes[:, None] * _MULTIPLIERS + _OFFSETS) >> _SHIFT
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def encode_signature(signature: Optional[np.ndarray]) -> str:
+    """Encode a signature for chunk metadata (base64 of little-endian uint32; empty for an empty text)."""
+    if signature is None:
+        return _SIGNATURE_PREFIX
+    return _SIGNATURE_PREFIX + base64.b64encode(signature.astype("<u4").tobytes()).decode("ascii")
+
+
+def content_signature(text: str) -> str:
+    """Encoded MinHash signature of a chunk text, as stored under MINHASH_METADATA_KEY."""
+    return encode_signature(minhash(word_set(text)))
+
+
+def decode_signature(value) -> Optional[np.ndarray]:
+    """
+    Decode a stored signature.
+
+    Returns:
+        The signature; an empty array for an empty text; None if the value
+        is missing or not a signature of the current format
+    """
+    if not isinstance(value, str) or not value.startswith(_SIGNATURE_PREFIX):
+        return None
+    data = base64.b64decode(value[len(_SIGNATURE_PREFIX):])
+    if len(data) not in (0, 4 * MINHASH_PERMUTATIONS):
+        return None
+    return np.frombuffer(data, dtype="<u4").astype(np.uint32)
+
+
+def public_metadata(metadata: Dict) -> Dict:
+    """Chunk metadata without the stored signature, for API responses and prompts."""
+    if MINHASH_METADATA_KEY not in metadata:
+        return metadata
+    return {key: value for key, value in metadata.items() if key != MINHASH_METADATA_KEY}
+
+
+def signature_matrix(texts: List[str], stored: List) -> np.ndarray:
+    """
+    Stack the signatures of search results into one (len(texts), MINHASH_PERMUTATIONS) matrix.
+
+    Stored signatures are used where present and valid, others are computed
+    from the texts. Row i of an empty text is filled with -(i + 1), which
+    matches no permuted hash and no other row, so it estimates a similarity
+    of 0 with every other result (as the exact comparison gives).
+
+    Args:
+        texts: Result texts
+        stored: Encoded signatures (or None) from the results' metadata
+
+    Returns:
+        int64 matrix of signatures
+    """
+    signatures = -np.arange(1, len(texts) + 1, dtype=np.int64)[:, None].repeat(MINHASH_PERMUTATIONS, axis=1)
+    for row, (text, value) in enumerate(zip(texts, stored)):
+        signature = decode_signature(value)
+        if signature is None:
+            signature = minhash(word_set(text))
+        if signature is not None and len(signature):
+            signatures[row] = signature
+    return signatures
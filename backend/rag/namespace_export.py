@@ -0,0 +1,214 @@
+import gzip
+import json
+import logging
+import os
+import struct
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+from rag.vectorstore import COPY_PAGE_SIZE, EMBEDDING_MODEL_ID, get_vector_store
+
+logger = logging.getLogger(__name__)
+
+# Server-side directory the admin export/import endpoints read and write
+NAMESPACE_EXPORT_DIR = os.getenv("NAMESPACE_EXPORT_DIR", "./data/exports")
+
+EXPORT_FORMAT = "documind-namespace"
+EXPORT_VERSION = 1
+
+# Files of an export directory; the manifest is written last, so an export without one is incomplete
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl.gz"
+MANIFEST_FILE = "manifest.json"
+
+# Space reserved for the .npy header, which is written once the row count is known
+_NPY_HEADER_BYTES = 128
+
+
+def _npy_header(rows: int, dim: int) -> bytes:
+    """Return a version 1.0 .npy header for a little-endian float32 (rows, dim) matrix, padded to _NPY_HEADER_BYTES."""
+    header = "{'descr': '<f4', 'fortran_order': False, 'shape': (%d, %d), }" % (rows, dim)
+    header = header.ljust(_NPY_HEADER_BYTES - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def export_namespace(user_id: str, directory: str, store=None) -> Dict:
+    """
+    Export a user's chunks and vectors to a directory.
+
+    Writes the vectors as a float32 .npy matrix (memory-mappable with
+    np.load(mmap_mode="r")) and the chunk IDs, texts and metadata as
+    gzipped JSON lines in the same row order, then a manifest. Pages are
+    streamed from the store, so memory use does not grow with the namespace.
+
+    Args:
+        user_id: User whose namespace is exported
+        directory: New or empty directory to write to
+        store: Vector store (default: get_vector_store())
+
+    Returns:
+        The manifest (chunk count, vector dimension, embedding model, ...)
+    """
+    store = store or get_vector_store()
+    os.makedirs(directory, exist_ok=True)
+    if os.listdir(directory):
+        raise FileExistsError(f"Export directory {directory} is not empty")
+
+    rows, dim = 0, 0
+    with open(os.path.join(directory, EMBEDDINGS_FILE), "wb") as embeddings_file, \
+            gzip.open(os.path.join(directory, CHUNKS_FILE), "wt", encoding="utf-8") as chunks_file:
+        embeddings_file.write(_npy_header(0, 0))
+        for ids, texts, metadatas, embeddings in store.iter_vectors(user_id):
+            if dim and embeddings.shape[1] != dim:
+                raise ValueError(f"Vectors of user {user_id} have mixed dimensions ({dim} and {embeddings.shape[1]})")
+            dim = embeddings.shape[1]
+            embeddings_file.write(np.ascontiguousarray(embeddings, dtype="<f4").tobytes())
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                chunks_file.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata}) + "\n")
+            rows += len(ids)
+
+        embeddings_file.seek(0)
+        embeddings_file.write(_npy_header(rows, dim))
+
+    manifest = {
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "user_id": user_id,
+        "chunks": rows,
+        "dimension": dim,
+        "embedding_model": EMBEDDING_MODEL_ID,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    logger.info(f"Exported {rows} chunks of user {user_id} to {directory}")
+    return manifest
+
+
+def read_manifest(directory: str) -> Dict:
+    """Read and validate the manifest of an export directory (ValueError if it is not a complete export)."""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"{directory} is not a complete namespace export (no {MANIFEST_FILE})")
+
+    if manifest.get("format") != EXPORT_FORMAT or manifest.get("version") != EXPORT_VERSION:
+        raise ValueError(f"Unsupported export format: {manifest.get('format')} version {manifest.get('version')}")
+    return manifest
+
+
+def import_namespace(user_id: str, directory: str, store=None) -> Dict:
+    """
+    Import an export into a user's namespace without re-embedding.
+
+    The vectors are memory-mapped and added page by page with their chunks
+    (which also updates the keyword and doc_id indexes). The target user
+    must have no chunks yet, and the export must come from the same
+    embedding model. If the import fails partway, the chunks already added
+    are deleted again, so the namespace is left empty and can be retried.
+    Document records in MongoDB are not part of an export.
+
+    Args:
+        user_id: User to import into (may differ from the exported user)
+        directory: Export directory
+        store: Vector store (default: get_vector_store())
+
+    Returns:
+        The export's manifest
+    """
+    store = store or get_vector_store()
+    manifest = read_manifest(directory)
+    if manifest["embedding_model"] != EMBEDDING_MODEL_ID:
+        raise ValueError(
+            f"Export was made with embedding model {manifest['embedding_model']}, "
+            f"this server uses {EMBEDDING_MODEL_ID}"
+        )
+    if next(iter(store.iter_chunks(user_id)), None):
+        raise ValueError(f"User {user_id} already has chunks; delete them before importing")
+
+    embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+    if embeddings.shape[0] != manifest["chunks"]:
+        raise ValueError(f"{EMBEDDINGS_FILE} has {embeddings.shape[0]} rows, the manifest lists {manifest['chunks']} chunks")
+
+    imported = 0
+    page: List[Dict] = []
+    # IDs of every chunk handed to the store, deleted again if the import fails
+    added_ids: List[str] = []
+    try:
+        with gzip.open(os.path.join(directory, CHUNKS_FILE), "rt", encoding="utf-8") as chunks_file:
+            for line in chunks_file:
+                page.append(json.loads(line))
+                if len(page) == COPY_PAGE_SIZE:
+                    added_ids.extend(chunk["id"] for chunk in page)
+                    _import_page(store, user_id, page, embeddings[imported:imported + len(page)])
+                    imported += len(page)
+                    page = []
+            if page:
+                added_ids.extend(chunk["id"] for chunk in page)
+                _import_page(store, user_id, page, embeddings[imported:imported + len(page)])
+                imported += len(page)
+
+        if imported != manifest["chunks"]:
+            raise ValueError(f"{CHUNKS_FILE} has {imported} chunks, the manifest lists {manifest['chunks']}")
+    except BaseException:
+        _roll_back_import(store, user_id, added_ids)
+        raise
+
+    logger.info(f"Imported {imported} chunks from {directory} into user {user_id}")
+    return manifest
+
+
+def _roll_back_import(store, user_id: str, ids: List[str]):
+    """Delete the chunks a failed import added."""
+    if not ids:
+        return
+    try:
+        store.delete_chunks(user_id, ids)
+        logger.warning(f"Rolled back {len(ids)} chunks of a failed import into user {user_id}")
+    except Exception as e:
+        logger.error(f"Failed to roll back a failed import into user {user_id}: {str(e)}")
+
+
+def _import_page(store, user_id: str, chunks: List[Dict], embeddings: np.ndarray):
+    if len(embeddings) != len(chunks):
+        raise ValueError(f"{EMBEDDINGS_FILE} has fewer rows than {CHUNKS_FILE} has chunks")
+
+    metadatas = []
+    for chunk in chunks:
+        metadata = dict(chunk["metadata"])
+        if "user_id" in metadata:
+            metadata["user_id"] = user_id
+        metadatas.append(metadata)
+    add_chunks(
+        store,
+        user_id,
+        [chunk["id"] for chunk in chunks],
+        [chunk["text"] for chunk in chunks],
+        metadatas,
+        np.asarray(embeddings, dtype=np.float32)
+    )
+
+
+def add_chunks(store, user_id: str, ids: List[str], texts: List[str], metadatas: List[Dict], embeddings: np.ndarray):
+    """Add a page of chunks with their vectors, one add_documents call per run of chunks from the same document."""
+    start = 0
+    while start < len(ids):
+        doc_id = metadatas[start]["doc_id"]
+        end = start + 1
+        while end < len(ids) and metadatas[end]["doc_id"] == doc_id:
+            end += 1
+        store.add_documents(
+            user_id=user_id,
+            doc_id=doc_id,
+            texts=texts[start:end],
+            metadatas=metadatas[start:end],
+            ids=ids[start:end],
+            embeddings=embeddings[start:end]
+        )
+        start = end
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import shutil
+import warnings
+from typing import List, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ONNX Runtime embedding backend configuration (EMBEDDING_BACKEND=onnx)
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./data/onnx")
+EMBEDDING_ONNX_QUANTIZE = os.getenv("EMBEDDING_ONNX_QUANTIZE", "true").lower() == "true"
+EMBEDDING_ONNX_OPTIMIZE = os.getenv("EMBEDDING_ONNX_OPTIMIZE", "true").lower() == "true"
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))  # 0 = ONNX Runtime default
+
+ONNX_OPSET = 14
+MODEL_FILE = "model.onnx"
+CONFIG_FILE = "encoder_config.json"
+
+
+def onnx_model_id(model_name: str, quantize: bool = EMBEDDING_ONNX_QUANTIZE) -> str:
+    """Identifier of an exported model variant (also its directory name under EMBEDDING_ONNX_DIR)."""
+    return model_name.replace("/", "__") + ("-onnx-qint8" if quantize else "-onnx")
+
+
+def _fuse_transformer_ops(model_path: str, output_path: str, config) -> bool:
+    """
+    Fuse attention, GELU and layer-norm subgraphs with ONNX Runtime's transformer optimizer.
+
+    Returns:
+        False (leaving nothing at output_path) if the architecture is not supported
+    """
+    from onnxruntime.transformers.optimizer import MODEL_TYPES, optimize_model
+
+    if config.model_type not in MODEL_TYPES:
+        logger.info(f"No ONNX Runtime fusions for model type {config.model_type}, skipping")
+        return False
+
+    optimized = optimize_model(
+        model_path,
+        model_type=config.model_type,
+        num_heads=config.num_attention_heads,
+        hidden_size=config.hidden_size
+    )
+    optimized.save_model_to_file(output_path)
+    return True
+
+
+def export_onnx_model(
+    model_name: str,
+    output_dir: str,
+    quantize: bool = EMBEDDING_ONNX_QUANTIZE,
+    optimize: bool = EMBEDDING_ONNX_OPTIMIZE
+) -> str:
+    """
+    Export a SentenceTransformer model to ONNX, optionally int8 dynamically quantized.
+
+    The whole module pipeline (transformer, pooling, normalization) is traced
+    into one graph that maps token IDs to the final sentence embedding, so the
+    runtime only has to tokenize. The tokenizer and an encoder config are saved
+    next to the graph. The export is written to a temporary directory and moved
+    into place, so concurrent processes never load a partial export.
+
+    Args:
+        model_name: SentenceTransformer model name or path
+        output_dir: Directory to create
+        quantize: Quantize weights to int8 (onnxruntime dynamic quantization)
+        optimize: Fuse transformer subgraphs (attention, GELU, layer norm) before quantizing
+
+    Returns:
+        output_dir
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    logger.info(f"Exporting {model_name} to ONNX (quantize={quantize})...")
+    # Eager attention exports an additive mask; the SDPA path traces into
+    # masked selects over every attention score, which ONNX Runtime runs slowly
+    model = SentenceTransformer(model_name, device="cpu", model_kwargs={"attn_implementation": "eager"}).eval()
+    input_names = list(model.tokenizer.model_input_names)
+
+    class _Pipeline(torch.nn.Module):
+        def __init__(self, st_model):
+            super().__init__()
+            self.st_model = st_model
+
+        def forward(self, *inputs):
+            return self.st_model(dict(zip(input_names, inputs)))["sentence_embedding"]
+
+    tmp_dir = f"{output_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    try:
+        sample = model.tokenizer(["DocuMind export sample", "a"], padding=True, return_tensors="pt")
+        fp32_path = os.path.join(tmp_dir, "model_fp32.onnx")
+        model_path = os.path.join(tmp_dir, MODEL_FILE)
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["sentence_embedding"] = {0: "batch"}
+
+        # The tracer warns about shape-dependent Python branches and indexing
+        # patterns; the exported graph is still valid for any batch size and
+        # sequence length (checked by the backend benchmark's cosine agreement)
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            torch.onnx.export(
+                _Pipeline(model),
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["sentence_embedding"],
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET,
+                dynamo=False
+            )
+
+        if optimize:
+            fused_path = os.path.join(tmp_dir, "model_fused.onnx")
+            if _fuse_transformer_ops(fp32_path, fused_path, model[0].auto_model.config):
+                os.replace(fused_path, fp32_path)
+
+        if quantize:
+            from onnx import TensorProto
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            # Shape inference cannot type the outputs of fused (contrib) ops
+            quantize_dynamic(
+                fp32_path,
+                model_path,
+                weight_type=QuantType.QInt8,
+                extra_options={"DefaultTensorType": TensorProto.FLOAT}
+            )
+            os.remove(fp32_path)
+        else:
+            os.replace(fp32_path, model_path)
+
+        model.tokenizer.save_pretrained(tmp_dir)
+        with open(os.path.join(tmp_dir, CONFIG_FILE), "w") as f:
+            json.dump({
+                "model_name": model_name,
+                "quantized": quantize,
+                "optimized": optimize,
+                "max_seq_length": model.max_seq_length,
+                "embedding_dimension": int(model.encode(["a"], show_progress_bar=False).shape[-1]),
+                "input_names": input_names
+            }, f, indent=2)
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_dir)), exist_ok=True)
+        try:
+            os.rename(tmp_dir, output_dir)
+        except OSError:
+            # Another process finished the same export first
+            if not os.path.exists(os.path.join(output_dir, CONFIG_FILE)):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    logger.info(f"Exported {model_name} to {output_dir}")
+    return output_dir
+
+
+class OnnxEmbeddingModel:
+    """
+    ONNX Runtime encoder with the subset of the SentenceTransformer interface we use.
+
+    Exposes encode (same arguments and return shapes), tokenizer,
+    max_seq_length and get_sentence_embedding_dimension, so it can stand in
+    for the PyTorch model behind get_embedding_model.
+    """
+
+    def __init__(self, model_dir: str, threads: int = EMBEDDING_ONNX_THREADS):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("EMBEDDING_BACKEND=onnx requires the onnxruntime package") from e
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, CONFIG_FILE)) as f:
+            config = json.load(f)
+
+        self.model_dir = model_dir
+        self.max_seq_length = config["max_seq_length"]
+        self.input_names = config["input_names"]
+        self._dimension = config["embedding_dimension"]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        show_progress_bar: Optional[bool] = None,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        **kwargs
+    ) -> np.ndarray:
+        """
+        Embed sentences like SentenceTransformer.encode.
+
+        Sentences are sorted by length before batching (as SentenceTransformer
+        does) to minimize padding, and results are returned in input order.
+
+        Returns:
+            float32 array of shape (len(sentences), dim), or (dim,) for a single string
+        """
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        if not sentences:
+            return np.zeros((0, self._dimension), dtype=np.float32)
+
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        embeddings = np.empty((len(sentences), self._dimension), dtype=np.float32)
+
+        for start in range(0, len(sentences), batch_size):
+            indices = order[start:start + batch_size]
+            features = self.tokenizer(
+                [sentences[i] for i in indices],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            inputs = {name: features[name].astype(np.int64, copy=False) for name in self.input_names}
+            embeddings[indices] = self.session.run(None, inputs)[0]
+
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.maximum(norms, 1e-12)
+
+        return embeddings[0] if single else embeddings
+
+
+def load_onnx_model(
+    model_name: str,
+    quantize: bool = EMBEDDING_ONNX_QUANTIZE,
+    onnx_dir: str = EMBEDDING_ONNX_DIR
+) -> OnnxEmbeddingModel:
+    """
+    Load the ONNX export of a model, exporting it on first use.
+
+    Args:
+        model_name: SentenceTransformer model name or path
+        quantize: Use the int8 dynamically quantized variant
+        onnx_dir: Directory holding exported models
+
+    Returns:
+        OnnxEmbeddingModel
+    """
+    model_dir = os.path.join(onnx_dir, onnx_model_id(model_name, quantize))
+    if not os.path.exists(os.path.join(model_dir, CONFIG_FILE)):
+        export_onnx_model(model_name, model_dir, quantize)
+    return OnnxEmbeddingModel(model_dir)
@@ -0,0 +1,210 @@
+from collections import deque
+from concurrent.futures import Future
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Query embedding micro-batching configuration
+QUERY_BATCH_ENABLED = os.getenv("QUERY_BATCH_ENABLED", "true").lower() == "true"
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+
+# Recent queueing delays kept for percentile metrics
+_DELAY_SAMPLES = 1000
+
+# (query text, future for its vector, time it was queued)
+_Request = Tuple[str, Future, float]
+
+
+class QueryEmbeddingBatcher:
+    """
+    Coalesces query embeddings from concurrent searches into batched encode calls.
+
+    Callers submit a query and get a future for its vector. A single worker
+    thread takes the first pending request, keeps collecting requests until
+    max_batch_size is reached or max_wait_ms has passed since the first one,
+    then embeds the whole batch with one model call and resolves every future.
+    Under load this replaces many batch-size-1 forward passes with one; an
+    idle server adds at most max_wait_ms to a query. Without an explicit
+    model, the shared embedding model is used (resolved on the first batch).
+    """
+
+    def __init__(
+        self,
+        model=None,
+        max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+        max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS
+    ):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        # Metrics
+        self._batches = 0
+        self._requests = 0
+        self._errors = 0
+        self._batch_sizes: Dict[int, int] = {}
+        self._delays = deque(maxlen=_DELAY_SAMPLES)
+        self._total_delay = 0.0
+        self._encode_time = 0.0
+
+    def start(self):
+        """Start the batching thread (idempotent)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+                self._thread.start()
+                logger.info(
+                    f"Query embedding batcher started (max batch {self.max_batch_size}, "
+                    f"max wait {self.max_wait * 1000:g} ms)"
+                )
+
+    def stop(self, timeout: float = 5.0):
+        """Flush pending requests and stop the batching thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def submit(self, query: str) -> Future:
+        """
+        Queue a query for embedding.
+
+        Returns:
+            Future resolving to the query's embedding (1-D float array)
+        """
+        if self._thread is None:
+            self.start()
+        future: Future = Future()
+        self._queue.put((query, future, time.perf_counter()))
+        return future
+
+    def encode(self, query: str) -> np.ndarray:
+        """Embed a single query, batched with any concurrent ones; blocks until done."""
+        return self.submit(query).result()
+
+    def _collect(self, first: _Request) -> Tuple[List[_Request], bool]:
+        """
+        Gather requests that arrive within the wait window after the first one.
+
+        Returns:
+            Tuple of (batch, whether a stop sentinel was received)
+        """
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        """Worker loop: wait for a request, collect a batch, embed it."""
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            self._flush(batch)
+
+        # Serve anything queued behind the stop sentinel
+        pending = []
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                pending.append(request)
+        for start in range(0, len(pending), self.max_batch_size):
+            self._flush(pending[start:start + self.max_batch_size])
+
+    def _flush(self, batch: List[_Request]):
+        """Embed a batch with one model call and resolve its futures."""
+        started = time.perf_counter()
+        delays = [started - queued_at for _, _, queued_at in batch]
+
+        try:
+            if self.model is None:
+                from rag.vectorstore import get_embedding_model
+                self.model = get_embedding_model()
+            vectors = self.model.encode(
+                [query for query, _, _ in batch],
+                batch_size=len(batch),
+                show_progress_bar=False
+            )
+        except Exception as e:
+            logger.error(f"Error embedding query batch of {len(batch)}: {str(e)}")
+            with self._lock:
+                self._errors += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        encode_time = time.perf_counter() - started
+        with self._lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+            self._delays.extend(delays)
+            self._total_delay += sum(delays)
+            self._encode_time += encode_time
+
+        for (_, future, _), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def stats(self) -> Dict:
+        """Return batch-size and queueing-delay metrics."""
+        with self._lock:
+            delays = sorted(self._delays)
+            batches = self._batches
+            requests = self._requests
+            stats = {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "requests": requests,
+                "errors": self._errors,
+                "pending": self._queue.qsize(),
+                "mean_batch_size": round(requests / batches, 2) if batches else 0.0,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "mean_queue_delay_ms": round(self._total_delay / requests * 1000, 3) if requests else 0.0,
+                "mean_encode_ms": round(self._encode_time / batches * 1000, 3) if batches else 0.0,
+            }
+
+        if delays:
+            stats["p50_queue_delay_ms"] = round(delays[len(delays) // 2] * 1000, 3)
+            stats["p95_queue_delay_ms"] = round(delays[min(len(delays) - 1, int(len(delays) * 0.95))] * 1000, 3)
+            stats["max_queue_delay_ms"] = round(delays[-1] * 1000, 3)
+        return stats
+
+
+# Global batcher instance (None when micro-batching is disabled)
+_query_batcher: Optional[QueryEmbeddingBatcher] = None
+
+
+def get_query_batcher() -> Optional[QueryEmbeddingBatcher]:
+    """Get or create the global query embedding batcher (None when disabled)."""
+    global _query_batcher
+    if _query_batcher is None and QUERY_BATCH_ENABLED:
+        _query_batcher = QueryEmbeddingBatcher()
+    return _query_batcher
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Query embedding cache configuration
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "10000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+# Snapshot file loaded at startup and written at shutdown (empty disables persistence)
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "./data/query_cache.npz")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so trivially different spellings share a cache entry.
+
+    Applies Unicode NFKC, lowercases, and collapses whitespace. The default
+    model (all-MiniLM-L6-v2) is uncased, so this does not change its embedding.
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query).lower()).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU cache of query embeddings keyed by model name + normalized query.
+
+    Entries expire ttl_seconds after they were computed and the least recently
+    used entries are evicted beyond max_entries. If a path is given, the cache
+    is loaded from it on creation and written back by save(), so popular
+    queries stay warm across restarts.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = QUERY_CACHE_TTL_SECONDS,
+        path: Optional[str] = QUERY_CACHE_PATH
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.path = path or None
+
+        # key -> (vector, created_at); order is least to most recently used
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    @staticmethod
+    def make_key(model_name: str, query: str) -> str:
+        """Cache key: model name and normalized query."""
+        return f"{model_name}\0{normalize_query(query)}"
+
+    def get(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a query, or None if absent or expired."""
+        key = self.make_key(model_name, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl_seconds:
+                del self._entries[key]
+                self._expired += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, model_name: str, query: str, vector: np.ndarray):
+        """Store a query embedding, evicting least recently used entries over the bound."""
+        key = self.make_key(model_name, query)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = (vector, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def save(self):
+        """Write unexpired entries to the snapshot file (atomically)."""
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [
+                (key, vector, created_at)
+                for key, (vector, created_at) in self._entries.items()
+                if now - created_at <= self.ttl_seconds
+            ]
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # np.savez appends .npz to names without it
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            keys=np.array([key for key, _, _ in entries], dtype=str),
+            vectors=np.array([vector for _, vector, _ in entries], dtype=np.float32),
+            created_at=np.array([created_at for _, _, created_at in entries], dtype=np.float64)
+        )
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved {len(entries)} query embeddings to {self.path}")
+
+    def load(self):
+        """Load unexpired entries from the snapshot file, keeping their LRU order."""
+        try:
+            with np.load(self.path) as snapshot:
+                keys = snapshot["keys"].tolist()
+                vectors = snapshot["vectors"]
+                created = snapshot["created_at"].tolist()
+        except Exception as e:
+            logger.warning(f"Could not load query cache from {self.path}: {str(e)}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for key, vector, created_at in zip(keys, vectors, created):
+                if now - created_at <= self.ttl_seconds:
+                    self._entries[key] = (vector, created_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        logger.info(f"Loaded {len(self._entries)} query embeddings from {self.path}")
+
+    def stats(self) -> Dict:
+        """Return hit/miss/expiry/eviction counters and the current entry count."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "expired": self._expired,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+# Global query cache instance (None when disabled)
+_query_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_cache() -> Optional[QueryEmbeddingCache]:
+    """Get or create the global query embedding cache (None when disabled)."""
+    global _query_cache
+    if _query_cache is None and QUERY_CACHE_ENABLED:
+        _query_cache = QueryEmbeddingCache()
+    return _query_cache
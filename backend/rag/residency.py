@@ -0,0 +1,170 @@
+from collections import OrderedDict
+import logging
+import os
+import queue
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Memory budget for per-user vector indexes held in memory (0 = unbounded)
+INDEX_MEMORY_BUDGET_MB = float(os.getenv("INDEX_MEMORY_BUDGET_MB", "0"))
+
+# Rough per-vector cost of the Python-side ID bookkeeping (string plus dict/list entries)
+ID_OVERHEAD_BYTES = 160
+
+_Key = Tuple[str, str]  # (index kind, user ID)
+
+
+def hnsw_index_bytes(index) -> int:
+    """
+    Estimate the memory of an hnswlib index.
+
+    Every allocated slot holds the vector, its level-0 links (2*M neighbours)
+    and its label; upper layers and the label map add a little per element.
+    """
+    per_slot = index.dim * 4 + 2 * index.M * 4 + 4 + 8
+    return index.get_max_elements() * per_slot + index.element_count * (index.M * 4 + 48)
+
+
+class IndexResidency:
+    """
+    Tracks which users' vector indexes are loaded and evicts the coldest over a memory budget.
+
+    Index owners register an evict callback per index kind, report a user's
+    index when they load it (a miss) or reuse it (a hit), and report its
+    byte footprint as it grows. When the total exceeds the budget, least
+    recently used indexes are unloaded through their callbacks (never those of
+    the user being admitted, whose indexes are in use together); owners reload
+    them lazily on next access.
+
+    Callbacks run on the residency's own eviction thread, never in the thread
+    that admitted or resized an index: owners report under their own locks,
+    and a callback takes its owner's lock, so evicting inline could leave two
+    owners (e.g. two shards) each holding its lock and waiting for the other's.
+    """
+
+    def __init__(self, budget_bytes: int = int(INDEX_MEMORY_BUDGET_MB * 2**20)):
+        self.budget_bytes = max(0, budget_bytes)
+        self._entries: "OrderedDict[_Key, int]" = OrderedDict()
+        self._evictors: Dict[str, Callable[[str], None]] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._victims: "queue.Queue[Tuple[_Key, int]]" = queue.Queue()
+        self._evictor: Optional[threading.Thread] = None
+
+        # Metrics
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._evicted_bytes = 0
+
+    def register(self, kind: str, evict: Callable[[str], None]):
+        """Register the callback that unloads a user's index of this kind."""
+        self._evictors[kind] = evict
+
+    def hit(self, kind: str, user_id: str):
+        """Record an access to an index that was already loaded."""
+        with self._lock:
+            self._hits += 1
+            if (kind, user_id) in self._entries:
+                self._entries.move_to_end((kind, user_id))
+
+    def admit(self, kind: str, user_id: str, nbytes: int):
+        """Record a freshly loaded index and its footprint, evicting others if over budget."""
+        with self._lock:
+            self._misses += 1
+            victims = self._set_size((kind, user_id), nbytes)
+        self._evict(victims)
+
+    def resize(self, kind: str, user_id: str, nbytes: int):
+        """Update the footprint of a loaded index (ignored if it is no longer tracked)."""
+        with self._lock:
+            if (kind, user_id) not in self._entries:
+                return
+            victims = self._set_size((kind, user_id), nbytes)
+        self._evict(victims)
+
+    def discard(self, kind: str, user_id: str):
+        """Stop tracking an index its owner unloaded or deleted."""
+        with self._lock:
+            self._bytes -= self._entries.pop((kind, user_id), 0)
+
+    def _set_size(self, key: _Key, nbytes: int) -> List[Tuple[_Key, int]]:
+        """Set an entry's size (as most recently used) and pick LRU victims; call with the lock held."""
+        self._bytes += nbytes - self._entries.pop(key, 0)
+        self._entries[key] = nbytes
+
+        victims = []
+        if self.budget_bytes:
+            for victim in list(self._entries):
+                if self._bytes <= self.budget_bytes:
+                    break
+                if victim[1] == key[1]:
+                    continue
+                size = self._entries.pop(victim)
+                self._bytes -= size
+                victims.append((victim, size))
+        return victims
+
+    def _evict(self, victims: List[Tuple[_Key, int]]):
+        """Queue victims for the eviction thread (started on first use)."""
+        if not victims:
+            return
+        with self._lock:
+            if self._evictor is None:
+                self._evictor = threading.Thread(target=self._run_evictions, name="index-eviction", daemon=True)
+                self._evictor.start()
+        for victim in victims:
+            self._victims.put(victim)
+
+    def _run_evictions(self):
+        while True:
+            (kind, user_id), size = self._victims.get()
+            try:
+                with self._lock:
+                    # Reloaded (and admitted again) since it was picked: keep it
+                    if (kind, user_id) in self._entries:
+                        continue
+                try:
+                    self._evictors[kind](user_id)
+                except Exception as e:
+                    logger.error(f"Error evicting {kind} index of user {user_id}: {str(e)}")
+                    continue
+                with self._lock:
+                    self._evictions += 1
+                    self._evicted_bytes += size
+                logger.info(f"Evicted {kind} index of user {user_id} ({size / 2**20:.1f} MB)")
+            finally:
+                self._victims.task_done()
+
+    def wait_evictions(self):
+        """Block until every queued eviction has run (for tests and benchmarks)."""
+        self._victims.join()
+
+    def stats(self) -> Dict:
+        """Return residency, hit/miss and eviction metrics."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            resident: Dict[str, int] = {}
+            for kind, _ in self._entries:
+                resident[kind] = resident.get(kind, 0) + 1
+            return {
+                "budget_bytes": self.budget_bytes,
+                "resident_bytes": self._bytes,
+                "resident": resident,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "evicted_bytes": self._evicted_bytes,
+            }
+
+
+# Global residency manager instance
+_index_residency = IndexResidency()
+
+
+def get_index_residency() -> IndexResidency:
+    """Get the global index residency manager."""
+    return _index_residency
@@ -1,54 +1,165 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import logging
+import os
 
+import numpy as np
+
+from rag.async_vectorstore import get_async_vector_store
+from rag.minhash import MINHASH_METADATA_KEY, MINHASH_PERMUTATIONS, public_metadata, signature_matrix, word_set
 from rag.vectorstore import get_vector_store
-from utils.schemas import QueryChunk, SearchResult
+from utils.schemas import QueryChunk, SearchRequest, SearchResult
 
 logger = logging.getLogger(__name__)
 
+# Default retrieval mode: "vector" (embeddings), "lexical" (BM25 keyword index) or "hybrid" (both, fused)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+
+# Reciprocal rank fusion constant: a result at rank r contributes 1 / (RRF_K + r)
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Candidates taken from each ranking per requested hybrid result
+HYBRID_CANDIDATE_FACTOR = int(os.getenv("HYBRID_CANDIDATE_FACTOR", "4"))
+
+# Maximum number of searches in one batched search request
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "64"))
+
+# Search results from different documents are duplicates above this word-overlap similarity
+CROSS_DOC_SIMILARITY_THRESHOLD = 0.9
+
+# MinHash estimates within this distance of a dedup threshold are checked
+# against the exact word sets (over 3 standard errors at 64 permutations)
+DEDUP_EXACT_MARGIN = 0.2
+
+
+def _resolve_mode(mode: Optional[str], lexical_enabled: bool) -> str:
+    mode = (mode or RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode!r} (expected one of {', '.join(RETRIEVAL_MODES)})")
+    if not lexical_enabled and mode != "vector":
+        if mode == "lexical":
+            raise ValueError("Lexical retrieval is disabled (LEXICAL_INDEX_ENABLED=false)")
+        mode = "vector"
+    return mode
+
+
+def _rank_many(user_id: str, searches: List[Tuple[str, int, Optional[List[str]], Optional[str]]]) -> List[List[Dict]]:
+    """
+    Rank a user's chunks for several queries, each with its own retrieval mode.
+    
+    Vector scores are 1 - distance; lexical scores are BM25 relative to the
+    best match. Hybrid mode fuses both rankings with reciprocal rank fusion,
+    so exact identifiers found by keyword search surface next to semantic
+    matches; its scores are scaled so a chunk ranked first by every ranking
+    that returned results scores 1.0. All vector searches go to the vector
+    store in one call (one model call to embed the queries).
+    
+    Args:
+        user_id: User ID (for namespace)
+        searches: (query, number of results, doc_ids filter, mode) of each search
+    
+    Returns:
+        For each search, vector store results (content, metadata, id) with a
+        "score", best first
+    """
+    vector_store = get_vector_store()
+    lexical_index = vector_store.lexical_index
+    modes = [_resolve_mode(mode, lexical_index is not None) for _, _, _, mode in searches]
+    
+    # Hybrid searches take HYBRID_CANDIDATE_FACTOR x K candidates from each ranking
+    candidates = [
+        n_results * HYBRID_CANDIDATE_FACTOR if mode == "hybrid" else n_results
+        for (_, n_results, _, _), mode in zip(searches, modes)
+    ]
+    vector_indices = [i for i, mode in enumerate(modes) if mode != "lexical"]
+    vector_results: Dict[int, List[Dict]] = dict(zip(vector_indices, vector_store.search_many(
+        user_id,
+        [searches[i][0] for i in vector_indices],
+        [candidates[i] for i in vector_indices],
+        [searches[i][2] for i in vector_indices]
+    )))
+    
+    ranked_lists = []
+    for i, ((query, n_results, doc_ids, _), mode) in enumerate(zip(searches, modes)):
+        if mode == "vector":
+            results = vector_results[i]
+            for result in results:
+                # Convert distance to score (lower distance = higher score)
+                distance = result.get("distance", 1.0)
+                result["score"] = max(0.0, 1.0 - distance)
+            ranked_lists.append(results)
+            continue
+        
+        hits = lexical_index.search(user_id, query, candidates[i], doc_ids)
+        if mode == "lexical":
+            if not hits:
+                ranked_lists.append([])
+                continue
+            best = hits[0][1] or 1.0
+            scores = {chunk_id: score / best for chunk_id, score in hits}
+            results = vector_store.get_chunks(user_id, [chunk_id for chunk_id, _ in hits])
+            for result in results:
+                result["score"] = scores[result["id"]]
+            ranked_lists.append(results)
+            continue
+        
+        fused: Dict[str, float] = {}
+        vector_ids = [result["id"] for result in vector_results[i]]
+        rankings = [ranking for ranking in (vector_ids, [chunk_id for chunk_id, _ in hits]) if ranking]
+        for ranking in rankings:
+            for rank, chunk_id in enumerate(ranking, start=1):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+        top = sorted(fused, key=fused.get, reverse=True)[:n_results]
+        
+        # Keyword-only hits are fetched from the vector store
+        results = {result["id"]: result for result in vector_results[i]}
+        missing = [chunk_id for chunk_id in top if chunk_id not in results]
+        results.update((result["id"], result) for result in vector_store.get_chunks(user_id, missing))
+        
+        best = len(rankings) / (RRF_K + 1)
+        ranked = []
+        for chunk_id in top:
+            if chunk_id in results:
+                result = results[chunk_id]
+                result["score"] = fused[chunk_id] / best
+                ranked.append(result)
+        ranked_lists.append(ranked)
+    
+    return ranked_lists
+
 
 def retrieve_chunks(
     query: str,
     user_id: str,
     top_k: int = 5,
-    doc_ids: Optional[List[str]] = None
+    doc_ids: Optional[List[str]] = None,
+    mode: Optional[str] = None
 ) -> List[QueryChunk]:
     """
-    Retrieve relevant chunks from the vector store for a query.
+    Retrieve relevant chunks for a query.
     
     Args:
         query: Search query
         user_id: User ID (for namespace)
         top_k: Number of chunks to retrieve
         doc_ids: Optional list of document IDs to filter by
+        mode: "vector", "lexical" or "hybrid" (default RETRIEVAL_MODE)
         
     Returns:
         List of QueryChunk objects with content, metadata, and scores
     """
     try:
-        vector_store = get_vector_store()
-        
-        # Search vector store
-        results = vector_store.search(
-            user_id=user_id,
-            query=query,
-            n_results=top_k,
-            doc_ids=doc_ids
-        )
+        results = _rank_many(user_id, [(query, top_k, doc_ids, mode)])[0]
         
         # Convert to QueryChunk objects
         chunks = []
         for result in results:
-            # Convert distance to score (lower distance = higher score)
-            distance = result.get("distance", 1.0)
-            score = max(0.0, 1.0 - distance)  # Simple conversion
-            
             chunk = QueryChunk(
                 content=result["content"],
                 doc_id=result["metadata"].get("doc_id", ""),
                 chunk_id=result["metadata"].get("chunk_id", result["id"]),
-                score=score,
-                metadata=result["metadata"]
+                score=result["score"],
+                metadata=public_metadata(result["metadata"])
             )
             chunks.append(chunk)
         
@@ -60,27 +171,39 @@ def retrieve_chunks(
         raise
 
 
-def _calculate_content_similarity(content1: str, content2: str) -> float:
-    """Calculate simple similarity between two content strings."""
-    # Use simple word overlap ratio
-    words1 = set(content1.lower().split())
-    words2 = set(content2.lower().split())
-    
-    if not words1 or not words2:
-        return 0.0
-    
-    intersection = len(words1 & words2)
-    union = len(words1 | words2)
-    return intersection / union if union > 0 else 0.0
+async def aretrieve_chunks(
+    query: str,
+    user_id: str,
+    top_k: int = 5,
+    doc_ids: Optional[List[str]] = None,
+    mode: Optional[str] = None
+) -> List[QueryChunk]:
+    """Async retrieve_chunks, run in the vector store executor (see rag/async_vectorstore.py)."""
+    return await get_async_vector_store().run(retrieve_chunks, query, user_id, top_k, doc_ids, mode)
 
 
-def _deduplicate_search_results(search_results: List[SearchResult], similarity_threshold: float = 0.7) -> List[SearchResult]:
+def _deduplicate_search_results(
+    search_results: List[SearchResult],
+    similarity_threshold: float = 0.7,
+    signatures: Optional[List[Optional[str]]] = None
+) -> List[SearchResult]:
     """
     Remove duplicate or highly similar search results.
     
+    Results are kept in score order unless their first 100 characters repeat
+    a kept result's, or their word-overlap (Jaccard) similarity with a kept
+    result exceeds similarity_threshold (same document) or
+    CROSS_DOC_SIMILARITY_THRESHOLD (any document). Similarities are estimated
+    from MinHash signatures with one NumPy comparison per result; only
+    estimates within DEDUP_EXACT_MARGIN of a threshold are checked exactly,
+    so the outcome matches comparing every pair's word sets except with
+    negligible probability.
+    
     Args:
         search_results: List of search results to deduplicate
         similarity_threshold: Threshold for considering results as duplicates (0-1)
+        signatures: Encoded MinHash signatures of the results (from their chunk
+            metadata), in the same order; missing ones are computed from the content
         
     Returns:
         Deduplicated list of search results
@@ -89,12 +212,31 @@ def _deduplicate_search_results(search_results: List[SearchResult], similarity_t
         return search_results
     
     # Sort by score (highest first)
-    sorted_results = sorted(search_results, key=lambda x: x.score, reverse=True)
+    order = sorted(range(len(search_results)), key=lambda i: search_results[i].score, reverse=True)
+    sorted_results = [search_results[i] for i in order]
+    stored = [signatures[i] for i in order] if signatures else [None] * len(order)
+    matrix = signature_matrix([result.content for result in sorted_results], stored)
+    
+    doc_ids = {}
+    doc_codes = np.array([doc_ids.setdefault(result.doc_id, len(doc_ids)) for result in sorted_results])
+    same_doc_threshold = min(similarity_threshold, CROSS_DOC_SIMILARITY_THRESHOLD)
+    word_sets = {}
     
-    deduplicated = []
+    def exact_similarity(i: int, j: int) -> float:
+        for k in (i, j):
+            if k not in word_sets:
+                word_sets[k] = word_set(sorted_results[k].content)
+        if not word_sets[i] or not word_sets[j]:
+            return 0.0
+        return len(word_sets[i] & word_sets[j]) / len(word_sets[i] | word_sets[j])
+    
+    kept = []
+    # Signatures and document codes of the kept results, in one contiguous block
+    kept_matrix = np.empty_like(matrix)
+    kept_doc_codes = np.empty_like(doc_codes)
     seen_content_hashes = set()
     
-    for result in sorted_results:
+    for i, result in enumerate(sorted_results):
         # Create a simple hash from first 100 chars for quick duplicate detection
         content_preview = result.content[:100].strip().lower()
         content_hash = hash(content_preview)
@@ -103,77 +245,53 @@ def _deduplicate_search_results(search_results: List[SearchResult], similarity_t
         if content_hash in seen_content_hashes:
             continue
         
-        # Check similarity with already added results
+        # Check similarity with already kept results
         is_duplicate = False
-        for existing_result in deduplicated:
-            similarity = _calculate_content_similarity(result.content, existing_result.content)
-            
-            # If chunks are from same document and very similar, skip
-            if result.doc_id == existing_result.doc_id and similarity > similarity_threshold:
-                is_duplicate = True
-                break
-            
-            # If chunks are from different documents but still very similar, skip
-            if similarity > 0.9:
+        if kept:
+            count = len(kept)
+            estimates = np.count_nonzero(kept_matrix[:count] == matrix[i], axis=1) / MINHASH_PERMUTATIONS
+            thresholds = np.where(kept_doc_codes[:count] == doc_codes[i], same_doc_threshold, CROSS_DOC_SIMILARITY_THRESHOLD)
+            if np.any(estimates > thresholds + DEDUP_EXACT_MARGIN):
                 is_duplicate = True
-                break
+            else:
+                for j in np.flatnonzero(estimates >= thresholds - DEDUP_EXACT_MARGIN):
+                    if exact_similarity(i, kept[j]) > thresholds[j]:
+                        is_duplicate = True
+                        break
         
         if not is_duplicate:
-            deduplicated.append(result)
+            kept_matrix[len(kept)] = matrix[i]
+            kept_doc_codes[len(kept)] = doc_codes[i]
+            kept.append(i)
             seen_content_hashes.add(content_hash)
     
-    return deduplicated
+    return [sorted_results[i] for i in kept]
 
 
 def search_documents(
     query: str,
     user_id: str,
     top_k: int = 10,
-    doc_ids: Optional[List[str]] = None
+    doc_ids: Optional[List[str]] = None,
+    mode: Optional[str] = None
 ) -> List[SearchResult]:
     """
-    Perform semantic search and return results with deduplication.
+    Perform semantic, keyword or hybrid search and return results with deduplication.
     
     Args:
         query: Search query
         user_id: User ID (for namespace)
         top_k: Number of results to return
         doc_ids: Optional list of document IDs to filter by
+        mode: "vector", "lexical" or "hybrid" (default RETRIEVAL_MODE)
         
     Returns:
         List of SearchResult objects (deduplicated)
     """
     try:
-        vector_store = get_vector_store()
-        
-        # Search vector store (get more results to account for deduplication)
-        results = vector_store.search(
-            user_id=user_id,
-            query=query,
-            n_results=min(top_k * 2, 50),  # Get more results to filter from
-            doc_ids=doc_ids
-        )
-        
-        # Convert to SearchResult objects
-        search_results = []
-        for result in results:
-            distance = result.get("distance", 1.0)
-            score = max(0.0, 1.0 - distance)
-            
-            search_result = SearchResult(
-                content=result["content"],
-                doc_id=result["metadata"].get("doc_id", ""),
-                chunk_id=result["metadata"].get("chunk_id", result["id"]),
-                score=score,
-                metadata=result["metadata"]
-            )
-            search_results.append(search_result)
-        
-        # Deduplicate results
-        deduplicated_results = _deduplicate_search_results(search_results)
-        
-        # Limit to requested top_k
-        final_results = deduplicated_results[:top_k]
+        # Get more results to account for deduplication
+        results = _rank_many(user_id, [(query, _search_candidates(top_k), doc_ids, mode)])[0]
+        final_results = _to_search_results(results, top_k)
         
         logger.info(f"Found {len(final_results)} search results (after deduplication) for query: {query[:50]}...")
         return final_results
@@ -182,3 +300,72 @@ def search_documents(
         logger.error(f"Error searching documents: {str(e)}")
         raise
 
+
+async def asearch_documents(
+    query: str,
+    user_id: str,
+    top_k: int = 10,
+    doc_ids: Optional[List[str]] = None,
+    mode: Optional[str] = None
+) -> List[SearchResult]:
+    """Async search_documents, run in the vector store executor."""
+    return await get_async_vector_store().run(search_documents, query, user_id, top_k, doc_ids, mode)
+
+
+def search_documents_batch(requests: List[SearchRequest], user_id: str) -> List[List[SearchResult]]:
+    """
+    Run several searches at once, each with its own top_k, doc_ids and mode.
+    
+    The queries are embedded in one model call, and queries with the same
+    filter share one vector index query where the store supports it.
+    
+    Args:
+        requests: Searches to run
+        user_id: User ID (for namespace)
+        
+    Returns:
+        Deduplicated SearchResult lists, in request order
+    """
+    try:
+        ranked_lists = _rank_many(user_id, [
+            (request.query, _search_candidates(request.top_k), request.doc_ids, request.mode)
+            for request in requests
+        ])
+        final_results = [_to_search_results(results, request.top_k) for results, request in zip(ranked_lists, requests)]
+        
+        logger.info(f"Ran {len(requests)} batched searches for user {user_id}")
+        return final_results
+    
+    except Exception as e:
+        logger.error(f"Error running batched search: {str(e)}")
+        raise
+
+
+async def asearch_documents_batch(requests: List[SearchRequest], user_id: str) -> List[List[SearchResult]]:
+    """Async search_documents_batch, run in the vector store executor."""
+    return await get_async_vector_store().run(search_documents_batch, requests, user_id)
+
+
+def _search_candidates(top_k: int) -> int:
+    """Results to rank for a search, leaving room for deduplication."""
+    return min(top_k * 2, 50)
+
+
+def _to_search_results(results: List[Dict], top_k: int) -> List[SearchResult]:
+    """Convert ranked results to deduplicated SearchResult objects (at most top_k)."""
+    search_results = []
+    signatures = []
+    for result in results:
+        search_result = SearchResult(
+            content=result["content"],
+            doc_id=result["metadata"].get("doc_id", ""),
+            chunk_id=result["metadata"].get("chunk_id", result["id"]),
+            score=result["score"],
+            metadata=public_metadata(result["metadata"])
+        )
+        search_results.append(search_result)
+        signatures.append(result["metadata"].get(MINHASH_METADATA_KEY))
+    
+    # Deduplicate results, then limit to requested top_k
+    return _deduplicate_search_results(search_results, signatures=signatures)[:top_k]
+
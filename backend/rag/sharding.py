@@ -0,0 +1,315 @@
+import bisect
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from rag.compact_index import COMPACT_INDEX_PATH
+from rag.doc_index import DOC_INDEX_PATH
+from rag.lexical_index import LEXICAL_INDEX_PATH
+from rag.namespace_export import add_chunks
+from rag.vectorstore import VECTOR_STORE_BACKEND, VECTOR_STORE_SHARDS, ChunkPage, VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Directory holding shards 1..N-1 (shard 0 keeps the unsharded paths, so existing data stays in place)
+SHARD_DIR = os.getenv("SHARD_DIR", "./data/shards")
+# Persistent user -> shard assignments
+SHARD_MAP_PATH = os.getenv("SHARD_MAP_PATH", "./data/shard_map.sqlite3")
+# Points per shard on the consistent-hash ring
+SHARD_VIRTUAL_NODES = int(os.getenv("SHARD_VIRTUAL_NODES", "64"))
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring over shard numbers.
+
+    Each shard owns SHARD_VIRTUAL_NODES points on the ring, and a user
+    belongs to the shard owning the first point at or after the hash of the
+    user ID. Adding or removing a shard only reassigns the users between
+    its points and their predecessors (about 1/N of them).
+    """
+
+    def __init__(self, shards: Iterable[int], virtual_nodes: int = SHARD_VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"shard-{shard}-{node}"), shard)
+            for shard in shards
+            for node in range(max(1, virtual_nodes))
+        )
+        if not points:
+            raise ValueError("A hash ring needs at least one shard")
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, user_id: str) -> int:
+        """Return the shard a user hashes to."""
+        i = bisect.bisect_left(self._hashes, _hash(user_id))
+        return self._shards[i % len(self._shards)]
+
+
+class ShardMap:
+    """
+    Persistent user -> shard assignments (SQLite at SHARD_MAP_PATH).
+
+    A user is assigned once and stays on that shard until the rebalancing
+    tool moves them, so changing the shard count never strands data.
+    """
+
+    def __init__(self, path: str = SHARD_MAP_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS shard_map (user_id TEXT PRIMARY KEY, shard INTEGER NOT NULL)")
+        self._conn.commit()
+        self._shards: Dict[str, int] = dict(self._conn.execute("SELECT user_id, shard FROM shard_map"))
+
+    def get(self, user_id: str) -> Optional[int]:
+        """Return a user's shard (None if unassigned)."""
+        return self._shards.get(user_id)
+
+    def assign(self, user_id: str, shard: int):
+        """Assign (or move) a user to a shard."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO shard_map VALUES (?, ?)", (user_id, shard))
+            self._conn.commit()
+            self._shards[user_id] = shard
+
+    def user_ids(self) -> List[str]:
+        """Return every assigned user."""
+        return sorted(self._shards)
+
+    def stats(self) -> Dict:
+        """Return the number of users assigned to each shard."""
+        users: Dict[int, int] = {}
+        for shard in list(self._shards.values()):
+            users[shard] = users.get(shard, 0) + 1
+        return {"users": len(self._shards), "users_per_shard": dict(sorted(users.items()))}
+
+
+def open_shard(shard: int, backend: str = VECTOR_STORE_BACKEND):
+    """
+    Open the vector store of one shard.
+
+    Shard 0 uses the unsharded paths (./data/chroma_db, HNSW_INDEX_DIR,
+    LEXICAL_INDEX_PATH, ...); shard i keeps its own copies of all of them in
+    SHARD_DIR/shard_<i>.
+    """
+    if shard == 0:
+        directory = None
+    else:
+        directory = os.path.join(SHARD_DIR, f"shard_{shard}")
+        os.makedirs(directory, exist_ok=True)
+
+    def path(name: str, default: str) -> str:
+        return default if directory is None else os.path.join(directory, name)
+
+    if backend == "chroma":
+        return VectorStore(
+            persist_directory=path("chroma_db", "./data/chroma_db"),
+            lexical_index_path=path("lexical_index.sqlite3", LEXICAL_INDEX_PATH),
+            doc_index_path=path("doc_index.sqlite3", DOC_INDEX_PATH),
+            compact_index_path=path("compact_index.sqlite3", COMPACT_INDEX_PATH),
+            shard=shard
+        )
+    if backend == "hnsw":
+        from rag.hnsw_store import HNSW_INDEX_DIR, HnswVectorStore
+        return HnswVectorStore(
+            index_dir=path("hnsw", HNSW_INDEX_DIR),
+            lexical_index_path=path("lexical_index.sqlite3", LEXICAL_INDEX_PATH),
+            shard=shard
+        )
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend!r} (expected 'chroma' or 'hnsw')")
+
+
+class _ShardedLexicalIndex:
+    """Routes keyword searches to the keyword index of the user's shard."""
+
+    def __init__(self, store: "ShardedVectorStore"):
+        self._store = store
+
+    def search(self, user_id: str, query: str, n_results: int, doc_ids: Optional[List[str]] = None):
+        return self._store.store_for(user_id).lexical_index.search(user_id, query, n_results, doc_ids)
+
+
+class ShardedVectorStore:
+    """
+    Vector store split across VECTOR_STORE_SHARDS persist directories by user.
+
+    Same API as VectorStore; every call goes to the store of the user's
+    shard, so tenants on different shards share no database, index
+    directory or write path. A user's shard is looked up in the shard map;
+    users seen for the first time are assigned to the shard that already
+    holds their chunks (e.g. shard 0 for data from before sharding) or,
+    for new users, to the shard they hash to on a consistent-hash ring.
+    move_user and rebalance (see shards.py) move namespaces between shards.
+    """
+
+    def __init__(self, shards: int = VECTOR_STORE_SHARDS, map_path: str = SHARD_MAP_PATH):
+        self.shards = [open_shard(shard) for shard in range(max(1, shards))]
+        self.ring = HashRing(range(len(self.shards)))
+        self.shard_map = ShardMap(map_path)
+        self.lexical_index = _ShardedLexicalIndex(self) if self.shards[0].lexical_index is not None else None
+        self._assign_lock = threading.Lock()
+        logger.info(f"ShardedVectorStore initialized with {len(self.shards)} shards")
+
+    def shard_of(self, user_id: str) -> int:
+        """Return a user's shard, assigning one on first use."""
+        shard = self.shard_map.get(user_id)
+        if shard is None:
+            with self._assign_lock:
+                shard = self.shard_map.get(user_id)
+                if shard is None:
+                    shard = next(
+                        (i for i, store in enumerate(self.shards) if store.has_chunks(user_id)),
+                        self.ring.shard_for(user_id)
+                    )
+                    self.shard_map.assign(user_id, shard)
+        if shard >= len(self.shards):
+            raise RuntimeError(
+                f"User {user_id} is on shard {shard}, but only {len(self.shards)} shards are configured "
+                f"(rebalance before reducing VECTOR_STORE_SHARDS)"
+            )
+        return shard
+
+    def store_for(self, user_id: str):
+        """Return the store of a user's shard."""
+        return self.shards[self.shard_of(user_id)]
+
+    def add_documents(self, user_id: str, doc_id: str, texts: List[str], metadatas: List[Dict], ids: List[str], embeddings=None):
+        return self.store_for(user_id).add_documents(user_id, doc_id, texts, metadatas, ids, embeddings)
+
+    def search(self, user_id: str, query: str, n_results: int = 5, doc_ids: Optional[List[str]] = None, where: Optional[Dict] = None) -> List[Dict]:
+        return self.store_for(user_id).search(user_id, query, n_results, doc_ids, where)
+
+    def search_many(self, user_id: str, queries: List[str], n_results: List[int], doc_ids: List[Optional[List[str]]]) -> List[List[Dict]]:
+        return self.store_for(user_id).search_many(user_id, queries, n_results, doc_ids)
+
+    def get_chunks(self, user_id: str, ids: List[str]) -> List[Dict]:
+        return self.store_for(user_id).get_chunks(user_id, ids)
+
+    def iter_chunks(self, user_id: str):
+        return self.store_for(user_id).iter_chunks(user_id)
+
+    def iter_vectors(self, user_id: str) -> Iterator[ChunkPage]:
+        return self.store_for(user_id).iter_vectors(user_id)
+
+    def has_chunks(self, user_id: str) -> bool:
+        return self.store_for(user_id).has_chunks(user_id)
+
+    def copy_document(self, source_user_id: str, source_doc_id: str, user_id: str, doc_id: str, metadata: Optional[Dict] = None) -> int:
+        return self.store_for(source_user_id).copy_document(
+            source_user_id, source_doc_id, user_id, doc_id, metadata, target_store=self.store_for(user_id)
+        )
+
+    def get_document_chunks(self, user_id: str, doc_id: str) -> Dict[str, str]:
+        return self.store_for(user_id).get_document_chunks(user_id, doc_id)
+
+    def update_chunk_metadatas(self, user_id: str, ids: List[str], metadatas: List[Dict]):
+        return self.store_for(user_id).update_chunk_metadatas(user_id, ids, metadatas)
+
+    def delete_chunks(self, user_id: str, ids: List[str]):
+        return self.store_for(user_id).delete_chunks(user_id, ids)
+
+    def delete_document(self, user_id: str, doc_id: str, revision: Optional[int] = None):
+        return self.store_for(user_id).delete_document(user_id, doc_id, revision)
+
+    def user_ids(self) -> List[str]:
+        """Return every user assigned to a shard or holding a namespace in one."""
+        users = set(self.shard_map.user_ids())
+        for store in self.shards:
+            users.update(store.user_ids())
+        return sorted(users)
+
+    def move_user(self, user_id: str, shard: int) -> int:
+        """
+        Move a user's namespace to another shard.
+
+        Copies the chunks and vectors page by page (no re-embedding), then
+        reassigns the user and deletes the source copy. Chunks left on the
+        target by an interrupted move are deleted first. Writes to the user
+        must be stopped while it runs (the rebalancing tool runs with the
+        API server stopped).
+
+        Args:
+            user_id: User to move
+            shard: Target shard
+
+        Returns:
+            Number of chunks moved
+        """
+        source = self.shard_of(user_id)
+        if source == shard:
+            return 0
+        source_store, target_store = self.shards[source], self.shards[shard]
+
+        _delete_namespace(target_store, user_id)
+        moved = 0
+        for ids, texts, metadatas, embeddings in source_store.iter_vectors(user_id):
+            add_chunks(target_store, user_id, ids, texts, metadatas, embeddings)
+            moved += len(ids)
+
+        self.shard_map.assign(user_id, shard)
+        _delete_namespace(source_store, user_id)
+        logger.info(f"Moved {moved} chunks of user {user_id} from shard {source} to shard {shard}")
+        return moved
+
+    def rebalance(self, shards: Optional[int] = None, dry_run: bool = False) -> Dict:
+        """
+        Move every user to the shard they hash to for a shard count.
+
+        With consistent hashing, growing from N to N + 1 shards moves about
+        1/(N + 1) of the users. Copies left on other shards by interrupted
+        moves are deleted.
+
+        Args:
+            shards: Shard count to balance for (default: the configured count);
+                shrinking requires the removed shards to still be opened
+            dry_run: Only report the moves
+
+        Returns:
+            Users checked, moves (user, from, to) and chunks moved
+        """
+        shards = shards or len(self.shards)
+        if shards > len(self.shards):
+            raise ValueError(f"Cannot balance for {shards} shards with {len(self.shards)} opened")
+        ring = HashRing(range(shards))
+
+        users = self.user_ids()
+        moves, moved = [], 0
+        for user_id in users:
+            source, target = self.shard_of(user_id), ring.shard_for(user_id)
+            if source != target:
+                moves.append((user_id, source, target))
+                if not dry_run:
+                    moved += self.move_user(user_id, target)
+            if not dry_run:
+                for i, store in enumerate(self.shards):
+                    if i != self.shard_of(user_id) and store.has_chunks(user_id):
+                        logger.warning(f"Deleting stale copy of user {user_id} on shard {i}")
+                        _delete_namespace(store, user_id)
+
+        return {"users": len(users), "moves": moves, "chunks_moved": moved}
+
+    def stats(self) -> Dict:
+        """Return the shard count and user assignments."""
+        return {"shards": len(self.shards), **self.shard_map.stats()}
+
+
+def _delete_namespace(store, user_id: str):
+    """Delete all of a user's chunks from one store, a page at a time."""
+    while True:
+        page = next(iter(store.iter_chunks(user_id)), None)
+        if not page:
+            break
+        store.delete_chunks(user_id, [chunk_id for chunk_id, _, _ in page])
@@ -0,0 +1,250 @@
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, compress, count, islice, repeat
+from operator import add, ge, sub
+from functools import partial
+from typing import List, Optional, Sequence, Tuple
+import re
+
+# Separators tried in order, from paragraph breaks down to single characters
+DEFAULT_SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+Span = Tuple[int, int]
+
+# Leading whitespace (\s matches the same characters as str.isspace)
+_LEADING_SPACE = re.compile(r"\s*")
+
+
+def split_spans(
+    text: str,
+    chunk_size: int = 800,
+    chunk_overlap: int = 200,
+    separators: Sequence[str] = DEFAULT_SEPARATORS,
+    token_starts: Optional[Sequence[int]] = None
+) -> List[Span]:
+    """
+    Split text into overlapping chunks, returned as (start, end) character offsets.
+
+    Produces the same chunks as LangChain's RecursiveCharacterTextSplitter
+    (keep_separator=True, strip_whitespace=True, length_function=len): the text
+    is split on the first separator it contains, separators stay attached to the
+    piece that follows them, pieces are merged up to chunk_size with up to
+    chunk_overlap characters carried over, and oversized pieces are split again
+    with the remaining separators. Every chunk is the whitespace-stripped slice
+    ``text[start:end]``. Working on offsets avoids copying substrings at every
+    recursion level and merge step.
+
+    Sizes are measured in characters unless ``token_starts`` is given: the
+    sorted start offsets of the text's tokens (from a tokenizer's offset
+    mapping, so the text is tokenized once). The size of a span is then the
+    number of tokens starting inside it, found by binary search.
+
+    Args:
+        text: Text to chunk
+        chunk_size: Maximum size of each chunk (in characters, or tokens)
+        chunk_overlap: Maximum overlap between consecutive chunks (same units)
+        separators: Literal separators, tried in order
+        token_starts: Optional sorted token start offsets to size chunks in tokens
+
+    Returns:
+        List of (start, end) offsets into text, in order
+    """
+    if chunk_overlap > chunk_size:
+        raise ValueError(
+            f"Got a larger chunk overlap ({chunk_overlap}) than chunk size "
+            f"({chunk_size}), should be smaller."
+        )
+
+    spans: List[Span] = []
+    # Cumulative size at an offset: the offset itself, or the tokens before it
+    size_at = None if token_starts is None else partial(bisect_left, token_starts)
+    _split(text, 0, len(text), list(separators), chunk_size, chunk_overlap, size_at, spans)
+    return spans
+
+
+def split_prefix_spans(
+    text: str,
+    chunk_size: int = 800,
+    chunk_overlap: int = 200,
+    separators: Sequence[str] = DEFAULT_SEPARATORS,
+    token_starts: Optional[Sequence[int]] = None
+) -> Tuple[List[Span], int]:
+    """
+    Split the final chunks off the start of a text that is still growing.
+
+    For streaming: ``text`` will be continued by appending separators[0] and
+    more text (as pages are joined). Returns the leading chunks that
+    split_spans produces for every such continuation, and a resume offset:
+    the remaining chunks are those of split_spans(text[resume:] + continuation),
+    shifted by resume. Chunking text page by page this way gives exactly the
+    chunks of the joined text.
+
+    A chunk is final once it ends before the last piece of the text (which
+    the continuation may still change) and the piece after it is known not
+    to fit. The resume offset is the piece boundary where the merge window
+    of the first chunk that is not final starts, so resuming there replays
+    the same merge. Nothing is final until the text contains separators[0].
+
+    Args:
+        text: Text to chunk, as received so far
+        chunk_size: Maximum size of each chunk (in characters, or tokens)
+        chunk_overlap: Maximum overlap between consecutive chunks (same units)
+        separators: Literal separators, tried in order
+        token_starts: Optional sorted token start offsets to size chunks in tokens
+
+    Returns:
+        Tuple of (final (start, end) spans, resume offset)
+    """
+    if chunk_overlap > chunk_size:
+        raise ValueError(
+            f"Got a larger chunk overlap ({chunk_overlap}) than chunk size "
+            f"({chunk_size}), should be smaller."
+        )
+
+    spans: List[Span] = []
+    separator = separators[0] if separators else ""
+    if not separator or separator not in text:
+        return spans, 0
+
+    size_at = None if token_starts is None else partial(bisect_left, token_starts)
+    bounds = _piece_bounds(text, 0, len(text), separator)
+    sizes = bounds if size_at is None else list(map(size_at, bounds))
+    last = len(bounds) - 1  # Pieces 0..last-2 are complete; piece last-1 may still change
+
+    # Runs end at oversized pieces, as in _split
+    run_start = 0
+    for i in range(last - 1):
+        if sizes[i + 1] - sizes[i] < chunk_size:
+            continue
+        if i > run_start:
+            _merge(text, bounds, sizes, run_start, i, chunk_size, chunk_overlap, spans)
+        if len(separators) > 1:
+            _split(
+                text, bounds[i], bounds[i + 1], list(separators[1:]),
+                chunk_size, chunk_overlap, size_at, spans
+            )
+        else:
+            spans.append((bounds[i], bounds[i + 1]))
+        run_start = i + 1
+
+    # The open run: emit windows (as in _merge) while the piece that ends them is complete
+    lo = hi = run_start
+    while True:
+        hi = bisect_right(sizes, sizes[lo] + chunk_size, hi + 1, last + 1) - 1
+        if hi >= last - 1:
+            break
+        _emit(text, bounds[lo], bounds[hi], spans)
+        limit = min(chunk_overlap, chunk_size - (sizes[hi + 1] - sizes[hi]))
+        lo = bisect_left(sizes, sizes[hi] - limit, lo, hi)
+
+    return spans, bounds[lo]
+
+
+def _split(
+    text: str,
+    start: int,
+    end: int,
+    separators: List[str],
+    chunk_size: int,
+    chunk_overlap: int,
+    size_at,
+    spans: List[Span]
+):
+    """Recursively split text[start:end], appending chunk spans to ``spans``."""
+    # Use the first separator present in this range
+    separator = separators[-1]
+    remaining: List[str] = []
+    for i, candidate in enumerate(separators):
+        if candidate == "":
+            separator = candidate
+            break
+        if text.find(candidate, start, end) != -1:
+            separator = candidate
+            remaining = separators[i + 1:]
+            break
+
+    bounds = _piece_bounds(text, start, end, separator)
+
+    # Cumulative size at each piece boundary
+    sizes = bounds if size_at is None else list(map(size_at, bounds))
+
+    # Merge runs of pieces shorter than chunk_size; split longer pieces further
+    lengths = map(sub, islice(sizes, 1, None), sizes)
+    run_start = 0
+    for i in compress(count(), map(ge, lengths, repeat(chunk_size))):
+        if i > run_start:
+            _merge(text, bounds, sizes, run_start, i, chunk_size, chunk_overlap, spans)
+        if remaining:
+            _split(
+                text, bounds[i], bounds[i + 1], remaining,
+                chunk_size, chunk_overlap, size_at, spans
+            )
+        else:
+            spans.append((bounds[i], bounds[i + 1]))
+        run_start = i + 1
+
+    if len(bounds) - 1 > run_start:
+        _merge(text, bounds, sizes, run_start, len(bounds) - 1, chunk_size, chunk_overlap, spans)
+
+
+def _piece_bounds(text: str, start: int, end: int, separator: str) -> List[int]:
+    """
+    Split text[start:end] before every occurrence of separator (kept with the next piece).
+
+    Returns:
+        Increasing piece boundaries: piece i is text[bounds[i]:bounds[i + 1]]
+    """
+    if not separator:
+        return list(range(start, end + 1))
+
+    # Occurrence i starts after the parts before it plus i separators; the
+    # running sum is computed in C rather than by scanning matches in Python
+    step = len(separator)
+    parts = text[start:end].split(separator)
+    bounds = list(accumulate(map(add, map(len, parts), repeat(step)), initial=start - step))
+    bounds[0] = start
+    if len(bounds) > 2 and bounds[1] == start:
+        del bounds[1]
+    return bounds
+
+
+def _merge(
+    text: str,
+    bounds: List[int],
+    sizes: List[int],
+    first: int,
+    last: int,
+    chunk_size: int,
+    chunk_overlap: int,
+    spans: List[Span]
+):
+    """
+    Merge the contiguous pieces first..last-1 into chunks of at most chunk_size.
+
+    The current chunk is the piece window [lo, hi); because pieces are
+    contiguous its size is sizes[hi] - sizes[lo] (cumulative sizes), so both
+    growing the window and dropping pieces down to the overlap are binary
+    searches over sizes.
+    """
+    lo = hi = first
+    while True:
+        # Grow the window with every following piece that still fits
+        hi = bisect_right(sizes, sizes[lo] + chunk_size, hi + 1, last + 1) - 1
+        if hi >= last:
+            break
+        _emit(text, bounds[lo], bounds[hi], spans)
+
+        # Drop pieces from the front until the remainder fits as overlap
+        # alongside the next piece (or nothing is left)
+        limit = min(chunk_overlap, chunk_size - (sizes[hi + 1] - sizes[hi]))
+        lo = bisect_left(sizes, sizes[hi] - limit, lo, hi)
+
+    _emit(text, bounds[lo], bounds[last], spans)
+
+
+def _emit(text: str, start: int, end: int, spans: List[Span]):
+    """Append the whitespace-stripped span, skipping blank chunks."""
+    start = _LEADING_SPACE.match(text, start, end).end()
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if end > start:
+        spans.append((start, end))
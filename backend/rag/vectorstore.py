@@ -1,60 +1,599 @@
-import chromadb
-from chromadb.config import Settings
+import functools
+import inspect
 import os
-from typing import List, Dict, Optional
-from sentence_transformers import SentenceTransformer
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterator, List, Dict, Optional, Sequence, Tuple
+import numpy as np
 import logging
+import threading
+
+from rag.compact_index import COMPACT_INDEX_PATH, EMBEDDING_STORAGE, CompactVectorIndex, get_compact_index
+from rag.doc_index import DOC_INDEX_PATH, ChunkRef, DocumentChunkIndex
+from rag.embedding_cache import get_embedding_cache
+from rag.lexical_index import LEXICAL_INDEX_ENABLED, LEXICAL_INDEX_PATH, ChunkRow, LexicalIndex
+from rag.query_batcher import get_query_batcher
+from rag.query_cache import get_query_cache
+from rag.onnx_embeddings import load_onnx_model, onnx_model_id
+from rag.residency import ID_OVERHEAD_BYTES, get_index_residency, hnsw_index_bytes
 
 logger = logging.getLogger(__name__)
 
-# Global embedding model (loaded once at startup)
+# Using a lightweight, fast model for embeddings
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Inference backend: "torch" (SentenceTransformer) or "onnx" (ONNX Runtime, see rag/onnx_embeddings.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+
+# Identifies the vectors a backend produces; cache keys use it so variants never mix
+EMBEDDING_MODEL_ID = EMBEDDING_MODEL_NAME if EMBEDDING_BACKEND == "torch" else onnx_model_id(EMBEDDING_MODEL_NAME)
+
+# Vector index backend: "chroma" (ChromaDB collections) or "hnsw" (in-process hnswlib, see rag/hnsw_store.py)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma").lower()
+
+# Persist directories the vector store is split across by user (see rag/sharding.py); 1 disables sharding
+VECTOR_STORE_SHARDS = int(os.getenv("VECTOR_STORE_SHARDS", "1"))
+
+# Unload least recently used ChromaDB collections to stay within INDEX_MEMORY_BUDGET_MB.
+# Off by default: ChromaDB has no API for it, so it reaches into the segment
+# manager's internals (checked against the pinned chromadb by tests/test_chroma_unload.py)
+CHROMA_UNLOAD_COLLECTIONS = os.getenv("CHROMA_UNLOAD_COLLECTIONS", "false").lower() == "true"
+
+# Chunks fetched (or written) per call when paging through a document's vectors
+COPY_PAGE_SIZE = 1000
+
+# Searches restricted to documents holding at most 1/DOC_FILTER_ID_RATIO of a
+# user's chunks score those chunks directly instead of running a filtered
+# ChromaDB query (0 always uses the filtered query)
+DOC_FILTER_ID_RATIO = int(os.getenv("DOC_FILTER_ID_RATIO", "100"))
+
+# (chunk IDs, texts, metadatas, float32 vectors, one row per chunk)
+ChunkPage = Tuple[List[str], List[str], List[Dict], np.ndarray]
+
+# Stored in ChromaDB in place of real vectors when they live in the compact index
+PLACEHOLDER_EMBEDDING = [0.0]
+
+# Global embedding model (loaded once, by the startup warm-up or the first caller)
 _embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+# Number of query embeddings in flight: a multiprocessing.Value shared with the
+# ingestion workers (set by the ingestion queue), or None when untracked
+_query_activity = None
+
+# Hook run before each bulk (document) encode; ingestion workers install one
+# that holds the batch while the API process is embedding queries
+_bulk_encode_gate: Optional[Callable[[], None]] = None
 
 
 def get_embedding_model():
-    """Get or initialize the embedding model (singleton pattern)."""
+    """Get or initialize the embedding model for EMBEDDING_BACKEND (singleton pattern)."""
     global _embedding_model
     if _embedding_model is None:
-        logger.info("Loading embedding model...")
-        # Using a lightweight, fast model for embeddings
-        _embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-        logger.info("Embedding model loaded successfully")
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                logger.info(f"Loading embedding model ({EMBEDDING_BACKEND} backend)...")
+                if EMBEDDING_BACKEND == "torch":
+                    # Imported on first use: torch and transformers take seconds to import
+                    from sentence_transformers import SentenceTransformer
+                    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+                elif EMBEDDING_BACKEND == "onnx":
+                    model = load_onnx_model(EMBEDDING_MODEL_NAME)
+                else:
+                    raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND!r} (expected 'torch' or 'onnx')")
+                _embedding_model = model
+                logger.info("Embedding model loaded successfully")
     return _embedding_model
 
 
+def track_query_activity(counter):
+    """Count in-flight query embeddings in a shared counter (None to stop tracking)."""
+    global _query_activity
+    _query_activity = counter
+
+
+def set_bulk_encode_gate(gate: Optional[Callable[[], None]]):
+    """Install a hook called before every document (bulk) encode."""
+    global _bulk_encode_gate
+    _bulk_encode_gate = gate
+
+
+@contextmanager
+def _query_in_flight():
+    """Mark a query embedding as in flight for the duration of the block."""
+    counter = _query_activity
+    if counter is None:
+        yield
+        return
+    with counter.get_lock():
+        counter.value += 1
+    try:
+        yield
+    finally:
+        with counter.get_lock():
+            counter.value -= 1
+
+
+def _encode_bulk(model, texts: List[str]) -> np.ndarray:
+    """Encode document texts, first letting the bulk encode gate hold the batch."""
+    if _bulk_encode_gate is not None:
+        _bulk_encode_gate()
+    return model.encode(texts, show_progress_bar=False)
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed document texts, consulting the persistent embedding cache first.
+    
+    Only texts that are not cached (deduplicated) are sent to the model, and
+    their vectors are written back to the cache.
+    
+    Args:
+        texts: Texts to embed
+        
+    Returns:
+        float32 array of shape (len(texts), dim)
+    """
+    model = get_embedding_model()
+    cache = get_embedding_cache()
+    if cache is None:
+        return _encode_bulk(model, texts)
+    
+    vectors = cache.get_many(EMBEDDING_MODEL_ID, texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        encoded = _encode_bulk(model, missing)
+        cache.put_many(EMBEDDING_MODEL_ID, missing, encoded)
+        by_text = dict(zip(missing, encoded))
+        vectors = [by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+    
+    return np.vstack(vectors).astype(np.float32, copy=False)
+
+
+def encode_query(query: str) -> np.ndarray:
+    """
+    Embed a search query.
+    
+    Repeated queries (after normalization) are served from the query cache
+    without touching the model. Others go through the query batcher when
+    enabled, so concurrent searches share one batched model call instead of
+    each encoding a batch of one. While a query is being embedded, ingestion
+    workers hold back their next bulk batch.
+    
+    Args:
+        query: Query text
+        
+    Returns:
+        1-D float array
+    """
+    cache = get_query_cache()
+    if cache is not None:
+        vector = cache.get(EMBEDDING_MODEL_ID, query)
+        if vector is not None:
+            return vector
+    
+    batcher = get_query_batcher()
+    with _query_in_flight():
+        if batcher is None:
+            vector = get_embedding_model().encode([query], show_progress_bar=False)[0]
+        else:
+            vector = batcher.encode(query)
+    
+    if cache is not None:
+        cache.put(EMBEDDING_MODEL_ID, query, vector)
+    return vector
+
+
+def encode_queries(queries: List[str]) -> np.ndarray:
+    """
+    Embed several search queries with one model call.
+    
+    Cached queries are served from the query cache; the others
+    (deduplicated) are encoded together, bypassing the query batcher since
+    they already form a batch. A single query goes through encode_query.
+    
+    Args:
+        queries: Query texts
+        
+    Returns:
+        float array of shape (len(queries), dim)
+    """
+    if len(queries) == 1:
+        return encode_query(queries[0])[None, :]
+    
+    cache = get_query_cache()
+    vectors = [cache.get(EMBEDDING_MODEL_ID, query) if cache is not None else None for query in queries]
+    missing = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+    if missing:
+        with _query_in_flight():
+            encoded = get_embedding_model().encode(missing, show_progress_bar=False)
+        if cache is not None:
+            for query, vector in zip(missing, encoded):
+                cache.put(EMBEDDING_MODEL_ID, query, vector)
+        by_query = dict(zip(missing, encoded))
+        vectors = [by_query[query] if vector is None else vector for query, vector in zip(queries, vectors)]
+    
+    return np.vstack(vectors)
+
+
+def _backend_tokenizer():
+    """
+    Return the embedding model's fast (Rust) tokenizer, reset for plain encoding.
+    
+    The model's own encode calls leave truncation and padding enabled on the
+    shared backend; they are re-applied on the model's next call.
+    """
+    tokenizer = get_embedding_model().tokenizer
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is None:
+        raise ValueError("Token-based chunking requires a fast tokenizer")
+    if backend.truncation is not None:
+        backend.no_truncation()
+    if backend.padding is not None:
+        backend.no_padding()
+    return backend
+
+
+def token_starts(texts: List[str]) -> List[List[int]]:
+    """
+    Tokenize texts in one batch and return the start offset of every token.
+    
+    Args:
+        texts: Texts to tokenize
+        
+    Returns:
+        For each text, the sorted character offsets at which its tokens start
+        (special tokens excluded)
+    """
+    if not texts:
+        return []
+    encodings = _backend_tokenizer().encode_batch(list(texts), add_special_tokens=False)
+    return [[start for start, _ in encoding.offsets] for encoding in encodings]
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """
+    Count embedding-model tokens per text (excluding special tokens).
+    
+    Args:
+        texts: Texts to tokenize (in one batch)
+        
+    Returns:
+        Token count of each text
+    """
+    if not texts:
+        return []
+    backend = _backend_tokenizer()
+    encode = getattr(backend, "encode_batch_fast", backend.encode_batch)
+    return [len(encoding.ids) for encoding in encode(list(texts), add_special_tokens=False)]
+
+
+def get_max_tokens() -> int:
+    """Return how many text tokens the embedding model sees per input before truncating."""
+    model = get_embedding_model()
+    return model.max_seq_length - model.tokenizer.num_special_tokens_to_add(pair=False)
+
+
+def copy_chunk_metadata(source_metadata: Dict, user_id: str, doc_id: str, overrides: Optional[Dict] = None) -> Dict:
+    """Return the metadata of a chunk copied to another document (its chunk ID is derived from doc_id)."""
+    chunk_metadata = dict(source_metadata)
+    chunk_metadata.update({
+        "doc_id": doc_id,
+        "chunk_id": f"{doc_id}_chunk_{source_metadata['chunk_index']}",
+        "user_id": user_id
+    })
+    if overrides:
+        chunk_metadata.update(overrides)
+    return chunk_metadata
+
+
+def chroma_collection_bytes(client, collection_id) -> int:
+    """
+    Estimate the memory of a collection's vector segment (loading it, as the next operation would).
+    
+    Raises:
+        AttributeError: If this ChromaDB version lacks the internals used
+    """
+    from chromadb.segment import VectorReader
+    
+    segment = client._server._manager.get_segment(collection_id, VectorReader)
+    index = getattr(segment, "_index", None)
+    size = hnsw_index_bytes(index) if index is not None else 0
+    return size + len(getattr(segment, "_id_to_label", {})) * ID_OVERHEAD_BYTES
+
+
+def unload_chroma_collection(client, collection_id):
+    """
+    Drop a collection's segments from a ChromaDB client's segment manager.
+    
+    ChromaDB 0.4 keeps the segments (including the HNSW index) of every
+    collection it has opened in memory for the life of the client, with no
+    API to release them. Each segment is stopped under its write lock; writes
+    not yet flushed to the index files are replayed from ChromaDB's
+    write-ahead log when the collection is next opened. Callers must make
+    sure nothing is using the collection meanwhile.
+    
+    Raises:
+        AttributeError: If this ChromaDB version lacks the internals used
+    """
+    from chromadb.utils.read_write_lock import WriteRWLock
+    
+    manager = client._server._manager
+    with manager._lock:
+        segments = manager._segment_cache.pop(collection_id, {})
+        for segment in segments.values():
+            instance = manager._instances.pop(segment["id"], None)
+            if instance is None:
+                continue
+            with WriteRWLock(instance._lock) if hasattr(instance, "_lock") else nullcontext():
+                instance.stop()
+                if hasattr(instance, "close_persistent_index"):
+                    instance.close_persistent_index()
+        file_handles = getattr(manager, "_vector_instances_file_handle_cache", None)
+        if file_handles is not None:
+            file_handles.cache.pop(collection_id, None)
+
+
+def _holds_collection(user_arg: str = "user_id"):
+    """
+    Decorate a VectorStore method to hold the collection of its ``user_arg``
+    user for the whole call (for generators: until iteration ends), so
+    residency eviction cannot unload it mid-call.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+        
+        def held_user(self, args, kwargs) -> str:
+            return signature.bind(self, *args, **kwargs).arguments[user_arg]
+        
+        if inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def generator(self, *args, **kwargs):
+                with self._collection_in_use(held_user(self, args, kwargs)):
+                    yield from method(self, *args, **kwargs)
+            return generator
+        
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._collection_in_use(held_user(self, args, kwargs)):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 class VectorStore:
-    """Wrapper for ChromaDB vector store with user-specific namespaces."""
+    """
+    Wrapper for ChromaDB vector store with user-specific namespaces.
+    
+    With EMBEDDING_STORAGE=float16 or int8, ChromaDB only keeps chunk text and
+    metadata (in "user_<id>_compact" collections, with placeholder vectors)
+    and the vectors are searched in the compact index (rag/compact_index.py).
+    
+    With CHROMA_UNLOAD_COLLECTIONS=true, opened collections are tracked by
+    the index residency manager, which unloads the least recently used ones
+    when INDEX_MEMORY_BUDGET_MB is set.
+    Chunk text is also kept in the keyword (BM25) index used by lexical and
+    hybrid retrieval (rag/lexical_index.py) unless LEXICAL_INDEX_ENABLED=false.
+    The chunk IDs of each document are tracked in a doc_id index
+    (rag/doc_index.py), so deletes and document-restricted searches go by ID
+    instead of scanning collection metadata.
+    """
     
-    def __init__(self, persist_directory: str = "./data/chroma_db"):
-        """Initialize ChromaDB client with persistence."""
+    def __init__(
+        self,
+        persist_directory: str = "./data/chroma_db",
+        lexical_index_path: str = LEXICAL_INDEX_PATH,
+        doc_index_path: str = DOC_INDEX_PATH,
+        compact_index_path: str = COMPACT_INDEX_PATH,
+        shard: Optional[int] = None
+    ):
+        """Initialize ChromaDB client with persistence (shard: shard number when sharded)."""
+        import chromadb
+        from chromadb.config import Settings
+        
         os.makedirs(persist_directory, exist_ok=True)
         
+        self.persist_directory = persist_directory
         self.client = chromadb.PersistentClient(
             path=persist_directory,
             settings=Settings(anonymized_telemetry=False)
         )
         self.embedding_model = get_embedding_model()
+        self.compact_index_path = compact_index_path
+        if compact_index_path == COMPACT_INDEX_PATH:
+            self.compact_index = get_compact_index()
+        elif EMBEDDING_STORAGE != "float32":
+            self.compact_index = CompactVectorIndex(path=compact_index_path, residency_kind=f"compact:{shard}")
+        else:
+            self.compact_index = None
+        # Collection residency, guarded by _collections_lock: loaded collections,
+        # store calls using each user's collection, and unloads deferred until
+        # those calls finish
+        self._collections_lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        self._resident_collections: Dict[str, object] = {}  # user ID -> collection ID
+        self._collection_users: Dict[str, int] = {}
+        self._pending_unloads = set()
+        self._residency = get_index_residency()
+        self._residency_kind = "chroma" if shard is None else f"chroma:{shard}"
+        self._residency.register(self._residency_kind, self._unload_collection)
+        self._unload_supported = CHROMA_UNLOAD_COLLECTIONS
+        self.lexical_index = LexicalIndex(lexical_index_path, self.iter_chunks) if LEXICAL_INDEX_ENABLED else None
+        self.doc_index = DocumentChunkIndex(doc_index_path, self._iter_chunk_refs)
         logger.info(f"VectorStore initialized with persist directory: {persist_directory}")
     
+    @staticmethod
+    def _collection_name(user_id: str, compact: bool) -> str:
+        return f"user_{user_id}_compact" if compact else f"user_{user_id}"
+    
     def get_collection(self, user_id: str):
-        """Get or create a collection for a specific user (namespace)."""
-        collection_name = f"user_{user_id}"
-        try:
-            collection = self.client.get_collection(name=collection_name)
-        except:
-            collection = self.client.create_collection(
-                name=collection_name,
-                metadata={"user_id": user_id}
-            )
+        """
+        Get or create a collection for a specific user (namespace).
+        
+        The store's own methods hold the collection (see _holds_collection)
+        so it is not unloaded while they use it; other callers should not
+        keep the returned collection across calls when INDEX_MEMORY_BUDGET_MB
+        is set.
+        """
+        collection_name = self._collection_name(user_id, self.compact_index is not None)
+        # Serialized, so concurrent first calls for a user neither both create
+        # the collection nor see it before its segments and migration are done
+        with self._create_lock:
+            try:
+                collection = self.client.get_collection(name=collection_name)
+            except:
+                collection = self.client.create_collection(
+                    name=collection_name,
+                    metadata={"user_id": user_id}
+                )
+                self._migrate_storage(user_id, collection)
+        
+        if not self._unload_supported:
+            return collection
+        with self._collections_lock:
+            resident = user_id in self._resident_collections
+            if not resident:
+                self._resident_collections[user_id] = collection.id
+        # Reported outside the lock, which the residency's eviction thread takes to unload
+        if resident:
+            self._residency.hit(self._residency_kind, user_id)
+        else:
+            self._residency.admit(self._residency_kind, user_id, self._collection_bytes(collection))
         return collection
     
+    @contextmanager
+    def _collection_in_use(self, user_id: str):
+        """Keep a user's collection loaded until the block exits (an unload requested meanwhile runs then)."""
+        with self._collections_lock:
+            self._collection_users[user_id] = self._collection_users.get(user_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._collections_lock:
+                users = self._collection_users.pop(user_id) - 1
+                if users:
+                    self._collection_users[user_id] = users
+                elif user_id in self._pending_unloads:
+                    self._pending_unloads.discard(user_id)
+                    self._unload_locked(user_id)
+    
+    def _collection_bytes(self, collection) -> int:
+        try:
+            return chroma_collection_bytes(self.client, collection.id)
+        except AttributeError:
+            return 0
+    
+    def _unload_collection(self, user_id: str):
+        """
+        Unload a user's collection (the residency evict callback; see unload_chroma_collection).
+        
+        If a store call is still using the collection, the unload is deferred
+        until the last such call finishes.
+        """
+        with self._collections_lock:
+            if self._collection_users.get(user_id):
+                self._pending_unloads.add(user_id)
+                return
+            self._unload_locked(user_id)
+    
+    def _unload_locked(self, user_id: str):
+        """Drop an unused collection's segments; call with _collections_lock held (so it is not reopened meanwhile)."""
+        collection_id = self._resident_collections.pop(user_id, None)
+        if collection_id is None or not self._unload_supported:
+            return
+        
+        try:
+            unload_chroma_collection(self.client, collection_id)
+        except AttributeError as e:
+            # Stop tracking collections that can no longer be unloaded
+            self._unload_supported = False
+            for resident_user_id in self._resident_collections:
+                self._residency.discard(self._residency_kind, resident_user_id)
+            self._resident_collections.clear()
+            logger.warning(f"This ChromaDB version does not support unloading collections ({str(e)})")
+    
+    def _migrate_storage(self, user_id: str, collection):
+        """
+        Move a user's chunks stored under the other EMBEDDING_STORAGE mode into a new collection.
+        
+        Runs once, when the collection for the current mode is created; the
+        previous collection (and its compact vectors) is deleted afterwards.
+        """
+        compact = self.compact_index is not None
+        try:
+            previous = self.client.get_collection(name=self._collection_name(user_id, not compact))
+        except Exception:
+            return
+        
+        previous_index = None
+        if not compact:
+            if not os.path.exists(self.compact_index_path):
+                logger.warning(f"Compact index {self.compact_index_path} not found, cannot migrate user {user_id}")
+                return
+            previous_index = CompactVectorIndex(storage="float16", path=self.compact_index_path)
+        
+        logger.info(f"Migrating vectors of user {user_id} to {'compact' if compact else 'float32'} storage...")
+        moved = 0
+        try:
+            while True:
+                page = previous.get(
+                    include=["documents", "metadatas"] + (["embeddings"] if compact else []),
+                    limit=COPY_PAGE_SIZE,
+                    offset=moved
+                )
+                if not page["ids"]:
+                    break
+                moved += len(page["ids"])
+                
+                if compact:
+                    rows = list(zip(page["ids"], page["documents"], page["metadatas"], page["embeddings"]))
+                else:
+                    vectors = previous_index.get_vectors(user_id, page["ids"])
+                    rows = [
+                        (chunk_id, document, metadata, vectors[chunk_id])
+                        for chunk_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+                        if chunk_id in vectors
+                    ]
+                if rows:
+                    ids, texts, metadatas, embeddings = map(list, zip(*rows))
+                    self._add(collection, user_id, texts, metadatas, ids, np.vstack(embeddings))
+        except Exception:
+            # Leave the previous storage in place so the migration is retried on next access
+            self.client.delete_collection(name=collection.name)
+            if compact:
+                self.compact_index.delete_user(user_id)
+            raise
+        
+        self.client.delete_collection(name=previous.name)
+        if previous_index is not None:
+            previous_index.delete_user(user_id)
+        logger.info(f"Migrated {moved} chunks of user {user_id}")
+    
+    def _add(self, collection, user_id: str, texts: List[str], metadatas: List[Dict], ids: List[str], embeddings):
+        """Write chunks to a collection, routing their vectors to the compact index when enabled."""
+        if self.compact_index is not None:
+            self.compact_index.add(user_id, ids, [metadata["doc_id"] for metadata in metadatas], embeddings)
+            embeddings = [PLACEHOLDER_EMBEDDING] * len(ids)
+        elif hasattr(embeddings, "tolist"):
+            embeddings = embeddings.tolist()
+        
+        collection.add(
+            embeddings=embeddings,
+            documents=texts,
+            metadatas=metadatas,
+            ids=ids
+        )
+        if self._unload_supported:
+            self._residency.resize(self._residency_kind, user_id, self._collection_bytes(collection))
+    
+    @_holds_collection()
     def add_documents(
         self,
         user_id: str,
         doc_id: str,
         texts: List[str],
         metadatas: List[Dict],
-        ids: List[str]
+        ids: List[str],
+        embeddings: Optional[Sequence] = None
     ):
         """
         Add documents to the vector store for a specific user.
@@ -65,22 +604,28 @@ class VectorStore:
             texts: List of text chunks
             metadatas: List of metadata dicts for each chunk
             ids: List of unique IDs for each chunk
+            embeddings: Optional precomputed embeddings (e.g. from an ingestion worker)
         """
         collection = self.get_collection(user_id)
         
-        # Generate embeddings
-        embeddings = self.embedding_model.encode(texts, show_progress_bar=False).tolist()
+        # Generate embeddings unless they were computed elsewhere
+        if embeddings is None:
+            embeddings = encode_texts(texts)
+        
+        # Record the chunks first, so the doc_id index never misses a stored chunk
+        self.doc_index.add(user_id, [
+            (chunk_id, metadata.get("doc_id", doc_id), metadata.get("revision"))
+            for chunk_id, metadata in zip(ids, metadatas)
+        ])
         
         # Add to collection
-        collection.add(
-            embeddings=embeddings,
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+        self._add(collection, user_id, texts, metadatas, ids, embeddings)
+        if self.lexical_index is not None:
+            self.lexical_index.add(user_id, ids, [metadata.get("doc_id", doc_id) for metadata in metadatas], texts)
         
         logger.info(f"Added {len(texts)} chunks to vector store for user {user_id}, doc {doc_id}")
     
+    @_holds_collection()
     def search(
         self,
         user_id: str,
@@ -105,7 +650,15 @@ class VectorStore:
         collection = self.get_collection(user_id)
         
         # Generate query embedding
-        query_embedding = self.embedding_model.encode([query], show_progress_bar=False).tolist()[0]
+        query_embedding = encode_query(query)
+        
+        if self.compact_index is not None:
+            return self._search_compact(collection, user_id, query_embedding, n_results, doc_ids, where)
+        
+        if doc_ids and not where:
+            chunk_ids = self._document_chunk_ids(user_id, doc_ids)
+            if chunk_ids is not None:
+                return self._search_ids(collection, query_embedding[np.newaxis], [n_results], chunk_ids)[0]
         
         # Build where clause
         where_clause = where or {}
@@ -114,39 +667,433 @@ class VectorStore:
         
         # Search
         results = collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=[query_embedding.tolist()],
             n_results=n_results,
             where=where_clause if where_clause else None
         )
         
-        # Format results
+        return self._format_results(results, 0)
+    
+    @staticmethod
+    def _format_results(results: Dict, row: int) -> List[Dict]:
+        """Format the hits of one query embedding of a collection.query call."""
         formatted_results = []
-        if results["ids"] and len(results["ids"][0]) > 0:
-            for i in range(len(results["ids"][0])):
+        if results["ids"] and len(results["ids"][row]) > 0:
+            for i in range(len(results["ids"][row])):
                 formatted_results.append({
-                    "content": results["documents"][0][i],
-                    "metadata": results["metadatas"][0][i],
-                    "id": results["ids"][0][i],
-                    "distance": results["distances"][0][i] if "distances" in results else None
+                    "content": results["documents"][row][i],
+                    "metadata": results["metadatas"][row][i],
+                    "id": results["ids"][row][i],
+                    "distance": results["distances"][row][i] if "distances" in results else None
                 })
         
         return formatted_results
     
-    def delete_document(self, user_id: str, doc_id: str):
-        """Delete all chunks for a specific document."""
+    @_holds_collection()
+    def search_many(
+        self,
+        user_id: str,
+        queries: List[str],
+        n_results: List[int],
+        doc_ids: List[Optional[List[str]]]
+    ) -> List[List[Dict]]:
+        """
+        Run several searches in one user's namespace.
+        
+        The queries are embedded in one model call, and queries with the same
+        doc_ids filter share one multi-embedding collection.query call.
+        
+        Args:
+            user_id: User ID (determines namespace)
+            queries: Search query texts
+            n_results: Number of results for each query
+            doc_ids: Document ID filter for each query (None for all documents)
+            
+        Returns:
+            Search results of each query, in order (same format as search)
+        """
+        if not queries:
+            return []
+        collection = self.get_collection(user_id)
+        query_embeddings = encode_queries(queries)
+        
+        if self.compact_index is not None:
+            return [
+                self._search_compact(collection, user_id, query_embedding, n, filter_ids, None)
+                for query_embedding, n, filter_ids in zip(query_embeddings, n_results, doc_ids)
+            ]
+        
+        groups: Dict[Optional[tuple], List[int]] = {}
+        for i, filter_ids in enumerate(doc_ids):
+            groups.setdefault(tuple(sorted(set(filter_ids))) if filter_ids else None, []).append(i)
+        
+        formatted_results: List[List[Dict]] = [[] for _ in queries]
+        for filter_ids, indices in groups.items():
+            chunk_ids = self._document_chunk_ids(user_id, filter_ids) if filter_ids else None
+            if chunk_ids is not None:
+                found = self._search_ids(collection, query_embeddings[indices], [n_results[i] for i in indices], chunk_ids)
+                for row, i in enumerate(indices):
+                    formatted_results[i] = found[row]
+                continue
+            results = collection.query(
+                query_embeddings=query_embeddings[indices].tolist(),
+                n_results=max(n_results[i] for i in indices),
+                where={"doc_id": {"$in": list(filter_ids)}} if filter_ids else None
+            )
+            for row, i in enumerate(indices):
+                formatted_results[i] = self._format_results(results, row)[:n_results[i]]
+        
+        return formatted_results
+    
+    def _document_chunk_ids(self, user_id: str, doc_ids: Sequence[str]) -> Optional[List[str]]:
+        """
+        Return the chunk IDs to score directly for a document-restricted search.
+        
+        None means the documents are too large a share of the collection, and
+        a filtered collection.query (which searches the HNSW index) is faster.
+        """
+        if DOC_FILTER_ID_RATIO <= 0:
+            return None
+        chunk_ids = self.doc_index.chunk_ids(user_id, doc_ids)
+        if len(chunk_ids) * DOC_FILTER_ID_RATIO > self.doc_index.count(user_id):
+            return None
+        return chunk_ids
+    
+    def _search_ids(
+        self,
+        collection,
+        query_embeddings: np.ndarray,
+        n_results: List[int],
+        chunk_ids: List[str]
+    ) -> List[List[Dict]]:
+        """
+        Exact search over the given chunks, for each query embedding.
+        
+        Fetches the chunks' vectors by ID and ranks them by squared L2
+        distance (ChromaDB's metric); only the hits' text and metadata are
+        loaded. Chunk IDs the collection no longer has are skipped.
+        """
+        ids, vectors = [], []
+        for start in range(0, len(chunk_ids), COPY_PAGE_SIZE):
+            page = collection.get(ids=chunk_ids[start:start + COPY_PAGE_SIZE], include=["embeddings"])
+            ids.extend(page["ids"])
+            vectors.extend(page["embeddings"])
+        if not ids:
+            return [[] for _ in n_results]
+        
+        matrix = np.asarray(vectors, dtype=np.float32)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        distances = (
+            np.einsum("ij,ij->i", queries, queries)[:, np.newaxis]
+            - 2 * queries @ matrix.T
+            + np.einsum("ij,ij->i", matrix, matrix)[np.newaxis, :]
+        )
+        
+        rankings = []
+        for row, n in enumerate(n_results):
+            n = min(n, len(ids))
+            top = np.argpartition(distances[row], n - 1)[:n]
+            top = top[np.argsort(distances[row][top], kind="stable")]
+            rankings.append([(ids[i], max(0.0, float(distances[row][i]))) for i in top])
+        
+        chunks = {
+            chunk["id"]: chunk
+            for chunk in self._get_chunks(collection, list(dict.fromkeys(chunk_id for ranking in rankings for chunk_id, _ in ranking)))
+        }
+        return [
+            [dict(chunks[chunk_id], distance=distance) for chunk_id, distance in ranking if chunk_id in chunks]
+            for ranking in rankings
+        ]
+    
+    def _search_compact(
+        self,
+        collection,
+        user_id: str,
+        query_embedding: np.ndarray,
+        n_results: int,
+        doc_ids: Optional[List[str]],
+        where: Optional[Dict]
+    ) -> List[Dict]:
+        """Search the compact index, then fetch the hits' text and metadata from ChromaDB."""
+        allowed_ids = None
+        if where:
+            allowed_ids = set(collection.get(where=where, include=[])["ids"])
+        
+        hits = self.compact_index.search(user_id, query_embedding, n_results, doc_ids or None, allowed_ids)
+        if not hits:
+            return []
+        
+        chunks = {chunk["id"]: chunk for chunk in self._get_chunks(collection, [chunk_id for chunk_id, _ in hits])}
+        return [
+            dict(chunks[chunk_id], distance=distance)
+            for chunk_id, distance in hits
+            if chunk_id in chunks
+        ]
+    
+    @staticmethod
+    def _get_chunks(collection, ids: List[str]) -> List[Dict]:
+        found = collection.get(ids=ids, include=["documents", "metadatas"])
+        chunks = {
+            chunk_id: {"content": document, "metadata": metadata, "id": chunk_id, "distance": None}
+            for chunk_id, document, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return [chunks[chunk_id] for chunk_id in ids if chunk_id in chunks]
+    
+    @_holds_collection()
+    def get_chunks(self, user_id: str, ids: List[str]) -> List[Dict]:
+        """
+        Fetch chunks by ID (e.g. keyword search hits) in the order given.
+        
+        Args:
+            user_id: User ID (determines namespace)
+            ids: Chunk IDs; unknown IDs are skipped
+            
+        Returns:
+            Results in the same format as search, with distance None
+        """
+        if not ids:
+            return []
+        return self._get_chunks(self.get_collection(user_id), ids)
+    
+    @_holds_collection()
+    def iter_chunks(self, user_id: str) -> Iterator[List[ChunkRow]]:
+        """Yield every chunk of a user as pages of (chunk ID, doc ID, text); used to build the keyword index."""
+        collection = self.get_collection(user_id)
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=COPY_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            yield [
+                (chunk_id, metadata["doc_id"], document)
+                for chunk_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+            ]
+            offset += len(page["ids"])
+    
+    @_holds_collection()
+    def iter_vectors(self, user_id: str) -> Iterator[ChunkPage]:
+        """Yield every chunk of a user as pages of (IDs, texts, metadatas, float32 vector matrix); used by exports."""
+        collection = self.get_collection(user_id)
+        offset = 0
+        while True:
+            page = collection.get(
+                include=["documents", "metadatas"] + (["embeddings"] if self.compact_index is None else []),
+                limit=COPY_PAGE_SIZE,
+                offset=offset
+            )
+            if not page["ids"]:
+                break
+            offset += len(page["ids"])
+            
+            if self.compact_index is None:
+                yield page["ids"], page["documents"], page["metadatas"], np.asarray(page["embeddings"], dtype=np.float32)
+                continue
+            vectors = self.compact_index.get_vectors(user_id, page["ids"])
+            rows = [
+                (chunk_id, document, metadata, vectors[chunk_id])
+                for chunk_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"])
+                if chunk_id in vectors
+            ]
+            if rows:
+                ids, texts, metadatas, embeddings = map(list, zip(*rows))
+                yield ids, texts, metadatas, np.vstack(embeddings).astype(np.float32)
+    
+    @_holds_collection()
+    def _iter_chunk_refs(self, user_id: str) -> Iterator[List[ChunkRef]]:
+        """Yield every chunk of a user as pages of (chunk ID, doc ID, revision); used to build the doc_id index."""
+        collection = self.get_collection(user_id)
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=COPY_PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            yield [
+                (chunk_id, metadata["doc_id"], metadata.get("revision"))
+                for chunk_id, metadata in zip(page["ids"], page["metadatas"])
+            ]
+            offset += len(page["ids"])
+    
+    @_holds_collection("source_user_id")
+    def copy_document(
+        self,
+        source_user_id: str,
+        source_doc_id: str,
+        user_id: str,
+        doc_id: str,
+        metadata: Optional[Dict] = None,
+        target_store=None
+    ) -> int:
+        """
+        Copy the chunks and embeddings of an existing document to another document.
+        
+        Used to reuse the vectors of a previously ingested identical file without
+        re-embedding. The target may live in another user's namespace.
+        
+        Args:
+            source_user_id: Owner of the source document
+            source_doc_id: Source document ID
+            user_id: Owner of the new document
+            doc_id: New document ID
+            metadata: Metadata overrides for the copied chunks (e.g. filename)
+            target_store: Store holding the new document's namespace (default: this one)
+            
+        Returns:
+            Number of chunks copied (0 if the source has no chunks)
+        """
+        source_collection = self.get_collection(source_user_id)
+        source_ids = self.doc_index.chunk_ids(source_user_id, [source_doc_id])
+        copied = 0
+        
+        # Page through the source so large documents are copied in bounded memory
+        for start in range(0, len(source_ids), COPY_PAGE_SIZE):
+            source = source_collection.get(
+                ids=source_ids[start:start + COPY_PAGE_SIZE],
+                include=["documents", "metadatas"] + (["embeddings"] if self.compact_index is None else [])
+            )
+            if not source["ids"]:
+                continue
+            
+            if self.compact_index is not None:
+                vectors = self.compact_index.get_vectors(source_user_id, source["ids"])
+                embeddings = np.vstack([vectors[chunk_id] for chunk_id in source["ids"]])
+            else:
+                embeddings = source["embeddings"]
+            
+            metadatas = [
+                copy_chunk_metadata(source_metadata, user_id, doc_id, metadata)
+                for source_metadata in source["metadatas"]
+            ]
+            ids = [chunk_metadata["chunk_id"] for chunk_metadata in metadatas]
+            
+            (target_store or self).add_documents(
+                user_id=user_id,
+                doc_id=doc_id,
+                texts=source["documents"],
+                metadatas=metadatas,
+                ids=ids,
+                embeddings=embeddings
+            )
+            copied += len(ids)
+        
+        return copied
+    
+    def user_ids(self) -> List[str]:
+        """Return the IDs of the users that have a collection."""
+        return sorted({
+            collection.metadata["user_id"]
+            for collection in self.client.list_collections()
+            if collection.metadata and "user_id" in collection.metadata
+        })
+    
+    def has_chunks(self, user_id: str) -> bool:
+        """Return whether a user has any chunks (without creating a collection)."""
+        for compact in (True, False):
+            try:
+                if self.client.get_collection(name=self._collection_name(user_id, compact)).count():
+                    return True
+            except Exception:
+                continue
+        return False
+    
+    @_holds_collection()
+    def get_document_chunks(self, user_id: str, doc_id: str) -> Dict[str, str]:
+        """
+        Return the text of every stored chunk of a document.
+        
+        Args:
+            user_id: User ID (determines namespace)
+            doc_id: Document ID
+            
+        Returns:
+            Dict mapping chunk ID to chunk text
+        """
+        collection = self.get_collection(user_id)
+        ids = self.doc_index.chunk_ids(user_id, [doc_id])
+        chunks = {}
+        
+        for start in range(0, len(ids), COPY_PAGE_SIZE):
+            page = collection.get(ids=ids[start:start + COPY_PAGE_SIZE], include=["documents"])
+            chunks.update(zip(page["ids"], page["documents"]))
+        
+        return chunks
+    
+    @_holds_collection()
+    def update_chunk_metadatas(self, user_id: str, ids: List[str], metadatas: List[Dict]):
+        """Replace the metadata of existing chunks, leaving their text and vectors untouched."""
+        collection = self.get_collection(user_id)
+        for start in range(0, len(ids), COPY_PAGE_SIZE):
+            collection.update(
+                ids=ids[start:start + COPY_PAGE_SIZE],
+                metadatas=metadatas[start:start + COPY_PAGE_SIZE]
+            )
+        self.doc_index.add(user_id, [
+            (chunk_id, metadata["doc_id"], metadata.get("revision"))
+            for chunk_id, metadata in zip(ids, metadatas)
+        ])
+    
+    @_holds_collection()
+    def delete_chunks(self, user_id: str, ids: List[str]):
+        """Delete specific chunks by ID."""
+        collection = self.get_collection(user_id)
+        for start in range(0, len(ids), COPY_PAGE_SIZE):
+            collection.delete(ids=ids[start:start + COPY_PAGE_SIZE])
+        self.doc_index.delete(user_id, ids)
+        if self.compact_index is not None:
+            self.compact_index.delete(user_id, ids)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(user_id, ids)
+    
+    @_holds_collection()
+    def delete_document(self, user_id: str, doc_id: str, revision: Optional[int] = None):
+        """
+        Delete all chunks for a specific document.
+        
+        Args:
+            user_id: User ID (determines namespace)
+            doc_id: Document ID
+            revision: If given, only delete chunks added by this revision
+        """
         collection = self.get_collection(user_id)
-        collection.delete(where={"doc_id": doc_id})
-        logger.info(f"Deleted document {doc_id} from vector store for user {user_id}")
+        ids = self.doc_index.chunk_ids(user_id, [doc_id], revision)
+        for start in range(0, len(ids), COPY_PAGE_SIZE):
+            collection.delete(ids=ids[start:start + COPY_PAGE_SIZE])
+        self.doc_index.delete(user_id, ids)
+        if revision is None:
+            if self.compact_index is not None:
+                self.compact_index.delete_document(user_id, doc_id)
+            if self.lexical_index is not None:
+                self.lexical_index.delete_document(user_id, doc_id)
+            logger.info(f"Deleted document {doc_id} from vector store for user {user_id}")
+        else:
+            if self.compact_index is not None:
+                self.compact_index.delete(user_id, ids)
+            if self.lexical_index is not None:
+                self.lexical_index.delete(user_id, ids)
+            logger.info(f"Deleted revision {revision} of document {doc_id} from vector store for user {user_id}")
 
 
 # Global vector store instance
 _vector_store = None
+_vector_store_lock = threading.Lock()
 
 
-def get_vector_store() -> VectorStore:
-    """Get or create the global vector store instance."""
+def get_vector_store():
+    """Get or create the global vector store instance for VECTOR_STORE_BACKEND (and VECTOR_STORE_SHARDS)."""
     global _vector_store
     if _vector_store is None:
-        _vector_store = VectorStore()
+        with _vector_store_lock:
+            if _vector_store is None:
+                if VECTOR_STORE_SHARDS > 1:
+                    from rag.sharding import ShardedVectorStore
+                    _vector_store = ShardedVectorStore()
+                elif VECTOR_STORE_BACKEND == "chroma":
+                    _vector_store = VectorStore()
+                elif VECTOR_STORE_BACKEND == "hnsw":
+                    from rag.hnsw_store import HnswVectorStore
+                    _vector_store = HnswVectorStore()
+                else:
+                    raise ValueError(
+                        f"Unknown VECTOR_STORE_BACKEND: {VECTOR_STORE_BACKEND!r} (expected 'chroma' or 'hnsw')"
+                    )
     return _vector_store
 
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from bson import ObjectId
+from bson.errors import InvalidId
+import logging
+import os
+
+from models.database import get_db
+from utils.auth import get_admin_user
+from utils.schemas import CurrentUser, NamespaceExportRequest, NamespaceExportResponse
+from rag.async_vectorstore import get_async_vector_store
+from rag.namespace_export import NAMESPACE_EXPORT_DIR, export_namespace, import_namespace
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+def _export_directory(name: str) -> str:
+    """Resolve an export name to its directory under NAMESPACE_EXPORT_DIR."""
+    if not name or name in (".", "..") or os.path.basename(name) != name:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Export name must be a plain directory name"
+        )
+    return os.path.join(NAMESPACE_EXPORT_DIR, name)
+
+
+@router.post(
+    "/namespaces/{user_id}/export",
+    response_model=NamespaceExportResponse,
+    status_code=status.HTTP_201_CREATED
+)
+async def export_namespace_endpoint(
+    user_id: str,
+    request: NamespaceExportRequest,
+    admin: CurrentUser = Depends(get_admin_user)
+):
+    """
+    Export a user's chunks and vectors to a directory under NAMESPACE_EXPORT_DIR
+    (an .npy vector matrix, gzipped JSON lines of chunks and a manifest).
+    """
+    directory = _export_directory(request.name)
+
+    try:
+        manifest = await get_async_vector_store().run(export_namespace, user_id, directory)
+    except FileExistsError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error exporting namespace: {str(e)}"
+        )
+
+    logger.info(f"Admin {admin.username} exported user {user_id} to {directory}")
+    return NamespaceExportResponse(name=request.name, **manifest)
+
+
+@router.post("/namespaces/{user_id}/import", response_model=NamespaceExportResponse)
+async def import_namespace_endpoint(
+    user_id: str,
+    request: NamespaceExportRequest,
+    admin: CurrentUser = Depends(get_admin_user),
+    db=Depends(get_db)
+):
+    """
+    Import an export from NAMESPACE_EXPORT_DIR into a user's (empty) namespace
+    without re-embedding. Returns the export's manifest with the target user.
+
+    A failed import is rolled back, leaving the namespace empty. Imported
+    chunks have no `documents` records: they are searchable, but the user
+    cannot list or delete them through the documents API.
+    """
+    directory = _export_directory(request.name)
+    if not os.path.isdir(directory):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Export not found")
+
+    try:
+        user = await db.users.find_one({"_id": ObjectId(user_id)})
+    except InvalidId:
+        user = None
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    try:
+        manifest = await get_async_vector_store().run(import_namespace, user_id, directory)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error importing namespace: {str(e)}"
+        )
+
+    logger.info(f"Admin {admin.username} imported {directory} into user {user_id}")
+    return NamespaceExportResponse(name=request.name, **dict(manifest, user_id=user_id))
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from bson import ObjectId
-import os
 import logging
+import os
 
 from models.database import get_db
 from utils.auth import get_current_user
-from utils.schemas import DocumentListResponse, DocumentInfo, CurrentUser
-from rag.vectorstore import get_vector_store
+from utils.schemas import DocumentListResponse, DocumentInfo, UploadResponse, CurrentUser
+from utils.uploads import (
+    save_upload_file,
+    staging_path,
+    UploadTooLargeError
+)
+from rag.async_vectorstore import get_async_vector_store
+from rag.jobs import get_ingestion_queue, QueueFullError, DocumentBusyError
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +72,115 @@ async def get_document(
     })
 
 
+@router.put("/{doc_id}", response_model=UploadResponse, status_code=status.HTTP_202_ACCEPTED)
+async def update_document(
+    doc_id: str,
+    file: UploadFile = File(...),
+    current_user: CurrentUser = Depends(get_current_user),
+    db=Depends(get_db)
+):
+    """
+    Replace a document with a new version of the PDF.
+
+    The new version is re-chunked in the background and only chunks whose text
+    changed are embedded; unchanged chunks keep their IDs and vectors.
+    """
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only PDF files are supported"
+        )
+
+    document = await db.documents.find_one({
+        "doc_id": doc_id,
+        "user_id": ObjectId(current_user.id)
+    })
+
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+
+    file_path = staging_path()
+    file_hash = None
+    staged = False
+
+    try:
+        file_size, file_hash = await save_upload_file(file, file_path)
+        file_path = get_ingestion_queue().stage_upload(file_path, file_hash)
+        staged = True
+
+        if file_hash == document.get("file_hash"):
+            # The document already holds this blob
+            staged = False
+            await get_ingestion_queue().release_upload(file_path, file_hash, staged=True)
+            if file.filename != document["filename"]:
+                await db.documents.update_one(
+                    {"_id": document["_id"]},
+                    {"$set": {"filename": file.filename}}
+                )
+            return UploadResponse(
+                doc_id=doc_id,
+                filename=file.filename,
+                chunks_created=0,
+                message="Document content is unchanged"
+            )
+
+        job = get_ingestion_queue().submit_update(
+            user_id=current_user.id,
+            document=document,
+            file={
+                "filename": file.filename,
+                "file_path": file_path,
+                "file_size": file_size,
+                "file_hash": file_hash,
+            }
+        )
+        staged = False
+
+        return UploadResponse(
+            doc_id=doc_id,
+            filename=file.filename,
+            chunks_created=0,
+            message="PDF uploaded and queued for re-ingestion",
+            job_id=job["job_id"]
+        )
+
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+
+    except DocumentBusyError as e:
+        await get_ingestion_queue().release_upload(file_path, file_hash, staged=True)
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+    except QueueFullError as e:
+        await get_ingestion_queue().release_upload(file_path, file_hash, staged=True)
+
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+
+    except Exception as e:
+        if staged:
+            await get_ingestion_queue().release_upload(file_path, file_hash, staged=True)
+        elif os.path.exists(file_path) and file_path.endswith(".part"):
+            os.remove(file_path)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error updating document: {str(e)}"
+        )
+
+
 @router.delete("/{doc_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_document(
     doc_id: str,
@@ -85,29 +200,33 @@ async def delete_document(
             detail="Document not found"
         )
     
+    if get_ingestion_queue().is_document_busy(doc_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Document is still being processed, try again later"
+        )
+    
     try:
         # Delete from vector store
-        vector_store = get_vector_store()
-        vector_store.delete_document(
+        await get_async_vector_store().adelete_document(
             user_id=current_user.id,
             doc_id=doc_id
         )
         
-        # Delete the file from disk if it exists
-        file_path = document.get("file_path")
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                # Log error but don't fail the request
-                logger.warning(f"Failed to delete file {file_path}: {str(e)}")
-        
         # Delete document record from database
         await db.documents.delete_one({
             "doc_id": doc_id,
             "user_id": ObjectId(current_user.id)
         })
         
+        # Delete the file from disk unless other documents share it
+        file_path = document.get("file_path")
+        try:
+            await get_ingestion_queue().release_upload(file_path, document.get("file_hash"))
+        except Exception as e:
+            # Log error but don't fail the request
+            logger.warning(f"Failed to delete file {file_path}: {str(e)}")
+        
         return None
     
     except Exception as e:
@@ -1,89 +1,287 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List
 import os
 import uuid
-import aiofiles
-from datetime import datetime, timezone
-from bson import ObjectId
+import zipfile
+import zlib
 
-from models.database import get_db
 from utils.auth import get_current_user
-from utils.schemas import UploadResponse, CurrentUser
-from utils.pdf_parser import get_pdf_metadata
-from rag.ingest import ingest_pdf
+from utils.schemas import (
+    UploadResponse,
+    BatchUploadResponse,
+    BatchFileResult,
+    IngestionJobStatus,
+    CurrentUser
+)
+from utils.uploads import (
+    save_upload_file,
+    save_stream,
+    staging_path,
+    UploadTooLargeError,
+    MAX_UPLOAD_BYTES,
+    MAX_BATCH_UPLOAD_BYTES,
+    MAX_BATCH_FILES
+)
+from rag.jobs import get_ingestion_queue, QueueFullError
 
 router = APIRouter(prefix="/upload", tags=["ingestion"])
 
-# Upload directory
-UPLOAD_DIR = "./data/uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-
-@router.post("", response_model=UploadResponse, status_code=status.HTTP_201_CREATED)
+@router.post("", response_model=UploadResponse, status_code=status.HTTP_202_ACCEPTED)
 async def upload_pdf(
     file: UploadFile = File(...),
-    current_user: CurrentUser = Depends(get_current_user),
-    db=Depends(get_db)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    """Upload and ingest a PDF file."""
+    """Upload a PDF file and queue it for background ingestion."""
     # Validate file type
     if not file.filename.endswith('.pdf'):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Only PDF files are supported"
         )
-    
+
     # Generate unique document ID
     doc_id = str(uuid.uuid4())
-    
-    # Save file
-    file_path = os.path.join(UPLOAD_DIR, f"{doc_id}_{file.filename}")
-    
+
+    # Stream to a staging file, hashing as we go (never holds the whole file in memory)
+    file_path = staging_path()
+    file_hash = None
+    staged = False
+
     try:
-        async with aiofiles.open(file_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
-        # Get file metadata
-        file_size = os.path.getsize(file_path)
-        pdf_metadata = get_pdf_metadata(file_path)
-        
-        # Ingest PDF (chunk, embed, store)
-        chunk_count = ingest_pdf(
-            pdf_path=file_path,
-            doc_id=doc_id,
+        file_size, file_hash = await save_upload_file(file, file_path)
+
+        # Identical files are stored once, keyed by their hash; the queue holds
+        # the blob until the job is submitted
+        file_path = get_ingestion_queue().stage_upload(file_path, file_hash)
+        staged = True
+
+        # Hand off to the ingestion worker pool (chunk, embed, store)
+        job = get_ingestion_queue().submit(
             user_id=current_user.id,
+            doc_id=doc_id,
             filename=file.filename,
-            metadata=pdf_metadata
+            file_path=file_path,
+            file_size=file_size,
+            file_hash=file_hash
         )
-        
-        # Save document record in database
-        document = {
-            "doc_id": doc_id,
-            "filename": file.filename,
-            "file_path": file_path,
-            "file_size": file_size,
-            "chunk_count": chunk_count,
-            "user_id": ObjectId(current_user.id),
-            "uploaded_at": datetime.now(timezone.utc),
-            "metadata": pdf_metadata
-        }
-        
-        await db.documents.insert_one(document)
-        
+        staged = False
+
         return UploadResponse(
             doc_id=doc_id,
             filename=file.filename,
-            chunks_created=chunk_count,
-            message="PDF uploaded and processed successfully"
+            chunks_created=0,
+            message="PDF uploaded and queued for processing",
+            job_id=job["job_id"]
+        )
+
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
         )
-    
+
+    except QueueFullError as e:
+        await get_ingestion_queue().release_upload(file_path, file_hash, staged=True)
+
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+
     except Exception as e:
-        # Clean up file if ingestion failed
-        if os.path.exists(file_path):
+        if staged:
+            await get_ingestion_queue().release_upload(file_path, file_hash, staged=True)
+        # Clean up the staging file if it never made it into the blob store
+        elif os.path.exists(file_path) and file_path.endswith(".part"):
             os.remove(file_path)
-        
+
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing PDF: {str(e)}"
         )
 
+
+# Errors raised while extracting a single ZIP member (corrupt or truncated
+# data, encryption, unsupported compression); only that member is rejected
+_ZIP_MEMBER_ERRORS = (zipfile.BadZipFile, RuntimeError, NotImplementedError, zlib.error, EOFError)
+
+
+def _stage_zip_members(zip_path: str, max_files: int, staged: List[Dict]) -> List[Dict]:
+    """
+    Stream every PDF member of a ZIP archive into the blob store.
+
+    Members are appended to ``staged`` as soon as they are stored, so the
+    caller releases them if the batch fails later on.
+
+    Returns:
+        Rejections (filename and error) of the PDF members that were not staged
+
+    Raises:
+        zipfile.BadZipFile: If the file is not a ZIP archive
+        UploadTooLargeError: If the PDF members expand to more than MAX_BATCH_UPLOAD_BYTES
+    """
+    rejected = []
+    with zipfile.ZipFile(zip_path) as archive:
+        members = []
+        for info in archive.infolist():
+            filename = os.path.basename(info.filename)
+            if info.is_dir() or info.filename.startswith("__MACOSX/") or filename.startswith("."):
+                continue
+            if filename.lower().endswith(".pdf"):
+                members.append((info, filename))
+
+        # Sizes are checked before extracting anything (zipfile stops reading a
+        # member at its declared size, so they cannot be understated)
+        if sum(info.file_size for info, _ in members[:max_files]) > MAX_BATCH_UPLOAD_BYTES:
+            raise UploadTooLargeError(f"ZIP archive expands to more than {MAX_BATCH_UPLOAD_BYTES} bytes")
+
+        for position, (info, filename) in enumerate(members):
+            if position >= max_files:
+                rejected.append({"filename": filename, "error": f"Batch exceeds {max_files} files"})
+                continue
+
+            member_path = staging_path()
+            try:
+                with archive.open(info) as member:
+                    file_size, file_hash = save_stream(member, member_path)
+                staged.append({
+                    "doc_id": str(uuid.uuid4()),
+                    "filename": filename,
+                    "file_path": get_ingestion_queue().stage_upload(member_path, file_hash),
+                    "file_size": file_size,
+                    "file_hash": file_hash,
+                })
+            except UploadTooLargeError as e:
+                rejected.append({"filename": filename, "error": str(e)})
+            except _ZIP_MEMBER_ERRORS as e:
+                rejected.append({"filename": filename, "error": f"Could not extract file from ZIP archive: {str(e)}"})
+            finally:
+                # Left behind only if the member was not moved into the blob store
+                if os.path.exists(member_path):
+                    os.remove(member_path)
+    return rejected
+
+
+@router.post("/batch", response_model=BatchUploadResponse, status_code=status.HTTP_202_ACCEPTED)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """
+    Upload many PDFs (and/or ZIP archives of PDFs) and ingest them as one job.
+
+    Chunks from all files share embedding batches, so bulk onboarding runs the
+    model at full batch size. Per-file results are returned immediately for
+    rejected files and via GET /upload/jobs/{job_id} for accepted ones.
+    """
+    staged = []
+    rejected = []
+
+    try:
+        for upload in files:
+            filename = upload.filename or ""
+            if not filename.lower().endswith((".pdf", ".zip")):
+                rejected.append(BatchFileResult(
+                    filename=filename,
+                    status="rejected",
+                    error="Only PDF and ZIP files are supported"
+                ))
+                continue
+
+            upload_path = staging_path()
+            max_bytes = MAX_BATCH_UPLOAD_BYTES if filename.lower().endswith(".zip") else MAX_UPLOAD_BYTES
+            try:
+                file_size, file_hash = await save_upload_file(upload, upload_path, max_bytes=max_bytes)
+            except UploadTooLargeError as e:
+                rejected.append(BatchFileResult(filename=filename, status="rejected", error=str(e)))
+                continue
+
+            if filename.lower().endswith(".pdf"):
+                if len(staged) >= MAX_BATCH_FILES:
+                    os.remove(upload_path)
+                    rejected.append(BatchFileResult(
+                        filename=filename,
+                        status="rejected",
+                        error=f"Batch exceeds {MAX_BATCH_FILES} files"
+                    ))
+                    continue
+                staged.append({
+                    "doc_id": str(uuid.uuid4()),
+                    "filename": filename,
+                    "file_path": get_ingestion_queue().stage_upload(upload_path, file_hash),
+                    "file_size": file_size,
+                    "file_hash": file_hash,
+                })
+                continue
+
+            # ZIP archive: extract PDF members off the event loop
+            try:
+                rejections = await run_in_threadpool(
+                    _stage_zip_members, upload_path, MAX_BATCH_FILES - len(staged), staged
+                )
+            except zipfile.BadZipFile:
+                rejected.append(BatchFileResult(filename=filename, status="rejected", error="Invalid ZIP archive"))
+                continue
+            except UploadTooLargeError as e:
+                rejected.append(BatchFileResult(filename=filename, status="rejected", error=str(e)))
+                continue
+            finally:
+                os.remove(upload_path)
+
+            for entry in rejections:
+                rejected.append(BatchFileResult(filename=entry["filename"], status="rejected", error=entry["error"]))
+
+        if not staged:
+            return BatchUploadResponse(
+                files=rejected,
+                accepted=0,
+                rejected=len(rejected),
+                message="No PDF files were accepted"
+            )
+
+        job = get_ingestion_queue().submit_batch(current_user.id, staged)
+
+    except QueueFullError as e:
+        for entry in staged:
+            await get_ingestion_queue().release_upload(entry["file_path"], entry["file_hash"], staged=True)
+
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+
+    except Exception as e:
+        for entry in staged:
+            await get_ingestion_queue().release_upload(entry["file_path"], entry["file_hash"], staged=True)
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing batch upload: {str(e)}"
+        )
+
+    return BatchUploadResponse(
+        job_id=job["job_id"],
+        files=[BatchFileResult.model_validate(file) for file in job["files"]] + rejected,
+        accepted=len(staged),
+        rejected=len(rejected),
+        message=f"{len(staged)} PDF files uploaded and queued for processing"
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobStatus)
+async def get_ingestion_job(
+    job_id: str,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Get the stage, progress and chunk count of an ingestion job."""
+    job = get_ingestion_queue().get_job(job_id, current_user.id)
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ingestion job not found"
+        )
+
+    return IngestionJobStatus.model_validate(job)
@@ -4,7 +4,7 @@ import json
 
 from utils.auth import get_current_user
 from utils.schemas import QueryRequest, QueryResponse, CurrentUser
-from rag.retrieve import retrieve_chunks
+from rag.retrieve import RETRIEVAL_MODES, aretrieve_chunks
 from rag.generate import generate_answer_stream, generate_answer
 
 router = APIRouter(prefix="/query", tags=["query"])
@@ -18,13 +18,21 @@ async def query_documents(
     """
     Query documents using RAG. Supports streaming and non-streaming responses.
     """
+    if request.mode is not None and request.mode not in RETRIEVAL_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid mode: {request.mode} (expected one of {', '.join(RETRIEVAL_MODES)})"
+        )
+    
     try:
-        # Retrieve relevant chunks
-        chunks = retrieve_chunks(
+        # Retrieve relevant chunks (in the vector store executor, so concurrent
+        # queries can share embedding batches)
+        chunks = await aretrieve_chunks(
             query=request.query,
             user_id=current_user.id,
             top_k=request.top_k,
-            doc_ids=request.doc_ids
+            doc_ids=request.doc_ids,
+            mode=request.mode
         )
         
         if not chunks:
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException
 
 from utils.auth import get_current_user
-from utils.schemas import SearchRequest, SearchResponse, CurrentUser
-from rag.retrieve import search_documents
+from utils.schemas import BatchSearchRequest, BatchSearchResponse, SearchRequest, SearchResponse, CurrentUser
+from rag.retrieve import RETRIEVAL_MODES, SEARCH_BATCH_MAX_QUERIES, asearch_documents, asearch_documents_batch
 
 router = APIRouter(prefix="/search", tags=["search"])
 
@@ -12,13 +12,18 @@ async def search_documents_endpoint(
     request: SearchRequest,
     current_user: CurrentUser = Depends(get_current_user),
 ):
-    """Perform semantic search across user's documents."""
+    """Perform semantic, keyword or hybrid search across user's documents."""
+    _check_mode(request)
+    
     try:
-        results = search_documents(
+        # Runs in the vector store executor, so concurrent searches can share
+        # embedding batches and a slow search does not block other requests
+        results = await asearch_documents(
             query=request.query,
             user_id=current_user.id,
             top_k=request.top_k,
-            doc_ids=request.doc_ids
+            doc_ids=request.doc_ids,
+            mode=request.mode
         )
         
         return SearchResponse(
@@ -33,3 +38,47 @@ async def search_documents_endpoint(
             detail=f"Error performing search: {str(e)}"
         )
 
+
+@router.post("/batch", response_model=BatchSearchResponse)
+async def batch_search_endpoint(
+    request: BatchSearchRequest,
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """
+    Run several searches in one request, each with its own top_k, doc_ids and mode.
+    Queries are embedded together and results are returned in request order.
+    """
+    if len(request.queries) > SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries: {len(request.queries)} (maximum {SEARCH_BATCH_MAX_QUERIES})"
+        )
+    for search in request.queries:
+        _check_mode(search)
+    
+    try:
+        results = await asearch_documents_batch(
+            requests=request.queries,
+            user_id=current_user.id
+        )
+        
+        return BatchSearchResponse(
+            results=[
+                SearchResponse(results=search_results, query=search.query, total=len(search_results))
+                for search, search_results in zip(request.queries, results)
+            ]
+        )
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error performing batch search: {str(e)}"
+        )
+
+
+def _check_mode(request: SearchRequest):
+    if request.mode is not None and request.mode not in RETRIEVAL_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid mode: {request.mode} (expected one of {', '.join(RETRIEVAL_MODES)})"
+        )
@@ -0,0 +1,88 @@
+"""
+Inspect and rebalance the sharded vector store (VECTOR_STORE_SHARDS > 1).
+
+  status                   Users assigned to each shard and each shard's size on disk
+  rebalance [--shards N]   Move every user to the shard they hash to for N shards
+                           (default: VECTOR_STORE_SHARDS); --dry-run only lists the moves
+  move <user_id> <shard>   Move one user's namespace to a shard
+
+To add shards, raise VECTOR_STORE_SHARDS and run rebalance. To remove
+shards, run rebalance --shards <new count> with the old count still
+configured, then lower VECTOR_STORE_SHARDS. Moves copy vectors without
+re-embedding. Stop the API server first: it caches shard assignments and
+must not write to users that are being moved.
+
+Usage (from the backend directory):
+    python shards.py status
+    python shards.py rebalance [--shards 4] [--dry-run]
+    python shards.py move <user_id> <shard>
+"""
+import argparse
+import json
+import logging
+import os
+
+from dotenv import load_dotenv
+
+
+def directory_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def shard_paths(store):
+    """Files and directories a shard store writes to."""
+    paths = [
+        getattr(store, "persist_directory", None),
+        getattr(store, "index_dir", None),
+        getattr(store, "compact_index_path", None)
+    ]
+    for index in (store.lexical_index, getattr(store, "doc_index", None)):
+        if index is not None:
+            paths.append(index.path)
+    return [path for path in paths if path and os.path.exists(path)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Show shard assignments and sizes")
+    rebalance_parser = subparsers.add_parser("rebalance", help="Move users to the shard they hash to")
+    rebalance_parser.add_argument("--shards", type=int, default=None, help="Shard count to balance for")
+    rebalance_parser.add_argument("--dry-run", action="store_true", help="Only list the moves")
+    move_parser = subparsers.add_parser("move", help="Move one user to a shard")
+    move_parser.add_argument("user_id", help="User to move")
+    move_parser.add_argument("shard", type=int, help="Target shard")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    from rag.sharding import ShardedVectorStore
+    from rag.vectorstore import VECTOR_STORE_SHARDS
+
+    store = ShardedVectorStore(shards=max(VECTOR_STORE_SHARDS, getattr(args, "shards", None) or 0))
+
+    if args.command == "status":
+        users = {}
+        for user_id in store.user_ids():
+            shard = store.shard_of(user_id)
+            users[shard] = users.get(shard, 0) + 1
+        for shard, shard_store in enumerate(store.shards):
+            size = sum(directory_size(path) for path in shard_paths(shard_store))
+            print(f"shard {shard}: {users.get(shard, 0)} users, {size / 2**20:.1f} MB")
+    elif args.command == "rebalance":
+        result = store.rebalance(shards=args.shards, dry_run=args.dry_run)
+        print(json.dumps(result, indent=2))
+    else:
+        if not 0 <= args.shard < len(store.shards):
+            parser.error(f"shard must be between 0 and {len(store.shards) - 1}")
+        print(f"Moved {store.move_user(args.user_id, args.shard)} chunks")
+
+
+if __name__ == "__main__":
+    main()
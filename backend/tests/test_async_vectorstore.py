@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+import pytest
+
+from rag.async_vectorstore import AsyncVectorStore
+
+
+@pytest.fixture
+def store():
+    store = AsyncVectorStore(workers=4, max_concurrency=1)
+    yield store
+    store.shutdown()
+
+
+async def _settle():
+    """Let executor callbacks scheduled on the loop run."""
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+
+def test_cancelled_call_keeps_its_slot_until_the_work_ends(store):
+    async def run():
+        release = threading.Event()
+        first = asyncio.create_task(store.run(release.wait, 5))
+        await _settle()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        # The cancelled call is still running in the executor, so the next one waits
+        second = asyncio.create_task(store.run(lambda: "ok"))
+        await _settle()
+        assert not second.done()
+        assert (store.stats()["running"], store.stats()["queued"]) == (1, 1)
+
+        release.set()
+        assert await asyncio.wait_for(second, 5) == "ok"
+        await _settle()
+        stats = store.stats()
+        assert (stats["running"], stats["queued"], stats["calls"], stats["errors"]) == (0, 0, 2, 0)
+
+    asyncio.run(run())
+
+
+def test_failed_call_frees_its_slot_and_counts_as_an_error(store):
+    async def run():
+        with pytest.raises(ZeroDivisionError):
+            await store.run(lambda: 1 / 0)
+        assert await store.run(lambda: "ok") == "ok"
+        await _settle()
+        stats = store.stats()
+        assert (stats["running"], stats["queued"], stats["calls"], stats["errors"]) == (0, 0, 2, 1)
+
+    asyncio.run(run())
+
+
+def test_cancelled_queued_call_leaves_the_queue(store):
+    async def run():
+        release = threading.Event()
+        first = asyncio.create_task(store.run(release.wait, 5))
+        await _settle()
+        queued = asyncio.create_task(store.run(lambda: "never"))
+        await _settle()
+        assert store.stats()["queued"] == 1
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert store.stats()["queued"] == 0
+
+        release.set()
+        assert await first is True
+        assert await store.run(lambda: "ok") == "ok"
+        await _settle()
+        stats = store.stats()
+        assert (stats["running"], stats["queued"], stats["calls"]) == (0, 0, 2)
+
+    asyncio.run(run())
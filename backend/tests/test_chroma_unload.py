@@ -0,0 +1,44 @@
+"""
+CHROMA_UNLOAD_COLLECTIONS relies on private ChromaDB internals (the segment
+manager's caches); these tests fail if a chromadb upgrade changes them.
+"""
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+
+from rag.vectorstore import chroma_collection_bytes, unload_chroma_collection
+
+
+def _client(path):
+    return chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+
+
+def test_segment_manager_internals_exist(tmp_path):
+    manager = _client(tmp_path)._server._manager
+    assert hasattr(manager, "_lock")
+    assert isinstance(manager._segment_cache, dict)
+    assert isinstance(manager._instances, dict)
+    assert isinstance(manager._vector_instances_file_handle_cache.cache, dict)
+
+
+def test_unloaded_collection_is_dropped_and_reloads(tmp_path):
+    client = _client(tmp_path)
+    collection = client.create_collection("user_test")
+    vectors = np.random.default_rng(0).standard_normal((200, 16)).astype(np.float32)
+    collection.add(ids=[f"chunk_{i}" for i in range(200)], embeddings=vectors.tolist())
+    before = collection.query(query_embeddings=vectors[:3].tolist(), n_results=5)
+
+    manager = client._server._manager
+    assert chroma_collection_bytes(client, collection.id) > 200 * 16 * 4
+    segment_ids = [segment["id"] for segment in manager._segment_cache[collection.id].values()]
+    assert segment_ids and all(segment_id in manager._instances for segment_id in segment_ids)
+
+    unload_chroma_collection(client, collection.id)
+    assert collection.id not in manager._segment_cache
+    assert not any(segment_id in manager._instances for segment_id in segment_ids)
+    assert collection.id not in manager._vector_instances_file_handle_cache.cache
+
+    # Reopened from disk on next use, with nothing lost
+    assert collection.query(query_embeddings=vectors[:3].tolist(), n_results=5)["ids"] == before["ids"]
+    collection.add(ids=["chunk_new"], embeddings=[vectors[0].tolist()])
+    assert collection.count() == 201
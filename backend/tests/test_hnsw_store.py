@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import rag.hnsw_store as hnsw_store
+from rag.hnsw_store import HnswVectorStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Documents are added with precomputed embeddings, so no model is loaded
+    monkeypatch.setattr(hnsw_store, "get_embedding_model", lambda: None)
+    monkeypatch.setattr(hnsw_store, "COPY_PAGE_SIZE", 10)
+    return HnswVectorStore(index_dir=str(tmp_path / "hnsw"), lexical_index_path=str(tmp_path / "lexical.sqlite3"))
+
+
+def _add(store, user_id, doc_id, count, seed=0):
+    ids = [f"{doc_id}_chunk_{i}" for i in range(count)]
+    store.add_documents(
+        user_id, doc_id, [f"text {i}" for i in range(count)],
+        [{"doc_id": doc_id, "chunk_id": chunk_id, "chunk_index": i} for i, chunk_id in enumerate(ids)],
+        ids, np.random.default_rng(seed).standard_normal((count, 16)).astype(np.float32)
+    )
+
+
+def test_copy_document_copies_every_page(store):
+    _add(store, "source", "doc", 25)
+    assert store.copy_document("source", "doc", "target", "copy") == 25
+    assert len(store.get_document_chunks("target", "copy")) == 25
+
+
+def test_copy_document_survives_source_deleted_between_pages(store):
+    _add(store, "source", "doc", 25)
+
+    class DeletingTarget:
+        """Target store that deletes the source document after the first page arrives."""
+
+        def __init__(self):
+            self.pages = []
+
+        def add_documents(self, user_id, doc_id, texts, metadatas, ids, embeddings):
+            self.pages.append(ids)
+            if len(self.pages) == 1:
+                store.delete_document("source", "doc")
+
+    target = DeletingTarget()
+    assert store.copy_document("source", "doc", "target", "copy", target_store=target) == 10
+    assert len(target.pages) == 1
@@ -0,0 +1,70 @@
+import random
+import re
+
+import pytest
+
+from rag.ingest import chunk_spans, chunk_text, iter_chunks
+from rag.text_splitter import split_spans
+
+
+def _random_pages(rng: random.Random) -> list:
+    """Random page texts mixing every separator, including pages that start or end with newlines and blank pages."""
+    separators = ["\n\n", "\n", ". ", " ", "\n\n\n"]
+    pages = []
+    for _ in range(rng.randint(1, 8)):
+        page = "".join(
+            " ".join("x" * rng.randint(1, 12) for _ in range(rng.randint(1, 40))) + rng.choice(separators)
+            for _ in range(rng.randint(0, 30))
+        )
+        if rng.random() < 0.2:
+            page = "\n" + page
+        if rng.random() < 0.2:
+            page += "\n"
+        pages.append("   " if rng.random() < 0.1 else page)
+    return pages
+
+
+def _whitespace_tokens(texts):
+    return [[match.start() for match in re.finditer(r"\S+", text)] for text in texts]
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_iter_chunks_matches_chunk_text(seed):
+    rng = random.Random(seed)
+    pages = _random_pages(rng)
+    chunk_size = rng.choice([50, 100, 300, 800])
+    chunk_overlap = rng.randint(0, chunk_size // 2)
+    text = "\n\n".join(page for page in pages if page.strip())
+
+    streamed = list(iter_chunks(pages, chunk_size, chunk_overlap))
+
+    assert [chunk for chunk, _ in streamed] == chunk_text(text, chunk_size, chunk_overlap)
+    assert [(position["start_offset"], position["end_offset"]) for _, position in streamed] == [
+        (start, end) for start, end, _ in chunk_spans(text, chunk_size, chunk_overlap)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_iter_chunks_matches_split_spans_in_token_mode(seed):
+    rng = random.Random(seed)
+    pages = _random_pages(rng)
+    chunk_size = rng.choice([10, 30, 100])
+    chunk_overlap = rng.randint(0, chunk_size // 2)
+    text = "\n\n".join(page for page in pages if page.strip())
+    expected = split_spans(text, chunk_size, chunk_overlap, token_starts=_whitespace_tokens([text])[0])
+
+    streamed = list(iter_chunks(pages, chunk_size, chunk_overlap, tokenizer=_whitespace_tokens))
+
+    assert [(position["start_offset"], position["end_offset"]) for _, position in streamed] == expected
+    assert [chunk for chunk, _ in streamed] == [text[start:end] for start, end in expected]
+
+
+def test_iter_chunks_reports_document_pages():
+    pages = ["alpha " * 30, "", "beta " * 30]
+
+    positions = [position for _, position in iter_chunks(pages, 100, 20)]
+
+    assert positions[0]["page"] == 1
+    assert positions[-1]["page_end"] == 3
+    # A blank page never starts or ends a chunk
+    assert all(2 not in (position["page"], position["page_end"]) for position in positions)
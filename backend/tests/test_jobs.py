@@ -0,0 +1,261 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import rag.jobs as jobs
+from rag.jobs import FILE_FAILED, FILE_QUEUED, STAGE_EMBEDDING, IngestionJobQueue
+
+
+def _crash(*args):
+    os._exit(1)
+
+
+def _echo(value):
+    return {"value": value}
+
+
+class FakeStore:
+    """Records vector store writes; on_add runs in the middle of add_documents."""
+
+    def __init__(self, on_add=None):
+        self.on_add = on_add
+        self.added = []
+        self.deleted = []
+
+    def add_documents(self, user_id, doc_id, texts, metadatas, ids, embeddings):
+        if self.on_add is not None:
+            self.on_add()
+        self.added.extend(ids)
+
+    def delete_chunks(self, user_id, ids):
+        self.deleted.extend(ids)
+
+
+def _queue_with_job(status: str = FILE_QUEUED) -> IngestionJobQueue:
+    queue = IngestionJobQueue(workers=1)
+    queue._jobs["job"] = {
+        "job_id": "job",
+        "user_id": "user",
+        "stage": STAGE_EMBEDDING,
+        "files": [{"doc_id": "doc", "file_hash": "hash", "status": status}],
+        "store_errors": {},
+        "batches_stored": 0,
+    }
+    return queue
+
+
+def test_worker_crash_replaces_the_pool():
+    async def run():
+        queue = IngestionJobQueue(workers=1)
+        await queue.start()
+        try:
+            broken = queue._executor
+            with pytest.raises(BrokenProcessPool):
+                await queue._run_in_worker(_crash)
+            assert queue._executor is not broken
+            assert await queue._run_in_worker(_echo, 7) == {"value": 7}
+        finally:
+            await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_batches_of_a_failed_file_are_dropped(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(jobs, "get_vector_store", lambda: store)
+    queue = _queue_with_job(status=FILE_FAILED)
+
+    queue._store_batch("job", "doc", ["text"], [{}], ["doc_chunk_0"], None)
+
+    assert store.added == []
+    assert queue._jobs["job"]["batches_stored"] == 1
+
+
+def test_batch_stored_while_its_file_fails_is_deleted(monkeypatch):
+    queue = _queue_with_job()
+
+    def fail_file():
+        queue._update_file("job", "doc", status=FILE_FAILED)
+
+    store = FakeStore(on_add=fail_file)
+    monkeypatch.setattr(jobs, "get_vector_store", lambda: store)
+
+    queue._store_batch("job", "doc", ["text"], [{}], ["doc_chunk_0"], None)
+
+    assert store.added == ["doc_chunk_0"]
+    assert store.deleted == ["doc_chunk_0"]
+
+
+class ChunkStore:
+    """In-memory vector store holding one user's chunks: ID -> (doc_id, text, metadata)."""
+
+    def __init__(self):
+        self.chunks = {}
+
+    def add_documents(self, user_id, doc_id, texts, metadatas, ids, embeddings):
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            self.chunks[chunk_id] = (doc_id, text, dict(metadata))
+
+    def get_document_chunks(self, user_id, doc_id):
+        return {chunk_id: text for chunk_id, (chunk_doc_id, text, _) in self.chunks.items() if chunk_doc_id == doc_id}
+
+    def update_chunk_metadatas(self, user_id, ids, metadatas):
+        for chunk_id, metadata in zip(ids, metadatas):
+            doc_id, text, _ = self.chunks[chunk_id]
+            self.chunks[chunk_id] = (doc_id, text, dict(metadata))
+
+    def delete_chunks(self, user_id, ids):
+        for chunk_id in ids:
+            self.chunks.pop(chunk_id, None)
+
+    def delete_document(self, user_id, doc_id, revision=None):
+        for chunk_id, (chunk_doc_id, _, metadata) in list(self.chunks.items()):
+            if chunk_doc_id == doc_id and (revision is None or metadata.get("revision") == revision):
+                del self.chunks[chunk_id]
+
+
+class InlineAsyncStore:
+    """Async facade stand-in that runs calls inline."""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def run(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    async def adelete_document(self, user_id, doc_id, revision=None):
+        self.store.delete_document(user_id, doc_id, revision)
+
+
+class FailingUpdates:
+    """documents collection whose update_one fails (e.g. Mongo unavailable)."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def update_one(self, *args, **kwargs):
+        raise RuntimeError("mongo unavailable")
+
+
+USER_ID = "65f000000000000000000001"
+
+
+def _run_update(tmp_path, monkeypatch, mongo_fails: bool):
+    """
+    Update a 4-chunk document (revision 0) to a version that keeps chunks 0-1,
+    drops 2-3 and adds one chunk. Returns (store, stored document, job, paths).
+    """
+    from bson import ObjectId
+    from mongomock_motor import AsyncMongoMockClient
+
+    database = AsyncMongoMockClient()["documind"]
+    documents = database.documents
+    db = type("Db", (), {"documents": FailingUpdates(documents) if mongo_fails else documents})()
+    store = ChunkStore()
+    monkeypatch.setattr(jobs, "get_db", lambda: db)
+    monkeypatch.setattr(jobs, "get_vector_store", lambda: store)
+    monkeypatch.setattr(jobs, "get_async_vector_store", lambda: InlineAsyncStore(store))
+
+    old_path, new_path = tmp_path / "old.pdf", tmp_path / "new.pdf"
+    old_path.write_bytes(b"old")
+    new_path.write_bytes(b"new")
+    for i in range(4):
+        store.add_documents(USER_ID, "doc", [f"text {i}"], [{"doc_id": "doc", "chunk_index": i}], [f"doc_chunk_{i}"], None)
+    previous = {
+        "doc_id": "doc", "user_id": ObjectId(USER_ID), "filename": "v1.pdf", "file_path": str(old_path),
+        "file_hash": "old", "chunk_count": 4, "revision": 0,
+    }
+
+    async def run():
+        await documents.insert_one(dict(previous))
+        queue = IngestionJobQueue(workers=1)
+        queue._queue = asyncio.Queue()
+
+        async def worker(fn, job_id, user_id, document, existing_hashes, revision):
+            assert sorted(existing_hashes) == [f"doc_chunk_{i}" for i in range(4)]
+            # The new chunk arrives as a batch on the event queue, as from a worker process
+            queue._store_batch(
+                job_id, "doc", ["text new"], [{"doc_id": "doc", "chunk_index": 2, "revision": revision}],
+                ["doc_chunk_2_r1"], None
+            )
+            kept = [(f"doc_chunk_{i}", {"doc_id": "doc", "chunk_index": i, "revision": revision}) for i in range(2)]
+            result = {
+                "chunk_count": 3, "pdf_metadata": {}, "chunk_stats": {"truncated_chunks": 0},
+                "kept": kept, "added": 1, "removed": ["doc_chunk_2", "doc_chunk_3"],
+            }
+            return {"batches": 1, "result": result, "error": None}
+
+        queue._run_in_worker = worker
+        job = queue.submit_update(USER_ID, previous, {
+            "filename": "v2.pdf", "file_path": str(new_path), "file_size": 3, "file_hash": "new",
+        })
+        await queue._process(job["job_id"])
+        return await documents.find_one({"doc_id": "doc"}), queue.get_job(job["job_id"], USER_ID)
+
+    document, job = asyncio.run(run())
+    return store, document, job, (old_path, new_path)
+
+
+def test_update_applies_kept_added_and_removed_chunks(tmp_path, monkeypatch):
+    store, document, job, (old_path, new_path) = _run_update(tmp_path, monkeypatch, mongo_fails=False)
+
+    assert job["stage"] == "completed"
+    assert job["diff"] == {"kept": 2, "added": 1, "removed": 2}
+    assert sorted(store.chunks) == ["doc_chunk_0", "doc_chunk_1", "doc_chunk_2_r1"]
+    assert {metadata["revision"] for _, _, metadata in store.chunks.values()} == {1}
+    assert (document["revision"], document["file_hash"], document["chunk_count"]) == (1, "new", 3)
+    assert new_path.exists() and not old_path.exists()
+
+
+def test_failed_update_rolls_back_to_the_previous_version(tmp_path, monkeypatch):
+    store, document, job, (old_path, new_path) = _run_update(tmp_path, monkeypatch, mongo_fails=True)
+
+    assert job["stage"] == "failed"
+    assert "mongo unavailable" in job["error"]
+    # Every chunk of the previous version is intact, with its previous metadata
+    assert sorted(store.chunks) == [f"doc_chunk_{i}" for i in range(4)]
+    assert all("revision" not in metadata for _, _, metadata in store.chunks.values())
+    assert (document["revision"], document["file_hash"]) == (0, "old")
+    assert old_path.exists() and not new_path.exists()
+
+
+def test_staged_upload_survives_a_concurrent_release(tmp_path, monkeypatch):
+    from mongomock_motor import AsyncMongoMockClient
+
+    import utils.uploads as uploads
+
+    monkeypatch.setattr(uploads, "BLOB_DIR", str(tmp_path / "blobs"))
+    database = AsyncMongoMockClient()["documind"]
+    monkeypatch.setattr(jobs, "get_db", lambda: database)
+
+    async def run():
+        queue = IngestionJobQueue(workers=1)
+        queue._queue = asyncio.Queue()
+        staged = tmp_path / "upload.part"
+
+        # A document sharing the hash is deleted while this upload is staged
+        staged.write_bytes(b"pdf")
+        path = queue.stage_upload(str(staged), "hash")
+        await queue.release_upload(path, "hash")
+        assert os.path.exists(path)
+
+        # Once queued, the job holds the upload instead
+        queue.submit(USER_ID, "doc", "f.pdf", path, 3, "hash")
+        assert queue._staged_hashes == {}
+        await queue.release_upload(path, "hash")
+        assert os.path.exists(path)
+
+        # Giving up a staged upload nobody else holds deletes it
+        other = tmp_path / "other.part"
+        other.write_bytes(b"other")
+        other_path = queue.stage_upload(str(other), "other")
+        await queue.release_upload(other_path, "other", staged=True)
+        assert not os.path.exists(other_path)
+        assert queue._staged_hashes == {}
+
+    asyncio.run(run())
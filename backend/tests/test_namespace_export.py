@@ -0,0 +1,111 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import rag.namespace_export as namespace_export
+from rag.namespace_export import CHUNKS_FILE, export_namespace, import_namespace
+
+
+class MemoryStore:
+    """In-memory stand-in for the vector store's paging, add and delete API."""
+
+    def __init__(self, fail_on_add: int = 0):
+        self.chunks = {}
+        self.fail_on_add = fail_on_add
+        self.adds = 0
+
+    def add_documents(self, user_id, doc_id, texts, metadatas, ids, embeddings):
+        self.adds += 1
+        if self.adds == self.fail_on_add:
+            raise RuntimeError("store unavailable")
+        for chunk_id, text, metadata, embedding in zip(ids, texts, metadatas, embeddings):
+            self.chunks[(user_id, chunk_id)] = (text, metadata, np.array(embedding))
+
+    def delete_chunks(self, user_id, ids):
+        for chunk_id in ids:
+            self.chunks.pop((user_id, chunk_id), None)
+
+    def _rows(self, user_id):
+        return sorted((key[1], value) for key, value in self.chunks.items() if key[0] == user_id)
+
+    def iter_chunks(self, user_id):
+        rows = self._rows(user_id)
+        if rows:
+            yield [(chunk_id, metadata["doc_id"], text) for chunk_id, (text, metadata, _) in rows]
+
+    def iter_vectors(self, user_id):
+        rows = self._rows(user_id)
+        if rows:
+            yield (
+                [chunk_id for chunk_id, _ in rows],
+                [text for _, (text, _, _) in rows],
+                [metadata for _, (_, metadata, _) in rows],
+                np.vstack([embedding for _, (_, _, embedding) in rows]).astype(np.float32)
+            )
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(namespace_export, "COPY_PAGE_SIZE", 2)
+    source = MemoryStore()
+    vectors = np.random.default_rng(0).standard_normal((5, 8)).astype(np.float32)
+    source.add_documents(
+        "source", "doc", [f"text {i}" for i in range(5)],
+        [{"doc_id": f"doc_{i // 2}", "user_id": "source"} for i in range(5)],
+        [f"chunk_{i}" for i in range(5)], vectors
+    )
+    directory = str(tmp_path / "export")
+    export_namespace("source", directory, store=source)
+    return directory
+
+
+def _rewrite_chunks(directory, edit):
+    path = f"{directory}/{CHUNKS_FILE}"
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        lines = f.readlines()
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.writelines(edit(lines))
+
+
+def test_round_trip(export_dir):
+    target = MemoryStore()
+    manifest = import_namespace("target", export_dir, store=target)
+    assert manifest["chunks"] == 5
+    assert len(target._rows("target")) == 5
+    assert all(metadata["user_id"] == "target" for _, (_, metadata, _) in target._rows("target"))
+
+
+@pytest.mark.parametrize("break_export", ["bad_line", "extra_chunks", "store_error"])
+def test_failed_import_is_rolled_back_and_can_be_retried(export_dir, break_export):
+    target = MemoryStore()
+    original = None
+    if break_export == "bad_line":
+        def edit(lines):
+            nonlocal original
+            original = list(lines)
+            return lines[:3] + ["{not json\n"] + lines[4:]
+
+        _rewrite_chunks(export_dir, edit)
+    elif break_export == "extra_chunks":
+        # More chunks than vector rows: found on the last page, after two pages were added
+        def edit(lines):
+            nonlocal original
+            original = list(lines)
+            return lines + [lines[0].replace("chunk_0", "chunk_5")]
+
+        _rewrite_chunks(export_dir, edit)
+    else:
+        target.fail_on_add = 3
+
+    with pytest.raises((ValueError, RuntimeError)):
+        import_namespace("target", export_dir, store=target)
+    assert target._rows("target") == []
+
+    # Repair the export (or the store) and retry
+    if original is not None:
+        _rewrite_chunks(export_dir, lambda lines: original)
+    target.fail_on_add = 0
+    import_namespace("target", export_dir, store=target)
+    assert len(target._rows("target")) == 5
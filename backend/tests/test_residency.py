@@ -0,0 +1,59 @@
+import threading
+
+import numpy as np
+
+import rag.compact_index as compact_index
+from rag.compact_index import CompactVectorIndex
+from rag.residency import IndexResidency
+
+
+def test_sharded_compact_indexes_evict_each_other_without_deadlock(tmp_path, monkeypatch):
+    residency = IndexResidency(budget_bytes=200_000)
+    monkeypatch.setattr(compact_index, "get_index_residency", lambda: residency)
+    shards = [
+        CompactVectorIndex(storage="int8", path=str(tmp_path / f"compact_{shard}.sqlite3"), residency_kind=f"compact:{shard}")
+        for shard in range(2)
+    ]
+    errors = []
+
+    def work(shard: int):
+        rng = np.random.default_rng(shard)
+        index = shards[shard]
+        try:
+            for step in range(40):
+                user_id = f"user_{shard}_{step % 4}"
+                ids = [f"{user_id}_{step}_{i}" for i in range(50)]
+                index.add(user_id, ids, ["doc"] * len(ids), rng.standard_normal((len(ids), 384)))
+                index.search(user_id, rng.standard_normal(384), 5)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(shard,), daemon=True) for shard in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=20)
+
+    assert not any(thread.is_alive() for thread in threads), "shards deadlocked evicting each other"
+    assert errors == []
+    residency.wait_evictions()
+    assert residency.stats()["evictions"] > 0
+
+
+def test_reloaded_index_is_not_evicted_by_a_stale_victim():
+    residency = IndexResidency(budget_bytes=100)
+    evicted = []
+    release = threading.Event()
+
+    def evict(user_id):
+        release.wait(5)
+        evicted.append(user_id)
+
+    residency.register("kind", evict)
+    residency.admit("kind", "a", 80)
+    residency.admit("kind", "b", 80)  # Queues "a" for eviction; its callback blocks
+    residency.admit("kind", "c", 80)  # Queues "b"
+    residency.admit("kind", "b", 10)  # "b" reloaded before its queued eviction ran
+    release.set()
+    residency.wait_evictions()
+    assert evicted == ["a"]
@@ -0,0 +1,152 @@
+import os
+import zipfile
+
+import pytest
+
+import routes.ingestion as ingestion
+import utils.uploads as uploads
+from rag.jobs import get_ingestion_queue
+from routes.ingestion import _stage_zip_members
+from utils.uploads import UploadTooLargeError
+
+
+@pytest.fixture
+def upload_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(uploads, "STAGING_DIR", str(tmp_path / "staging"))
+    return tmp_path
+
+
+def _write_zip(path, members):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+
+
+def _corrupt_member(path, data: bytes):
+    """Flip a byte of a stored member's data, so reading it fails its CRC check."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    offset = raw.index(data)
+    with open(path, "wb") as f:
+        f.write(raw[:offset] + bytes([raw[offset] ^ 0xFF]) + raw[offset + 1:])
+
+
+def test_bad_zip_member_is_rejected_and_the_rest_staged(upload_dirs):
+    zip_path = str(upload_dirs / "batch.zip")
+    _write_zip(zip_path, [("good.pdf", b"%PDF-good"), ("bad.pdf", b"%PDF-bad-member"), ("notes.txt", b"x")])
+    _corrupt_member(zip_path, b"%PDF-bad-member")
+
+    staged = []
+    rejected = _stage_zip_members(zip_path, max_files=10, staged=staged)
+
+    assert [entry["filename"] for entry in staged] == ["good.pdf"]
+    assert os.path.exists(staged[0]["file_path"])
+    assert [entry["filename"] for entry in rejected] == ["bad.pdf"]
+    assert "Bad CRC-32" in rejected[0]["error"]
+    assert os.listdir(uploads.STAGING_DIR) == []
+
+    queue = get_ingestion_queue()
+    assert queue._staged_hashes.get(staged[0]["file_hash"]) == 1
+    queue._unstage([staged[0]["file_hash"]])
+
+
+def test_zip_expanding_past_the_batch_limit_is_rejected_before_extraction(upload_dirs, monkeypatch):
+    monkeypatch.setattr(ingestion, "MAX_BATCH_UPLOAD_BYTES", 100)
+    zip_path = str(upload_dirs / "batch.zip")
+    _write_zip(zip_path, [("a.pdf", b"a" * 60), ("b.pdf", b"b" * 60)])
+
+    staged = []
+    with pytest.raises(UploadTooLargeError):
+        _stage_zip_members(zip_path, max_files=10, staged=staged)
+    assert staged == []
+    assert not os.path.exists(uploads.BLOB_DIR)
+
+
+def _upload_app(max_bytes: int, handled: list):
+    from fastapi import FastAPI, File, UploadFile
+
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        handled.append(file.filename)
+        return {"ok": True}
+
+    app.add_middleware(uploads.UploadSizeLimitMiddleware, limits=[("POST", r"/upload/?", max_bytes)])
+    return app
+
+
+def _multipart_chunks(size: int, chunk_size: int = 1024):
+    boundary = "boundary"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"f.pdf\"\r\n"
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode() + b"x" * size + f"\r\n--{boundary}--\r\n".encode()
+    chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+    return f"multipart/form-data; boundary={boundary}", chunks
+
+
+def _post(app, content_type: str, chunks, content_length=None):
+    """Send a streamed request through the ASGI app; returns (status, body chunks read)."""
+    import asyncio
+
+    headers = [(b"content-type", content_type.encode())]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/upload", "raw_path": b"/upload", "query_string": b"",
+        "root_path": "", "headers": headers, "client": ("test", 1), "server": ("test", 80),
+    }
+    read = 0
+    statuses = []
+
+    async def receive():
+        nonlocal read
+        read += 1
+        if read > len(chunks):
+            return {"type": "http.disconnect"}
+        return {"type": "http.request", "body": chunks[read - 1], "more_body": read < len(chunks)}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    asyncio.run(app(scope, receive, send))
+    return statuses[0], read
+
+
+def test_upload_over_the_limit_is_aborted_while_streaming(monkeypatch):
+    monkeypatch.setattr(uploads, "MULTIPART_OVERHEAD_BYTES", 1024)
+    handled = []
+    app = _upload_app(max_bytes=10 * 1024, handled=handled)
+
+    content_type, chunks = _multipart_chunks(100 * 1024)
+    status, read = _post(app, content_type, chunks)
+
+    assert status == 413
+    assert read <= 12
+    assert handled == []
+
+
+def test_declared_length_over_the_limit_is_rejected_before_reading(monkeypatch):
+    monkeypatch.setattr(uploads, "MULTIPART_OVERHEAD_BYTES", 1024)
+    handled = []
+    app = _upload_app(max_bytes=10 * 1024, handled=handled)
+
+    content_type, chunks = _multipart_chunks(100 * 1024)
+    status, read = _post(app, content_type, chunks, content_length=sum(map(len, chunks)))
+
+    assert (status, read, handled) == (413, 0, [])
+
+
+def test_upload_within_the_limit_is_handled(monkeypatch):
+    monkeypatch.setattr(uploads, "MULTIPART_OVERHEAD_BYTES", 1024)
+    handled = []
+    app = _upload_app(max_bytes=10 * 1024, handled=handled)
+
+    content_type, chunks = _multipart_chunks(8 * 1024)
+    status, _ = _post(app, content_type, chunks)
+
+    assert (status, handled) == (200, ["f.pdf"])
@@ -20,6 +20,9 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 30  # Changed from 30 minutes to 30 days
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# Usernames allowed to call the /admin endpoints (comma-separated; empty disables them)
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -155,3 +158,12 @@ async def get_current_user(
         email=user["email"],
     )
 
+
+async def get_admin_user(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    """Get the current user, who must be listed in ADMIN_USERNAMES."""
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return current_user
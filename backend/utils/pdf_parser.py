@@ -1,39 +1,139 @@
 import fitz  # PyMuPDF
-from typing import List, Dict
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterator, Tuple
+import multiprocessing
 import hashlib
 import os
 
+# Documents with at least this many pages are extracted by a process pool
+PARALLEL_EXTRACT_MIN_PAGES = int(os.getenv("PARALLEL_EXTRACT_MIN_PAGES", "200"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
 
-def extract_text_from_pdf(pdf_path: str) -> str:
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) (runs in a worker process)."""
+    doc = fitz.open(pdf_path)
+    try:
+        return [doc[page_num].get_text() for page_num in range(start, end)]
+    finally:
+        doc.close()
+
+
+def _iter_pages_parallel(pdf_path: str, page_count: int, max_workers: int) -> Iterator[str]:
     """
-    Extract all text from a PDF file.
+    Split the page range across a process pool and yield pages in order.
+    
+    Only a small window of ranges is in flight at a time, so a slow consumer
+    does not cause the whole document to pile up in memory.
+    """
+    # A few ranges per worker keeps the pool busy when page costs are uneven
+    range_count = min(page_count, max_workers * 4)
+    step = -(-page_count // range_count)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    window = max_workers * 2
+    
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as executor:
+        pending = deque()
+        for start, end in ranges:
+            pending.append(executor.submit(_extract_page_range, pdf_path, start, end))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _iter_pages_serial(doc) -> Iterator[str]:
+    """Yield page texts from an open document, closing it when done."""
+    try:
+        for page in doc:
+            yield page.get_text()
+    finally:
+        doc.close()
+
+
+def stream_pdf(
+    pdf_path: str,
+    parallel_min_pages: int = PARALLEL_EXTRACT_MIN_PAGES,
+    max_workers: int = PDF_EXTRACT_WORKERS
+) -> Tuple[Dict, Iterator[str]]:
+    """
+    Open a PDF once and return its metadata plus a lazy iterator over page text.
+    
+    For small documents the same open document serves metadata and page text.
+    Documents with at least ``parallel_min_pages`` pages are split into page
+    ranges extracted by a process pool.
     
     Args:
         pdf_path: Path to the PDF file
+        parallel_min_pages: Page count from which extraction is parallelized
+        max_workers: Number of worker processes for parallel extraction
         
     Returns:
-        Extracted text as a string
+        Tuple of (metadata with the same keys as get_pdf_metadata, page iterator)
+    """
+    doc = fitz.open(pdf_path)
+    info = doc.metadata or {}
+    page_count = len(doc)
+    metadata = {
+        "title": info.get("title", ""),
+        "author": info.get("author", ""),
+        "subject": info.get("subject", ""),
+        "page_count": page_count,
+        "file_size": os.path.getsize(pdf_path),
+    }
+    
+    if max_workers > 1 and page_count >= parallel_min_pages:
+        doc.close()
+        return metadata, _iter_pages_parallel(pdf_path, page_count, max_workers)
+    return metadata, _iter_pages_serial(doc)
+
+
+def extract_pdf(
+    pdf_path: str,
+    parallel_min_pages: int = PARALLEL_EXTRACT_MIN_PAGES,
+    max_workers: int = PDF_EXTRACT_WORKERS
+) -> Dict:
+    """
+    Extract metadata and per-page text from a PDF in a single pass.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        parallel_min_pages: Page count from which extraction is parallelized
+        max_workers: Number of worker processes for parallel extraction
+        
+    Returns:
+        Dict with "metadata" (same keys as get_pdf_metadata) and "pages"
+        (list of page texts, one entry per page)
         
     Raises:
         Exception: If PDF cannot be read or parsed
     """
     try:
-        doc = fitz.open(pdf_path)
-        text_parts = []
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text()
-            if text.strip():
-                text_parts.append(text)
-        
-        doc.close()
-        return "\n\n".join(text_parts)
-    
+        metadata, pages = stream_pdf(pdf_path, parallel_min_pages, max_workers)
+        return {"metadata": metadata, "pages": list(pages)}
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
 
+def extract_text_from_pdf(pdf_path: str) -> str:
+    """
+    Extract all text from a PDF file.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        
+    Returns:
+        Extracted text as a string
+        
+    Raises:
+        Exception: If PDF cannot be read or parsed
+    """
+    pages = extract_pdf(pdf_path)["pages"]
+    return "\n\n".join(text for text in pages if text.strip())
+
+
 def get_pdf_metadata(pdf_path: str) -> Dict:
     """
     Extract metadata from a PDF file.
@@ -59,6 +59,44 @@ class UploadResponse(BaseModel):
     filename: str
     chunks_created: int
     message: str
+    job_id: Optional[str] = None  # Background ingestion job (see /upload/jobs/{job_id})
+
+
+class BatchFileResult(BaseModel):
+    filename: str
+    doc_id: Optional[str] = None  # None for rejected files
+    status: str  # queued, completed, failed, rejected
+    chunk_count: int = 0
+    truncated_chunks: int = 0  # Chunks longer than the embedding model's token limit
+    error: Optional[str] = None
+
+
+class BatchUploadResponse(BaseModel):
+    job_id: Optional[str] = None  # None if no file was accepted
+    files: List[BatchFileResult]
+    accepted: int
+    rejected: int
+    message: str
+
+
+class ChunkDiff(BaseModel):
+    kept: int  # Unchanged chunks that kept their ID and vector
+    added: int  # New chunks that were embedded
+    removed: int  # Chunks of the previous version that were deleted
+
+
+class IngestionJobStatus(BaseModel):
+    job_id: str
+    doc_id: Optional[str] = None  # Set for single-file jobs
+    filename: Optional[str] = None  # Set for single-file jobs
+    stage: str  # queued, extracting, embedding, storing, completed, failed
+    progress: float  # 0.0 - 1.0
+    chunk_count: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    files: List[BatchFileResult] = []
+    diff: Optional[ChunkDiff] = None  # Set for completed document updates
 
 
 # Query Schemas
@@ -67,6 +105,7 @@ class QueryRequest(BaseModel):
     doc_ids: Optional[List[str]] = None  # Filter by specific documents
     top_k: int = 5
     stream: bool = True
+    mode: Optional[str] = None  # vector, lexical or hybrid (default: RETRIEVAL_MODE)
 
 
 class QueryChunk(BaseModel):
@@ -88,6 +127,7 @@ class SearchRequest(BaseModel):
     query: str
     doc_ids: Optional[List[str]] = None
     top_k: int = 10
+    mode: Optional[str] = None  # vector, lexical or hybrid (default: RETRIEVAL_MODE)
 
 
 class SearchResult(BaseModel):
@@ -104,6 +144,28 @@ class SearchResponse(BaseModel):
     total: int
 
 
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchRequest]
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResponse]  # In request order
+
+
+# Admin Schemas
+class NamespaceExportRequest(BaseModel):
+    name: str  # Export directory name (under NAMESPACE_EXPORT_DIR) to write or read
+
+
+class NamespaceExportResponse(BaseModel):
+    user_id: str
+    name: str
+    chunks: int
+    dimension: int
+    embedding_model: str
+    created_at: datetime
+
+
 # Health Check
 class HealthResponse(BaseModel):
     status: str
@@ -0,0 +1,219 @@
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from typing import BinaryIO, List, Optional, Tuple
+import aiofiles
+import hashlib
+import os
+import re
+import uuid
+
+# Upload storage: files are content-addressed by SHA-256 under BLOB_DIR
+UPLOAD_DIR = "./data/uploads"
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+STAGING_DIR = os.path.join(UPLOAD_DIR, "staging")
+
+# Streaming upload configuration
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MiB
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))  # 200 MiB
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_BYTES", str(2 * 1024 * 1024 * 1024)))  # 2 GiB
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "500"))
+# Multipart framing (boundaries, part headers, other form fields) allowed on top of an upload's size limit
+MULTIPART_OVERHEAD_BYTES = int(os.getenv("MULTIPART_OVERHEAD_BYTES", str(64 * 1024)))
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum size."""
+
+
+def check_content_length(content_length: Optional[str], max_bytes: int = MAX_UPLOAD_BYTES):
+    """
+    Reject a request up front when its declared body size is over the limit.
+
+    Args:
+        content_length: Value of the Content-Length header, if any
+        max_bytes: Maximum accepted size in bytes
+
+    Raises:
+        UploadTooLargeError: If the declared size exceeds max_bytes
+    """
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise UploadTooLargeError(f"File exceeds maximum upload size of {max_bytes} bytes")
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that enforces upload size limits while the request body is received.
+
+    FastAPI reads (and spools to disk) a whole multipart body before the
+    route handler runs, so a limit checked in the handler only applies once
+    the upload has been received. Here a declared Content-Length over the
+    limit is rejected before the body is read, and a body that crosses the
+    limit while streaming is aborted right away, both with 413.
+
+    Args:
+        app: ASGI application
+        limits: (method, path regex, max upload bytes) per upload endpoint;
+            bodies may exceed the limit by MULTIPART_OVERHEAD_BYTES
+    """
+
+    def __init__(self, app, limits: List[Tuple[str, str, int]]):
+        self.app = app
+        self.limits = [(method, re.compile(path), max_bytes) for method, path, max_bytes in limits]
+
+    def _limit(self, method: str, path: str) -> Optional[int]:
+        for limit_method, pattern, max_bytes in self.limits:
+            if method == limit_method and pattern.fullmatch(path):
+                return max_bytes
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self._limit(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"File exceeds maximum upload size of {max_bytes} bytes"
+        limit = max_bytes + MULTIPART_OVERHEAD_BYTES
+        content_length = dict(scope["headers"]).get(b"content-length", b"").decode("latin-1")
+        try:
+            check_content_length(content_length, limit)
+        except UploadTooLargeError:
+            response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the form parser; FastAPI passes HTTPExceptions through as responses
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def save_upload_file(
+    upload: UploadFile,
+    dest_path: str,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Tuple[int, str]:
+    """
+    Stream an uploaded file to disk in fixed-size chunks.
+
+    The SHA-256 digest and byte count are computed while copying, so at most
+    one chunk of the file is held in memory. The copy is aborted (and the
+    partial file removed) as soon as the size limit is crossed.
+
+    Args:
+        upload: Incoming upload
+        dest_path: Path to write the file to
+        max_bytes: Maximum accepted size in bytes
+        chunk_size: Bytes read and written per iteration
+
+    Returns:
+        Tuple of (size in bytes, hex SHA-256 digest)
+
+    Raises:
+        UploadTooLargeError: If the file exceeds max_bytes
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(dest_path, 'wb') as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"File exceeds maximum upload size of {max_bytes} bytes")
+
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+
+    return size, digest.hexdigest()
+
+
+def save_stream(
+    source: BinaryIO,
+    dest_path: str,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Tuple[int, str]:
+    """
+    Synchronous counterpart of save_upload_file for file-like sources (e.g. ZIP members).
+
+    Returns:
+        Tuple of (size in bytes, hex SHA-256 digest)
+
+    Raises:
+        UploadTooLargeError: If the stream exceeds max_bytes
+    """
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(dest_path, 'wb') as f:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"File exceeds maximum upload size of {max_bytes} bytes")
+
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+
+    return size, digest.hexdigest()
+
+
+def staging_path() -> str:
+    """Return a fresh path for an upload that has not been hashed yet."""
+    os.makedirs(STAGING_DIR, exist_ok=True)
+    return os.path.join(STAGING_DIR, f"{uuid.uuid4()}.part")
+
+
+def blob_path(file_hash: str) -> str:
+    """Return the content-addressed path for a file with the given SHA-256 digest."""
+    return os.path.join(BLOB_DIR, file_hash[:2], f"{file_hash}.pdf")
+
+
+def store_blob(staged_path: str, file_hash: str) -> str:
+    """
+    Move a staged upload into the content-addressed store.
+
+    If a file with the same digest is already stored, the staged copy is
+    discarded, so identical uploads occupy disk space only once.
+
+    Args:
+        staged_path: Path the upload was streamed to
+        file_hash: Hex SHA-256 digest of the upload
+
+    Returns:
+        Path of the stored file
+    """
+    path = blob_path(file_hash)
+    if os.path.exists(path):
+        os.remove(staged_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(staged_path, path)
+    return path